@@ -22,28 +22,62 @@ def create_app():
     db.init_app(app)
     Migrate(app, db)
 
-    # Cria tabelas automaticamente em ambientes sem migração aplicada
+    # Confere a versão do esquema com uma única consulta; criar tabelas,
+    # migrar e semear fica a cargo de "flask init-db"
     with app.app_context():
-        db.create_all()
-        
-        # Aplicar todas as migrações pendentes
-        try:
-            from .migrate_on_startup import apply_all_migrations
-            apply_all_migrations(db)
-        except Exception as e:
-            print(f"⚠️  Erro ao aplicar migrações: {e}")
-        
-        # Criar conta e comunidade padrão MemóriaViva
-        try:
-            from .init_default_data import create_default_account_and_community
-            create_default_account_and_community()
-        except Exception as e:
-            print(f"⚠️  Erro ao criar dados padrão: {e}")
+        from .migrate_on_startup import schema_is_current
+        if not schema_is_current(db):
+            if app.config.get('AUTO_PROVISION'):
+                try:
+                    from .migrate_on_startup import provision_database
+                    from .init_default_data import create_default_account_and_community
+                    provision_database(db)
+                    create_default_account_and_community()
+                except Exception as e:
+                    print(f"⚠️  Erro ao preparar o banco: {e}")
+            else:
+                print("⚠️  Banco de dados desatualizado: execute \"flask init-db\"")
 
     # login
     login_manager.init_app(app)
     bcrypt.init_app(app)
 
+    # cache de consultas e fragmentos
+    from .utils.cache import init_cache
+    init_cache(app)
+
+    # estáticos com hash no nome (flask build-assets)
+    from .utils.assets import init_assets
+    init_assets(app)
+
+    # capas responsivas (srcset) nos templates
+    from .utils.images import init_images
+    init_images(app)
+
+    # contador de visualizações (gravado em lote)
+    from .utils.view_counter import init_view_counter
+    init_view_counter(app)
+
+    # progresso de leitura (gravado em lote)
+    from .utils.watch_progress import init_watch_progress
+    init_watch_progress(app)
+
+    # pub/sub das mensagens do chat (SSE/long-poll)
+    from .utils.pubsub import init_pubsub
+    init_pubsub(app)
+
+    # caixa de entrada (contador de não lidas na barra de navegação)
+    from .utils.inbox import init_inbox
+    init_inbox(app)
+
+    # linha do tempo inicial (corte em lote)
+    from .utils.home_timeline import init_home_timeline
+    init_home_timeline(app)
+
+    # contadores de logins errados (limite por conta e por IP)
+    from .utils.passwords import init_passwords
+    init_passwords(app)
+
     # blueprints
     from .blueprints.main import main_bp
     from .blueprints.auth import auth_bp
@@ -68,5 +102,9 @@ def create_app():
     app.register_blueprint(redirects_bp)
     app.register_blueprint(comunidade_bp)
 
+    # comandos de manutenção (flask reconcile-counters, ...)
+    from .commands import register_commands
+    register_commands(app)
+
 
     return app
\ No newline at end of file
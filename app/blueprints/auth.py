@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
 from ..models import Usuario, db
 from ..extensions import login_manager
+from ..utils.passwords import PasswordBusy, login_throttled, record_login_failure
 
 # Blueprint para rotas de autenticação
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -34,7 +35,11 @@ def register():
             is_admin=is_admin,
             role=role
         )
-        novo.senha = senha  
+        try:
+            novo.senha = senha
+        except PasswordBusy:
+            flash('Servidor ocupado. Tente novamente em instantes.', 'warning')
+            return render_template('auth/register.html'), 503
         db.session.add(novo)
         db.session.commit()
 
@@ -57,18 +62,41 @@ def login():
     if request.method == 'POST':
         email = request.form.get('email')
         senha = request.form.get('senha')
-        usuario = Usuario.query.filter_by(email=email).first()
 
         if not email or not senha:
             flash('E-mail e senha são obrigatórios.', 'warning')
             return redirect(url_for('auth.login'))
 
-        if usuario and usuario.checar_senha(senha):
+        # Conta ou IP com logins errados demais: recusa antes de calcular qualquer hash
+        if login_throttled(email):
+            flash('Muitas tentativas de login. Aguarde alguns minutos e tente novamente.', 'danger')
+            return render_template('auth/login.html'), 429
+
+        usuario = Usuario.query.filter_by(email=email).first()
+
+        if usuario and not usuario.is_active:
+            flash('Esta conta está em processo de exclusão.', 'warning')
+            return redirect(url_for('auth.login'))
+
+        try:
+            senha_correta = usuario is not None and usuario.checar_senha(senha)
+        except PasswordBusy:
+            flash('Servidor ocupado. Tente novamente em instantes.', 'warning')
+            return render_template('auth/login.html'), 503
+
+        if senha_correta:
+            # Hash legado (werkzeug) ou com outro custo é refeito com a senha conferida
+            try:
+                if usuario.atualizar_hash_senha(senha):
+                    db.session.commit()
+            except PasswordBusy:
+                pass  # fica para o próximo login
             login_user(usuario)
             flash(f'Bem-vindo, {usuario.nome}!', 'success')
             next_page = request.args.get('next') or url_for('main.index')
             return redirect(next_page)
         else:
+            record_login_failure(email)
             flash('E-mail ou senha incorretos.', 'danger')
             return redirect(url_for('auth.login'))
 
@@ -86,4 +114,8 @@ def logout():
 # Função para o Flask-Login recarregar o usuário a partir do ID salvo na sessão
 @login_manager.user_loader
 def load_user(user_id):
-    return Usuario.query.get(int(user_id))
\ No newline at end of file
+    usuario = Usuario.query.get(int(user_id))
+    # Sessões de contas com exclusão pendente deixam de valer imediatamente
+    if usuario is None or not usuario.is_active:
+        return None
+    return usuario
\ No newline at end of file
@@ -1,8 +1,15 @@
 #Rota responsável por gerenciar o chat privado entre usuários, EM DESENVOLVIMENTO
-from flask import Blueprint, request, jsonify
+import json
+import time
+
+from flask import Blueprint, Response, current_app, render_template, request, jsonify
 from flask_login import current_user, login_required
 from ..models import db
 from app.models import PrivateMessage, Usuario
+from ..utils.pagination import get_page_args, wants_json
+from ..utils.conditional import make_etag, not_modified, with_validators
+from ..utils.pubsub import get_broker, publish, user_channel
+from ..utils.inbox import inbox_page, mark_conversation_read, record_message, unread_total
 from datetime import datetime
 
 chat_bp = Blueprint('chat', __name__)
@@ -10,30 +17,272 @@ chat_bp = Blueprint('chat', __name__)
 @chat_bp.route('/send_message', methods=['POST'])
 @login_required
 def send_message():     # Envia uma mensagem privada para outro usuário
-    data = request.json
+    data = request.get_json(silent=True) or {}
+    try:
+        receiver_id = int(data.get('receiver_id'))
+    except (TypeError, ValueError):
+        receiver_id = None
+    text = data.get('text')
+    if receiver_id is None or not isinstance(text, str) or not text.strip():
+        return jsonify({'status': 'error', 'message': 'Destinatário e texto são obrigatórios'}), 400
+    # Com as chaves estrangeiras ativas, um destinatário inexistente seria um IntegrityError
+    if db.session.get(Usuario, receiver_id) is None:
+        return jsonify({'status': 'error', 'message': 'Destinatário não encontrado'}), 404
     message = PrivateMessage(
         sender_id=current_user.id,
-        receiver_id=data['receiver_id'],
-        text=data['text'],
+        receiver_id=receiver_id,
+        text=text,
         sent_at=datetime.utcnow()
     )
     db.session.add(message)
+    record_message(message)
     db.session.commit()
+    # Entrega imediata às conexões abertas (stream/poll) dos dois lados
+    event = _event(message)
+    publish(user_channel(event['receiver_id']), event)
+    if event['sender_id'] != event['receiver_id']:
+        publish(user_channel(event['sender_id']), event)
     return jsonify({'status': 'success', 'message_id': message.id})
 
+def _serialize(message):
+    return {
+        'id': message.id,
+        'text': message.text,
+        'timestamp': message.sent_at.strftime('%d/%m/%Y %H:%M'),
+        'from': 'me' if message.sender_id == current_user.id else 'them'
+    }
+
+def _event(message):
+    """Mensagem como evento publicado (independe de quem vai recebê-lo)."""
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'receiver_id': message.receiver_id,
+        'text': message.text,
+        'timestamp': message.sent_at.strftime('%d/%m/%Y %H:%M'),
+    }
+
+def _for_viewer(event, viewer_id):
+    """Evento no formato de _serialize, mais 'with' (o outro usuário da conversa)."""
+    mine = event['sender_id'] == viewer_id
+    return {
+        'id': event['id'],
+        'text': event['text'],
+        'timestamp': event['timestamp'],
+        'from': 'me' if mine else 'them',
+        'with': event['receiver_id'] if mine else event['sender_id'],
+    }
+
+def _missed_events(user_id, last_id, limit):
+    """Mensagens do usuário (enviadas ou recebidas) com id > last_id.
+
+    Usado só na (re)conexão; percorre a chave primária a partir de last_id.
+    Retorna (eventos, has_more).
+    """
+    rows = (PrivateMessage.query
+            .filter(PrivateMessage.id > last_id,
+                    db.or_(PrivateMessage.receiver_id == user_id, PrivateMessage.sender_id == user_id))
+            .order_by(PrivateMessage.id.asc())
+            .limit(limit + 1)
+            .all())
+    return [_event(m) for m in rows[:limit]], len(rows) > limit
+
+def _last_event_id():
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    try:
+        return max(int(value), 0) if value is not None else None
+    except ValueError:
+        return None
+
+def _sse(event_name, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {event_name}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+@chat_bp.route('/inbox', methods=['GET'])   # Caixa de entrada: conversas do usuário logado, da mais recente para a mais antiga
+@login_required
+def inbox():
+    """Resumos das conversas (tb_conversation_summaries), paginados por cursor."""
+    cursor, per_page = get_page_args()
+    page = inbox_page(current_user.id, cursor, per_page)
+    if not wants_json():
+        return render_template('chat/inbox.html', conversas=page, unread=unread_total(current_user.id))
+    return jsonify({
+        'items': [{
+            'with': summary.peer_id,
+            'name': summary.peer.nome if summary.peer else None,
+            'last_message_id': summary.last_message_id,
+            'preview': summary.last_preview,
+            'timestamp': summary.last_at.strftime('%d/%m/%Y %H:%M'),
+            'from': 'me' if summary.last_sender_id == current_user.id else 'them',
+            'unread': summary.unread_count,
+        } for summary in page],
+        'next_cursor': page.next_cursor,
+        'unread_total': unread_total(current_user.id),
+    })
+
+@chat_bp.route('/messages/<int:user_id>/read', methods=['POST'])   # Marca como lida toda a conversa com o usuário alvo
+@login_required
+def mark_read(user_id):
+    marked = mark_conversation_read(current_user.id, user_id)
+    db.session.commit()
+    return jsonify({'status': 'success', 'marked': marked, 'unread_total': unread_total(current_user.id)})
+
+@chat_bp.route('/messages/stream', methods=['GET'])   # Server-Sent Events com as mensagens novas do usuário logado
+@login_required
+def stream_messages():
+    """Canal de push (text/event-stream) com as mensagens do usuário logado.
+
+    Sem Last-Event-ID a conexão só recebe o que chegar daqui em diante; com
+    ele (o navegador reenvia sozinho ao reconectar, ou ?last_id=N na
+    primeira conexão) as mensagens perdidas são buscadas uma vez no banco
+    antes da espera. Depois disso a conexão só espera no pub/sub: clientes
+    ociosos não fazem consultas, apenas recebem um comentário de keepalive a
+    cada CHAT_HEARTBEAT_SECONDS. Se a perda passar de CHAT_CATCHUP_LIMIT,
+    o evento "resync" pede ao cliente que recarregue por get_messages.
+
+    Cada conexão ocupa uma thread do servidor enquanto aberta; ela é
+    encerrada após CHAT_STREAM_MAX_SECONDS e o navegador reconecta.
+    """
+    config = current_app.config
+    user_id = current_user.id
+    subscription = get_broker().subscribe(user_channel(user_id))
+    last_id = _last_event_id()
+    backlog, overflow = [], False
+    if last_id is not None:
+        backlog, overflow = _missed_events(user_id, last_id, config.get('CHAT_CATCHUP_LIMIT', 200))
+    # A sessão do banco é liberada no fim da requisição, antes do stream
+    # começar a ser lido; o gerador não usa o banco.
+    heartbeat = config.get('CHAT_HEARTBEAT_SECONDS', 15)
+    max_seconds = config.get('CHAT_STREAM_MAX_SECONDS', 300)
+
+    def generate(last_id):
+        try:
+            yield f'retry: {config.get("CHAT_RETRY_MS", 3000)}\n\n'
+            for event in backlog:
+                last_id = event['id']
+                yield _sse('message', _for_viewer(event, user_id), last_id)
+            if overflow:
+                yield _sse('resync', {'last_id': last_id}, last_id)
+            deadline = time.monotonic() + max_seconds
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                event = subscription.get(min(heartbeat, remaining))
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+                # Publicado entre a inscrição e a consulta de recuperação
+                if last_id is not None and event['id'] <= last_id:
+                    continue
+                last_id = event['id']
+                yield _sse('message', _for_viewer(event, user_id), last_id)
+        finally:
+            subscription.close()
+
+    response = Response(generate(last_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # nginx: não segurar os eventos no buffer do proxy
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@chat_bp.route('/messages/poll', methods=['GET'])   # Long-poll: alternativa ao stream para clientes sem EventSource
+@login_required
+def poll_messages():
+    """Espera até CHAT_LONGPOLL_SECONDS por mensagens com id > ?last_id.
+
+    Responde na hora se já houver mensagens perdidas; senão segura a
+    requisição no pub/sub, sem consultar o banco, até chegar algo ou o
+    tempo acabar. Sem last_id (primeira chamada), só espera o que chegar
+    daqui em diante, como o stream. Retorna {'items', 'last_id',
+    'has_more'}; o cliente repete a chamada com o last_id recebido.
+    """
+    config = current_app.config
+    user_id = current_user.id
+    subscription = get_broker().subscribe(user_channel(user_id))
+    try:
+        last_id = _last_event_id()
+        if last_id is None:
+            # Maior id atual (chave primária), lido depois da inscrição: nada se perde
+            last_id = db.session.query(db.func.max(PrivateMessage.id)).scalar() or 0
+        events, has_more = _missed_events(user_id, last_id, config.get('CHAT_CATCHUP_LIMIT', 200))
+        if not events:
+            # Libera a conexão do banco durante a espera
+            db.session.remove()
+            deadline = time.monotonic() + config.get('CHAT_LONGPOLL_SECONDS', 25)
+            while not events:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                event = subscription.get(remaining)
+                if event is not None and event['id'] > last_id:
+                    events.append(event)
+            # Junta o que chegou em seguida, sem esperar mais
+            while events:
+                event = subscription.get(0)
+                if event is None:
+                    break
+                if event['id'] > events[-1]['id']:
+                    events.append(event)
+    finally:
+        subscription.close()
+    return jsonify({
+        'items': [_for_viewer(event, user_id) for event in events],
+        'last_id': events[-1]['id'] if events else last_id,
+        'has_more': has_more,
+    })
+
 @chat_bp.route('/get_messages/<int:user_id>', methods=['GET'])   # Recupera mensagens entre o usuário logado e o usuário alvo
 @login_required
 def get_messages(user_id):
-    messages = PrivateMessage.query.filter(
-        ((PrivateMessage.sender_id == current_user.id) & (PrivateMessage.receiver_id == user_id)) |
-        ((PrivateMessage.sender_id == user_id) & (PrivateMessage.receiver_id == current_user.id))
-    ).order_by(PrivateMessage.sent_at).all()
-
-    return jsonify([
-        {
-            'id': m.id,
-            'text': m.text,
-            'timestamp': m.sent_at.strftime('%d/%m/%Y %H:%M'),
-            'from': 'me' if m.sender_id == current_user.id else 'them'
-        } for m in messages
-    ])
+    """Mensagens da conversa, sempre por intervalo do índice (conversa, id).
+
+    - ?since_id=N: sincronização incremental (polling), só as mensagens com
+      id > N, em ordem cronológica;
+    - ?before_id=N: histórico, a página anterior à mensagem N;
+    - sem parâmetros: a página mais recente.
+    """
+    per_page = get_page_args(default_per_page=50)[1]
+    since_id = request.args.get('since_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    query = PrivateMessage.query.filter(
+        PrivateMessage.conversation == PrivateMessage.conversation_key(current_user.id, user_id))
+
+    if since_id is not None:
+        rows = query.filter(PrivateMessage.id > since_id).order_by(PrivateMessage.id.asc()).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        return jsonify({
+            'items': [_serialize(m) for m in rows],
+            'last_id': rows[-1].id if rows else since_id,
+            'has_more': has_more,
+        })
+
+    if before_id is not None:
+        query = query.filter(PrivateMessage.id < before_id)
+    rows = query.order_by(PrivateMessage.id.desc()).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    next_before_id = rows[-1].id if has_next else None
+
+    # Nada mudou na conversa desde a última resposta: 304 sem serializar.
+    # Envelope e lista simples têm validadores diferentes
+    newest = rows[0] if rows else None
+    envelope = wants_json()
+    etag = make_etag('chat', 'envelope' if envelope else 'list', per_page, newest.id if newest else None)
+    last_sent = newest.sent_at if newest else None
+    cached_response = not_modified(etag, last_sent)
+    if cached_response is not None:
+        cached_response.vary.add('Accept')
+        return cached_response
+
+    messages = [_serialize(m) for m in reversed(rows)]
+    if envelope:
+        response = jsonify({'items': messages, 'next_before_id': next_before_id})
+    else:
+        response = jsonify(messages)
+        if next_before_id is not None:
+            response.headers['X-Next-Before-Id'] = str(next_before_id)
+    response.vary.add('Accept')
+    return with_validators(response, etag, last_sent)
@@ -1,16 +1,26 @@
 #Rota responsável por renderizar a página da comunidade e lidar com postagens
 from flask import Blueprint, render_template, request, redirect, url_for, jsonify, flash
 from flask_login import login_required, current_user
-from ..models import db, CommunityPost, Community, CommunityBlock, CommunityPostLike, CommunityPostComment
+from ..models import db, CommunityPost, Community, CommunityPostLike, CommunityPostComment
+from ..utils.feed import load_feed_page, with_viewer
+from ..utils.counters import bump, get_counter
+from ..utils.activity import (comment_activity, like_activity, record_activity,
+                              retract_activity, retract_post_activities)
+from ..utils.pagination import Page, get_page_args, wants_json
+from ..utils.cache import cached, invalidate
+from ..utils.community_access import accessible_communities, blocked_community_ids
+from ..utils.membership import member_community_ids, touch_membership
+from ..utils.community_posts import publish_post
+from ..utils.conditional import make_etag, not_modified, with_validators
 
 comunidade_bp = Blueprint('comunidade', __name__, url_prefix='/comunidade')
 
 @comunidade_bp.route('/', methods=['GET'])
 @login_required
 def comunidade():
-    # Usa o novo método para obter comunidades acessíveis
+    # Diretório de comunidades ativas (em cache) menos as bloqueadas pelo usuário
     include_filtered = request.args.get('include_filtered', 'false').lower() == 'true'
-    comunidades = current_user.get_accessible_communities(include_filtered=include_filtered)
+    comunidades = accessible_communities(current_user, include_filtered=include_filtered)
     return render_template('lista_comunidades.html', comunidades=comunidades)
 
 @comunidade_bp.route('/minhascomunidades/', methods=['GET'])
@@ -19,46 +29,12 @@ def minhas_comunidades():
     """Lista apenas comunidades em que o usuário é membro (dono ou interagiu)."""
     include_filtered = request.args.get('include_filtered', 'false').lower() == 'true'
 
-    # Subconsultas de participação por posts, comentários e likes
-    user_post_communities = db.session.query(CommunityPost.community_id).filter(
-        CommunityPost.author_id == current_user.id
-    )
+    # Participação mantida em tb_community_memberships: um intervalo do índice (usuário, última atividade)
+    member_ids = member_community_ids(current_user.id)
 
-    user_comment_communities = (db.session.query(CommunityPost.community_id)
-        .join(CommunityPostComment, CommunityPostComment.post_id == CommunityPost.id)
-        .filter(CommunityPostComment.user_id == current_user.id)
-    )
-
-    user_like_communities = (db.session.query(CommunityPost.community_id)
-        .join(CommunityPostLike, CommunityPostLike.post_id == CommunityPost.id)
-        .filter(CommunityPostLike.user_id == current_user.id)
-    )
-
-    # Comunidades bloqueadas pelo usuário (para exclusão)
-    blocked_ids = db.session.query(CommunityBlock.community_id).filter(
-        CommunityBlock.user_id == current_user.id
-    )
-
-    query = Community.query.filter(Community.status == 'active')
-
-    # Participação: dono ou interagiu (post, comentário, like)
-    query = query.filter(
-        (
-            (Community.owner_id == current_user.id) |
-            (Community.id.in_(user_post_communities)) |
-            (Community.id.in_(user_comment_communities)) |
-            (Community.id.in_(user_like_communities))
-        )
-    )
-
-    # Excluir bloqueadas
-    query = query.filter(~Community.id.in_(blocked_ids))
-
-    # Filtragem de conteúdo sensível
-    if not include_filtered:
-        query = query.filter(Community.is_filtered.is_(False))
-
-    comunidades = query.order_by(Community.created_at.asc()).all()
+    # Ativas, não bloqueadas e (por padrão) não filtradas vêm do diretório em cache
+    directory = {c.id: c for c in accessible_communities(current_user, include_filtered=include_filtered)}
+    comunidades = [directory[community_id] for community_id in member_ids if community_id in directory]
 
     return render_template('lista_comunidades.html', comunidades=comunidades)
 
@@ -92,21 +68,39 @@ def comunidade_users(community_id):
         flash('Você não tem permissão para acessar esta comunidade.', 'error')
         return redirect(url_for('comunidade.comunidade'))
     
-    # Verifica se a comunidade está bloqueada pelo usuário
-    if current_user.is_community_blocked(community_id):
+    # Verifica se a comunidade está bloqueada pelo usuário (conjunto em cache)
+    if community_id in blocked_community_ids(current_user):
         flash('Esta comunidade está bloqueada para você.', 'error')
         return redirect(url_for('comunidade.comunidade'))
 
     if request.method == 'POST':
         texto = request.form.get('mensagem')
         if texto:
-            nova_mensagem = CommunityPost(content=texto, author_id=current_user.id, community_id=comunidade.id)
-            db.session.add(nova_mensagem)
+            tags = publish_post(current_user.id, comunidade, texto)
             db.session.commit()
+            invalidate(*tags)
             return redirect(url_for('comunidade.comunidade_users', community_id=comunidade.id))
 
-    mensagens = CommunityPost.query.filter_by(community_id=comunidade.id).order_by(CommunityPost.created_at.desc()).all()
-    return render_template('comunidade.html', comunidade=comunidade, mensagens=mensagens)
+    # Validador: versão do feed (posts, curtidas, comentários); 304 antes de montar a página
+    etag = make_etag('community', comunidade.id, comunidade.feed_version)
+    cached_response = not_modified(etag)
+    if cached_response is not None:
+        return cached_response
+
+    # O feed (igual para todos) fica no cache; só as curtidas do visitante são consultadas.
+    # A versão entra na chave: outro worker nunca serve o feed antigo com o ETag novo
+    cursor, per_page = get_page_args()
+    feed = cached(f'community:{comunidade.id}:feed:v{comunidade.feed_version}:{cursor}:{per_page}',
+                  lambda: load_feed_page(CommunityPost.community_id == comunidade.id,
+                                         cursor=cursor, per_page=per_page),
+                  tags=(f'community:{comunidade.id}', 'feeds'))
+    mensagens = Page(with_viewer(feed.items, current_user.id), feed.next_cursor)
+    if wants_json():
+        return with_validators(jsonify({
+            'items': [msg.to_dict() for msg in mensagens],
+            'next_cursor': mensagens.next_cursor,
+        }), etag)
+    return with_validators(render_template('comunidade.html', comunidade=comunidade, mensagens=mensagens), etag)
 
 @comunidade_bp.route('/<int:community_id>/post/<int:post_id>/like', methods=['POST'])
 @login_required
@@ -114,13 +108,23 @@ def like_post(community_id, post_id):
     post = CommunityPost.query.filter_by(id=post_id, community_id=community_id).first_or_404()
     existing = CommunityPostLike.query.filter_by(user_id=current_user.id, post_id=post.id).first()
     if existing:
+        retract_activity('like', existing.id)
         db.session.delete(existing)
-        db.session.commit()
-        return jsonify({'liked': False, 'likes_count': CommunityPostLike.query.filter_by(post_id=post.id).count()})
-    novo = CommunityPostLike(user_id=current_user.id, post_id=post.id)
-    db.session.add(novo)
+        bump(CommunityPost, post.id, likes_count=-1)
+        liked = joined = False
+    else:
+        like = CommunityPostLike(user_id=current_user.id, post_id=post.id)
+        db.session.add(like)
+        db.session.flush()
+        bump(CommunityPost, post.id, likes_count=1)
+        record_activity(like_activity(like, post.content, post.community_id, post.comunidade.name))
+        joined = touch_membership(current_user.id, community_id)
+        liked = True
+    bump(Community, community_id, feed_version=1)
+    likes_count = get_counter(CommunityPost, post.id, 'likes_count')
     db.session.commit()
-    return jsonify({'liked': True, 'likes_count': CommunityPostLike.query.filter_by(post_id=post.id).count()})
+    invalidate(f'community:{community_id}', *(('communities',) if joined else ()))
+    return jsonify({'liked': liked, 'likes_count': likes_count})
 
 @comunidade_bp.route('/<int:community_id>/post/<int:post_id>/comment', methods=['POST'])
 @login_required
@@ -131,10 +135,17 @@ def comment_post(community_id, post_id):
         return jsonify({'success': False, 'message': 'Comentário vazio'}), 400
     comment = CommunityPostComment(user_id=current_user.id, post_id=post.id, text=text)
     db.session.add(comment)
+    db.session.flush()
+    bump(CommunityPost, post.id, comments_count=1)
+    record_activity(comment_activity(comment, post.community_id, post.comunidade.name))
+    joined = touch_membership(current_user.id, community_id)
+    bump(Community, community_id, feed_version=1)
+    comments_count = get_counter(CommunityPost, post.id, 'comments_count')
     db.session.commit()
+    invalidate(f'community:{community_id}', *(('communities',) if joined else ()))
     return jsonify({
         'success': True,
-        'comments_count': CommunityPostComment.query.filter_by(post_id=post.id).count(),
+        'comments_count': comments_count,
         'comment': {
             'id': comment.id,
             'author': current_user.nome,
@@ -153,7 +164,10 @@ def criar_comunidade():
         if nome:
             nova_comunidade = Community(owner_id=current_user.id, name=nome, description=descricao)
             db.session.add(nova_comunidade)
+            db.session.flush()
+            touch_membership(current_user.id, nova_comunidade.id, role='owner')
             db.session.commit()
+            invalidate('communities')
             return redirect(url_for('comunidade.comunidade_users', community_id=nova_comunidade.id))
 
     return render_template('criar_comunidade.html')
@@ -172,13 +186,12 @@ def delete_community(community_id):
     community_name = comunidade.name
     
     try:
-        # Deletar todos os posts relacionados (e seus likes/comentários serão deletados em cascata)
-        CommunityPost.query.filter_by(community_id=community_id).delete()
-        # Deletar todos os bloqueios relacionados à comunidade
-        CommunityBlock.query.filter_by(community_id=community_id).delete()
-        # Deletar a comunidade
-        db.session.delete(comunidade)
+        # Remover do registro de atividades os posts da comunidade
+        retract_post_activities(db.select(CommunityPost.id).where(CommunityPost.community_id == community_id))
+        # Posts, curtidas, comentários e bloqueios saem pelo ON DELETE CASCADE
+        db.session.execute(db.delete(Community).where(Community.id == community_id))
         db.session.commit()
+        invalidate('communities', f'community:{community_id}')
         flash(f'Comunidade "{community_name}" foi apagada com sucesso.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -240,6 +253,7 @@ def admin_block_community(community_id):
     comunidade = Community.query.get_or_404(community_id)
     comunidade.status = 'blocked'
     db.session.commit()
+    invalidate('communities')
     
     flash(f'Comunidade "{comunidade.name}" foi bloqueada.', 'success')
     return redirect(url_for('comunidade.comunidade'))
@@ -255,6 +269,7 @@ def admin_unblock_community(community_id):
     comunidade = Community.query.get_or_404(community_id)
     comunidade.status = 'active'
     db.session.commit()
+    invalidate('communities')
     
     flash(f'Comunidade "{comunidade.name}" foi desbloqueada.', 'success')
     return redirect(url_for('comunidade.comunidade'))
@@ -273,6 +288,7 @@ def admin_filter_community(community_id):
     comunidade.is_filtered = True
     comunidade.filter_reason = reason
     db.session.commit()
+    invalidate('communities')
     
     flash(f'Comunidade "{comunidade.name}" foi marcada como filtrada.', 'success')
     return redirect(url_for('comunidade.comunidade'))
@@ -289,6 +305,7 @@ def admin_unfilter_community(community_id):
     comunidade.is_filtered = False
     comunidade.filter_reason = None
     db.session.commit()
+    invalidate('communities')
     
     flash(f'Comunidade "{comunidade.name}" teve o filtro removido.', 'success')
     return redirect(url_for('comunidade.comunidade'))
@@ -303,22 +320,20 @@ def delete_post(community_id, post_id):
     comunidade = Community.query.get_or_404(community_id)
     
     # Verificar permissão: autor do post, admin ou dono da comunidade
-    if current_user.id != post.user_id and not current_user.is_admin and current_user.id != comunidade.owner_id:
+    if current_user.id != post.author_id and not current_user.is_admin and current_user.id != comunidade.owner_id:
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'success': False, 'message': 'Sem permissão'}), 403
         flash('Você não tem permissão para excluir este post.', 'danger')
         return redirect(url_for('comunidade.comunidade_users', community_id=community_id))
     
     try:
-        # Deletar comentários associados
-        CommunityPostComment.query.filter_by(post_id=post_id).delete()
-        
-        # Deletar likes associados
-        CommunityPostLike.query.filter_by(post_id=post_id).delete()
-        
-        # Deletar o post
-        db.session.delete(post)
+        retract_post_activities([post_id])
+
+        # Curtidas e comentários saem pelo ON DELETE CASCADE
+        db.session.execute(db.delete(CommunityPost).where(CommunityPost.id == post_id))
+        bump(Community, community_id, feed_version=1)
         db.session.commit()
+        invalidate(f'community:{community_id}')
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'success': True, 'message': 'Post excluído'})
@@ -330,7 +345,7 @@ def delete_post(community_id, post_id):
             return jsonify({'success': False, 'message': str(e)}), 500
         flash(f'Erro ao excluir post: {str(e)}', 'danger')
     
-    return redirect(url_for('comunidade.ver_comunidade', community_id=community_id))
+    return redirect(url_for('comunidade.comunidade_users', community_id=community_id))
 
 @comunidade_bp.route('/comment/<int:comment_id>/delete', methods=['POST'])
 @login_required
@@ -351,11 +366,13 @@ def delete_comment(comment_id):
         return redirect(url_for('comunidade.comunidade_users', community_id=post.community_id))
     
     try:
+        retract_activity('comment', comentario.id)
         db.session.delete(comentario)
+        bump(CommunityPost, post_id, comments_count=-1)
+        bump(Community, post.community_id, feed_version=1)
+        comments_count = get_counter(CommunityPost, post_id, 'comments_count')
         db.session.commit()
-        
-        # Contar comentários restantes
-        comments_count = CommunityPostComment.query.filter_by(post_id=post_id).count()
+        invalidate(f'community:{post.community_id}')
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'success': True, 'message': 'Comentário excluído', 'comments_count': comments_count})
@@ -1,9 +1,22 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, current_app
 from flask_login import login_required, current_user
-from ..models import Content, Rating, db, Category, ContentCategory
+from ..models import Content, Rating, db, Category
+from ..utils.pagination import Page, get_page_args, paginate, wants_json
+from ..utils.cache import cached, invalidate, snapshot
+from ..utils.conditional import make_etag, not_modified, with_validators
+from ..utils.counters import bump
+from ..utils.ratings import apply_rating_change, get_summary
+from ..utils.activity import rating_activity, record_activity, retract_activity, retract_content_activities
+from ..utils.user_stats import bump_user_stats, discount_content
+from ..utils.search import SEARCH_PER_PAGE, browse_category, index_content, remove_content, search_contents
+from ..utils.storage import blob_hash, discard, release, save_upload
+from ..utils.images import schedule_derivatives
+from ..utils.delivery import send_upload
+from ..utils.assets import IMMUTABLE_MAX_AGE
+from ..utils.view_counter import count_view, views_by_day
+from ..utils.watch_progress import continue_watching, record_progress
 import os
 from werkzeug.utils import secure_filename
-import uuid
 
 # Blueprint corretamente nomeado
 content_bp = Blueprint('content', __name__, url_prefix='/content')
@@ -13,13 +26,38 @@ content_bp = Blueprint('content', __name__, url_prefix='/content')
 @content_bp.route('/')
 def list_content():
     """Lista todo o conteúdo disponível"""
-    contents = Content.query.all()
+    cursor, per_page = get_page_args()
+    page_key = f'{cursor}:{per_page}'
+
+    def load_page():
+        page = paginate(Content.query, Content.created_at, Content.id, cursor=cursor, per_page=per_page)
+        return Page([snapshot(c) for c in page], page.next_cursor)
+
+    contents = cached(f'contents:page:{page_key}', load_page, tags=('contents',))
+    if wants_json():
+        return jsonify({
+            'items': [{
+                'id': c.id,
+                'title': c.title,
+                'type': c.type,
+                'thumbnail': c.thumbnail,
+                'url': url_for('content.view_content', content_id=c.id),
+            } for c in contents],
+            'next_cursor': contents.next_cursor,
+        })
 
     from ..utils.helpers import extract_youtube_id, youtube_thumbnail_url, youtube_embed_url
 
+    # "Continuar de onde parou" só na primeira página
+    in_progress = []
+    if current_user.is_authenticated and not cursor:
+        in_progress = continue_watching(current_user.id, limit=4)
+
     return render_template(
         'content/list.html',
         contents=contents,
+        page_key=page_key,
+        in_progress=in_progress,
         extract_youtube_id=extract_youtube_id,
         youtube_thumbnail_url=youtube_thumbnail_url,
         youtube_embed_url=youtube_embed_url,
@@ -34,20 +72,19 @@ def list_content():
 def buscar_obra():
     termo = (request.args.get('q') or '').strip()
     category_id = request.args.get('category_id', type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+    offset = (page - 1) * SEARCH_PER_PAGE
 
-    query = Content.query
+    resultados = []
     if termo:
-        query = query.filter(
-            db.or_(
-                Content.title.ilike(f'%{termo}%'),
-                Content.description.ilike(f'%{termo}%')
-            )
-        )
-    if category_id:
-        query = query.join(ContentCategory, Content.id == ContentCategory.content_id)
-        query = query.filter(ContentCategory.category_id == category_id)
-
-    resultados = query.order_by(Content.created_at.desc()).all() if (termo or category_id) else []
+        # Busca no índice textual, ordenada por relevância
+        resultados = search_contents(termo, category_id=category_id,
+                                     limit=SEARCH_PER_PAGE + 1, offset=offset)
+    elif category_id:
+        resultados = browse_category(category_id, limit=SEARCH_PER_PAGE + 1, offset=offset)
+
+    has_next = len(resultados) > SEARCH_PER_PAGE
+    resultados = resultados[:SEARCH_PER_PAGE]
     categorias = Category.query.order_by(Category.name.asc()).all()
 
     return render_template(
@@ -55,7 +92,9 @@ def buscar_obra():
         resultados=resultados,
         termo=termo,
         categorias=categorias,
-        selected_category_id=category_id
+        selected_category_id=category_id,
+        page=page,
+        has_next=has_next,
     )
 
 
@@ -65,12 +104,31 @@ def buscar_obra():
 @content_bp.route('/<int:content_id>')
 def view_content(content_id):
     """Visualiza um conteúdo específico"""
-    from sqlalchemy import func
-    content = Content.query.get_or_404(content_id)
-
-    ratings = Rating.query.filter_by(content_id=content_id).order_by(Rating.created_at.desc()).all()
-    avg_rating = db.session.query(func.avg(Rating.rating)).filter_by(content_id=content_id).scalar()
-    total_ratings = len(ratings)
+    from sqlalchemy.orm import selectinload
+
+    # Validador: versão do conteúdo (edições, avaliações); 304 antes de renderizar
+    version = db.session.query(Content.version).filter_by(id=content_id).scalar()
+    if version is None:
+        abort(404)
+    # Acumulada em memória e gravada em lote; não altera a versão (ETag)
+    count_view(content_id)
+    etag = make_etag('content', content_id, version)
+    cached_response = not_modified(etag)
+    if cached_response is not None:
+        return cached_response
+
+    # A versão entra na chave: outro worker nunca serve o corpo antigo com o ETag novo
+    content = cached(f'content:{content_id}:v{version}', lambda: snapshot(Content.query.get_or_404(content_id)),
+                     tags=(f'content:{content_id}',))
+
+    # Média e histograma vêm do resumo; as avaliações são paginadas e os
+    # autores da página carregados em uma única consulta IN
+    summary = get_summary(content_id)
+    cursor, per_page = get_page_args(default_per_page=10)
+    ratings = paginate(
+        Rating.query.filter_by(content_id=content_id).options(selectinload(Rating.usuario)),
+        Rating.created_at, Rating.id, cursor=cursor, per_page=per_page
+    )
 
     user_rating = None
     if current_user.is_authenticated:
@@ -81,19 +139,67 @@ def view_content(content_id):
 
     from ..utils.helpers import extract_youtube_id, youtube_thumbnail_url, youtube_embed_url
 
-    return render_template(
+    return with_validators(render_template(
         'content/view.html',
         content=content,
         ratings=ratings,
-        avg_rating=avg_rating,
-        total_ratings=total_ratings,
+        summary=summary,
+        avg_rating=summary.average,
+        total_ratings=summary.count,
         user_rating=user_rating,
         extract_youtube_id=extract_youtube_id,
         youtube_thumbnail_url=youtube_thumbnail_url,
         youtube_embed_url=youtube_embed_url,
-    )
+    ), etag)
+
+
+# VISUALIZAÇÕES POR DIA
+@content_bp.route('/<int:content_id>/views')
+def content_views(content_id):
+    """Visualizações diárias de um conteúdo (JSON), para análises"""
+    total = db.session.query(Content.views_count).filter_by(id=content_id).scalar()
+    if total is None:
+        abort(404)
+    days = min(request.args.get('days', 30, type=int), 365)
+    return jsonify({
+        'content_id': content_id,
+        'total': total,
+        'days': [{'day': day.isoformat(), 'views': views} for day, views in views_by_day(content_id, days)],
+    })
+
+
+# PROGRESSO DE LEITURA/REPRODUÇÃO
+@content_bp.route('/progress', methods=['POST'])
+@login_required
+def report_progress():
+    """Recebe o progresso enviado pelos players (um item ou {'items': [...]})"""
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict) and 'items' in payload:
+        items = payload['items']
+    elif isinstance(payload, dict):
+        items = [payload]
+    else:
+        items = payload
+    if not isinstance(items, list):
+        return jsonify(error='Envie um objeto ou uma lista de {content_id, progress}.'), 400
+
+    accepted = record_progress(current_app.extensions['watch_progress'], current_user.id, items)
+    return jsonify(accepted=accepted), 202
 
 
+@content_bp.route('/continue')
+@login_required
+def continue_list():
+    """Conteúdos em andamento do usuário logado (JSON)"""
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify(items=[{
+        'id': content.id,
+        'title': content.title,
+        'progress': progress,
+        'last_watched': last_watched.isoformat(),
+        'url': url_for('content.view_content', content_id=content.id),
+    } for content, progress, last_watched in continue_watching(current_user.id, limit)])
+
 
 # CRIAR CONTEÚDO
 
@@ -133,13 +239,8 @@ def create_content():
                 flash('Formato de arquivo não permitido.', 'danger')
                 return render_template('content/create.html')
 
-            upload_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'uploads', 'obras')
-            os.makedirs(upload_dir, exist_ok=True)
-
-            unique_filename = f"{uuid.uuid4().hex}_{filename}"
-            file_path = os.path.join(upload_dir, unique_filename)
-            file.save(file_path)
-            relative_path = f"uploads/obras/{unique_filename}"
+            # Gravado uma única vez por conteúdo (hash), mesmo se reenviado
+            relative_path = save_upload(file, file_ext)
 
         if not thumbnail and url:
             from ..utils.helpers import extract_youtube_id, youtube_thumbnail_url
@@ -163,7 +264,10 @@ def create_content():
         )
 
         db.session.add(new_content)
+        db.session.flush()
+        index_content(new_content)
         db.session.commit()
+        invalidate('contents')
 
         flash('Conteúdo criado com sucesso!', 'success')
         return redirect(url_for('content.list_content'))
@@ -191,35 +295,41 @@ def edit_content(content_id):
         thumbnail_file = request.files.get('thumbnail_file')
         thumbnail_url = request.form.get('thumbnail')
 
-        upload_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'uploads', 'thumbnails')
-        os.makedirs(upload_dir, exist_ok=True)
+        # Capas enviadas que deixam de ser usadas; saem do disco após o commit
+        # se nenhum outro conteúdo usar o mesmo arquivo
+        released = []
+        uploaded_thumbnail = False
 
         # REMOVER CAPA ANTIGA PERMANENTEMENTE
         if remove_thumbnail:
-            if content.thumbnail and content.thumbnail.startswith('uploads/'):
-                full_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', content.thumbnail)
-                if os.path.exists(full_path):
-                    try:
-                        os.remove(full_path)
-                        print(f"Capa removida: {full_path}")
-                    except Exception as e:
-                        print(f"Erro ao remover capa: {e}")
+            released = release(content.thumbnail)
             content.thumbnail = None
+            content.image_variants = None
 
         #  NOVO UPLOAD
         elif thumbnail_file and thumbnail_file.filename:
             filename = secure_filename(thumbnail_file.filename)
-            unique_name = f"{uuid.uuid4().hex}_{filename}"
-            save_path = os.path.join(upload_dir, unique_name)
-            thumbnail_file.save(save_path)
-            content.thumbnail = f"uploads/thumbnails/{unique_name}"
+            file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+            released = release(content.thumbnail)
+            content.thumbnail = save_upload(thumbnail_file, file_ext)
+            content.image_variants = None
+            uploaded_thumbnail = True
 
         #  APENAS MUDAR URL MANUAL
-        elif thumbnail_url:
+        elif thumbnail_url and thumbnail_url != content.thumbnail:
+            released = release(content.thumbnail)
             content.thumbnail = thumbnail_url
+            content.image_variants = None
 
         try:
+            index_content(content)
+            bump(Content, content_id, version=1)
             db.session.commit()
+            discard(released)
+            invalidate('contents', f'content:{content_id}')
+            # Versões WebP/JPEG redimensionadas da capa enviada, fora da requisição
+            if uploaded_thumbnail:
+                schedule_derivatives([content_id])
             flash("Conteúdo atualizado com sucesso!", "success")
             return jsonify(success=True, new_thumbnail_url=content.thumbnail or url_for('static', filename='img/default_cover.png'))
         except Exception as e:
@@ -245,7 +355,16 @@ def download_content(content_id):
         flash('Arquivo não encontrado.', 'danger')
         return redirect(url_for('content.view_content', content_id=content_id))
 
-    return send_file(file_full_path, as_attachment=True, download_name=os.path.basename(file_full_path))
+    # Arquivos do armazenamento por hash: o próprio hash é um ETag forte
+    # (necessário para If-Range) e o conteúdo nunca muda
+    sha256 = blob_hash(content.file_path)
+    download_name = os.path.basename(file_full_path)
+    if sha256 and content.file_type:
+        download_name = f"{secure_filename(content.title) or 'obra'}.{content.file_type}"
+    # ?inline=1 abre no navegador (leitor de PDF) em vez de baixar
+    return send_upload(content.file_path, download_name=download_name,
+                       as_attachment=not request.args.get('inline', type=int),
+                       etag=sha256 or True, max_age=IMMUTABLE_MAX_AGE if sha256 else None)
 
 
 # AVALIAR CONTEÚDO (RATE)
@@ -253,6 +372,8 @@ def download_content(content_id):
 @login_required
 def rate_content(content_id):
     """Registra ou atualiza a avaliação de um conteúdo"""
+    # Com as chaves estrangeiras ativas, avaliar um conteúdo inexistente seria um IntegrityError
+    Content.query.get_or_404(content_id)
     rating_value = request.form.get('rating', type=int)
     if not rating_value or rating_value < 1 or rating_value > 5:
         flash('Avaliação inválida.', 'danger')
@@ -260,11 +381,26 @@ def rate_content(content_id):
 
     existing = Rating.query.filter_by(user_id=current_user.id, content_id=content_id).first()
     if existing:
+        apply_rating_change(content_id, old=existing.rating, new=rating_value)
         existing.rating = rating_value
+        rating = existing
+        retract_activity('rating', rating.id)
     else:
-        db.session.add(Rating(user_id=current_user.id, content_id=content_id, rating=rating_value))
+        rating = Rating(user_id=current_user.id, content_id=content_id, rating=rating_value)
+        db.session.add(rating)
+        db.session.flush()
+        bump(Content, content_id, ratings_count=1)
+        bump_user_stats(current_user.id, ratings_count=1)
+        apply_rating_change(content_id, new=rating_value)
+
+    bump(Content, content_id, version=1)
+    content_title = db.session.query(Content.title).filter_by(id=content_id).scalar()
+    activity = rating_activity(rating, content_title)
+    activity['created_at'] = None  # registra o momento desta avaliação, mesmo se for atualização
+    record_activity(activity)
 
     db.session.commit()
+    invalidate(f'content:{content_id}')
     flash('Avaliação registrada com sucesso!', 'success')
     return redirect(url_for('content.view_content', content_id=content_id))
 
@@ -281,18 +417,16 @@ def delete_content(content_id):
         return redirect(url_for('content.view_content', content_id=content_id))
 
     try:
-        if content.file_path:
-            file_full_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', content.file_path)
-            if os.path.exists(file_full_path):
-                os.remove(file_full_path)
-
-        if content.thumbnail and content.thumbnail.startswith('uploads/'):
-            thumb_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', content.thumbnail)
-            if os.path.exists(thumb_path):
-                os.remove(thumb_path)
-
+        # Arquivos compartilhados com outros conteúdos continuam no disco
+        released = release(content.file_path, content.thumbnail)
+        remove_content(content.id)
+        # Comentários, curtidas e avaliações saem pelo cascade; contadores e atividades, não
+        discount_content(content.id)
+        retract_content_activities(content.id)
         db.session.delete(content)
         db.session.commit()
+        discard(released)
+        invalidate('contents', f'content:{content_id}')
         flash('Conteúdo deletado com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -314,7 +448,12 @@ def remove_rating(rating_id):
 
     try:
         db.session.delete(rating)
+        bump(Content, rating.content_id, ratings_count=-1, version=1)
+        bump_user_stats(rating.user_id, ratings_count=-1)
+        apply_rating_change(rating.content_id, old=rating.rating)
+        retract_activity('rating', rating.id)
         db.session.commit()
+        invalidate(f'content:{rating.content_id}')
         flash('Avaliação removida com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -1,9 +1,18 @@
-from flask import Blueprint, render_template
-from flask_login import current_user
+from flask import Blueprint, render_template, jsonify, abort
+from flask_login import current_user, login_required
+from ..utils.cache import cache_stats
 
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
 def index():
     """Página inicial do site"""
-    return render_template('main/index.html', usuario=current_user)
\ No newline at end of file
+    return render_template('main/index.html', usuario=current_user)
+
+@main_bp.route('/admin/cache')
+@login_required
+def cache_status():
+    """Métricas do cache deste processo (apenas administradores)"""
+    if not current_user.is_administrador():
+        abort(403)
+    return jsonify(cache_stats())
\ No newline at end of file
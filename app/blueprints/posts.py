@@ -1,15 +1,35 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify
 from flask_login import login_required, current_user
 from ..models import db, Community, CommunityPost
+from ..utils.feed import load_feed_page, load_post
+from ..utils.pagination import get_page_args, wants_json
+from ..utils.activity import retract_post_activities
+from ..utils.cache import invalidate
+from ..utils.counters import bump
+from ..utils.home_timeline import home_feed_page
+from ..utils.community_posts import publish_post
 
 posts_bp = Blueprint('posts', __name__, url_prefix='/posts')
 
 @posts_bp.route('/')
 def list_posts():
     """Lista todos os posts"""
-    posts = CommunityPost.query.order_by(CommunityPost.created_at.desc()).all()
-    communities = Community.query.all()
-    return render_template('posts/list.html', posts=posts, communities=communities)
+    viewer_id = current_user.id if current_user.is_authenticated else None
+    cursor, per_page = get_page_args()
+    posts = load_feed_page(cursor=cursor, per_page=per_page, viewer_id=viewer_id, comments_per_post=0)
+    if wants_json():
+        return jsonify({'items': [p.to_dict() for p in posts], 'next_cursor': posts.next_cursor})
+    return render_template('posts/list.html', posts=posts)
+
+@posts_bp.route('/home')
+@login_required
+def home_feed():
+    """Posts de quem o usuário segue (linha do tempo inicial)"""
+    cursor, per_page = get_page_args()
+    posts = home_feed_page(current_user.id, cursor=cursor, per_page=per_page)
+    if wants_json():
+        return jsonify({'items': [p.to_dict() for p in posts], 'next_cursor': posts.next_cursor})
+    return render_template('posts/list.html', posts=posts, home=True)
 
 @posts_bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -44,13 +64,9 @@ def create_post():
                 flash('Você não tem acesso a esta comunidade.', 'danger')
                 return redirect(url_for('posts.create_post'))
 
-            post = CommunityPost(
-                content=conteudo,
-                author_id=current_user.id,
-                community_id=community_id
-            )
-            db.session.add(post)
+            tags = publish_post(current_user.id, community, conteudo)
             db.session.commit()
+            invalidate(*tags)
             flash('Post criado com sucesso!', 'success')
             return redirect(url_for('posts.list_posts'))
         except Exception:
@@ -64,7 +80,10 @@ def create_post():
 @posts_bp.route('/<int:post_id>')
 def view_post(post_id):
     """Visualiza um post específico"""
-    post = CommunityPost.query.get_or_404(post_id)
+    viewer_id = current_user.id if current_user.is_authenticated else None
+    post = load_post(post_id, viewer_id=viewer_id)
+    if post is None:
+        abort(404)
     return render_template('posts/view.html', post=post)
 
 @posts_bp.route('/<int:post_id>/edit', methods=['GET', 'POST'])
@@ -78,7 +97,9 @@ def edit_post(post_id):
             flash('Conteúdo é obrigatório.', 'warning')
             return redirect(url_for('posts.edit_post', post_id=post_id))
         post.content = conteudo
+        bump(Community, post.community_id, feed_version=1)
         db.session.commit()
+        invalidate(f'community:{post.community_id}')
         flash('Post atualizado com sucesso!', 'success')
         return redirect(url_for('posts.view_post', post_id=post_id))
     
@@ -92,7 +113,11 @@ def delete_post(post_id):
     if post.author_id != current_user.id and not current_user.is_administrador():
         flash('Você não tem permissão para excluir este post.', 'danger')
         return redirect(url_for('posts.view_post', post_id=post_id))
-    db.session.delete(post)
+    retract_post_activities([post_id])
+    # Curtidas e comentários saem pelo ON DELETE CASCADE
+    db.session.execute(db.delete(CommunityPost).where(CommunityPost.id == post_id))
+    bump(Community, post.community_id, feed_version=1)
     db.session.commit()
+    invalidate(f'community:{post.community_id}')
     flash('Post excluído com sucesso!', 'success')
     return redirect(url_for('posts.list_posts'))
\ No newline at end of file
@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from ..models import db, Timeline as TimelineModel
+from ..utils.cache import cached, invalidate, snapshot
+from ..utils.conditional import make_etag, not_modified, with_validators
 
 
 timeline_bp = Blueprint('timeline', __name__, url_prefix='/timeline')
@@ -8,8 +10,19 @@ timeline_bp = Blueprint('timeline', __name__, url_prefix='/timeline')
 
 @timeline_bp.route('/')
 def index():    # Exibe os marcos da linha do tempo, ordenados por ano
-    items = TimelineModel.query.order_by(TimelineModel.ano.asc(), TimelineModel.id.asc()).all()
-    return render_template('timeline.html', items=items)
+    # Validador: quantidade e maior id dos marcos (só há criação e exclusão)
+    count, last_id = db.session.query(db.func.count(TimelineModel.id), db.func.max(TimelineModel.id)).one()
+    etag = make_etag('timeline', count, last_id)
+    cached_response = not_modified(etag)
+    if cached_response is not None:
+        return cached_response
+
+    # O validador entra na chave: outro worker nunca serve a lista antiga com o ETag novo
+    items = cached(f'timeline:items:{count}:{last_id}', lambda: [
+        snapshot(item)
+        for item in TimelineModel.query.order_by(TimelineModel.ano.asc(), TimelineModel.id.asc())
+    ], tags=('timeline',))
+    return with_validators(render_template('timeline.html', items=items), etag)
 
 
 @timeline_bp.route('/create', methods=['POST'])
@@ -31,6 +44,7 @@ def create():  # Cria um novo marco (apenas admins)
     item = TimelineModel(ano=ano, titulo=titulo, descricao=descricao or None, imagem=imagem)
     db.session.add(item)
     db.session.commit()
+    invalidate('timeline')
     flash('Marco criado com sucesso!', 'success')
     return redirect(url_for('timeline.index'))
 
@@ -44,5 +58,6 @@ def delete(item_id: int):  # Remove um marco da linha do tempo (apenas admins)
     item = TimelineModel.query.get_or_404(item_id)
     db.session.delete(item)
     db.session.commit()
+    invalidate('timeline')
     flash('Marco excluído.', 'success')
     return redirect(url_for('timeline.index'))
@@ -0,0 +1,189 @@
+"""
+Comandos de manutenção expostos via "flask <comando>"
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+import click
+
+# Mede create_app() em um processo novo: tempo (s) e consultas SQL executadas
+STARTUP_PROBE = """
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+queries = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+start = time.perf_counter()
+from app import create_app
+create_app()
+print(time.perf_counter() - start, len(queries))
+"""
+
+
+def register_commands(app):
+    """Registra os comandos de manutenção na CLI do Flask"""
+
+    @app.cli.command('init-db')
+    @click.option('--no-seed', is_flag=True, help='Não cria a conta e a comunidade oficiais.')
+    def init_db_command(no_seed):
+        """Cria as tabelas, aplica as migrações e semeia os dados padrão."""
+        from .models import db
+        from .migrate_on_startup import provision_database
+        from .init_default_data import create_default_account_and_community
+
+        provision_database(db)
+        if not no_seed:
+            create_default_account_and_community()
+        click.echo("Banco de dados pronto.")
+
+    @app.cli.command('seed-defaults')
+    def seed_defaults_command():
+        """Cria a conta oficial MemóriaViva e a comunidade padrão."""
+        from .init_default_data import create_default_account_and_community
+
+        create_default_account_and_community()
+        click.echo("Dados padrão verificados.")
+
+    @app.cli.command('bench-startup')
+    @click.option('--runs', default=5, show_default=True, help='Processos iniciados.')
+    @click.option('--max-ms', type=float, default=None, help='Falha se a mediana passar deste tempo.')
+    def bench_startup_command(runs, max_ms):
+        """Mede o tempo de create_app() em processos novos (como um worker WSGI)."""
+        root = os.path.dirname(app.root_path)
+        timings, queries = [], set()
+        for _ in range(runs):
+            result = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=root,
+                                    capture_output=True, text=True, check=True)
+            elapsed, count = result.stdout.strip().splitlines()[-1].split()
+            timings.append(float(elapsed) * 1000)
+            queries.add(int(count))
+
+        median = statistics.median(timings)
+        click.echo(f"create_app(): mediana {median:.1f} ms, mín {min(timings):.1f} ms, "
+                   f"máx {max(timings):.1f} ms, consultas SQL {'/'.join(map(str, sorted(queries)))} "
+                   f"({runs} processos)")
+        if max_ms is not None and median > max_ms:
+            raise click.ClickException(f"inicialização acima do limite de {max_ms:.0f} ms")
+
+    @app.cli.command('reconcile-counters')
+    @click.option('--dry-run', is_flag=True, help='Apenas relata as divergências, sem corrigir.')
+    def reconcile_counters_command(dry_run):
+        """Recalcula os contadores de curtidas/comentários/avaliações."""
+        from .utils.counters import reconcile_counters
+
+        drift = reconcile_counters(fix=not dry_run)
+        for item in drift:
+            click.echo(f"{item['table']}.{item['counter']} id={item['id']}: "
+                       f"armazenado={item['stored']} real={item['actual']}")
+        action = 'encontradas' if dry_run else 'corrigidas'
+        click.echo(f"{len(drift)} divergências {action}.")
+
+    @app.cli.command('search-reindex')
+    @click.option('--batch-size', default=1000, show_default=True, help='Conteúdos por INSERT em lote.')
+    def search_reindex_command(batch_size):
+        """Reconstrói o índice de busca textual de conteúdos."""
+        from .utils.search import get_search_backend, rebuild_index
+
+        total = rebuild_index(batch_size=batch_size)
+        click.echo(f"{total} conteúdos indexados ({get_search_backend().name}).")
+
+    @app.cli.command('rebuild-rating-summaries')
+    def rebuild_rating_summaries_command():
+        """Recalcula o resumo (quantidade, soma, histograma) das avaliações."""
+        from .models import db
+        from .utils.ratings import recompute_summaries
+
+        total = recompute_summaries()
+        db.session.commit()
+        click.echo(f"{total} resumos de avaliações recalculados.")
+
+    @app.cli.command('backfill-activity')
+    @click.option('--days', type=int, default=None, help='Janela em dias (padrão: ACTIVITY_RETENTION_DAYS).')
+    def backfill_activity_command(days):
+        """Recria o registro de atividades dos usuários a partir do histórico."""
+        from .utils.activity import backfill_activities
+
+        total = backfill_activities(days=days)
+        click.echo(f"{total} atividades registradas.")
+
+    @app.cli.command('prune-activity')
+    @click.option('--days', type=int, default=None, help='Retenção em dias (padrão: ACTIVITY_RETENTION_DAYS).')
+    def prune_activity_command(days):
+        """Apaga atividades mais antigas que a retenção."""
+        from .utils.activity import prune_activities
+
+        removed = prune_activities(retention_days=days)
+        click.echo(f"{removed} atividades antigas removidas.")
+
+    @app.cli.command('recompute-user-stats')
+    def recompute_user_stats_command():
+        """Recalcula os contadores de perfil (comentários, curtidas, avaliações, seguidores)."""
+        from .models import db
+        from .utils.user_stats import recompute_user_stats
+
+        total = recompute_user_stats()
+        db.session.commit()
+        click.echo(f"Estatísticas de {total} usuários recalculadas.")
+
+    @app.cli.command('purge-accounts')
+    @click.option('--batch-size', type=int, default=None, help='Linhas por lote (padrão: ACCOUNT_DELETION_BATCH_SIZE).')
+    def purge_accounts_command(batch_size):
+        """Executa ou retoma as exclusões de conta pendentes."""
+        from .utils.account_deletion import resume_deletions
+
+        jobs = resume_deletions(batch_size=batch_size)
+        for job in jobs:
+            click.echo(f"usuário {job.user_id}: {job.status} ({job.deleted_rows} linhas)"
+                       + (f" - {job.error}" if job.error else ''))
+        click.echo(f"{len(jobs)} exclusões processadas.")
+
+    @app.cli.command('sweep-orphans')
+    @click.option('--dry-run', is_flag=True, help='Apenas conta as linhas órfãs, sem apagar.')
+    def sweep_orphans_command(dry_run):
+        """Apaga posts, curtidas, comentários e bloqueios cujo pai não existe mais."""
+        from .utils.integrity import sweep_orphans
+
+        found = sweep_orphans(dry_run=dry_run)
+        for table, total in found:
+            click.echo(f"{table}: {total}")
+        action = 'encontradas' if dry_run else 'removidas'
+        click.echo(f"{sum(total for _, total in found)} linhas órfãs {action}.")
+
+    @app.cli.command('build-assets')
+    @click.option('--clean', is_flag=True, help='Apaga as versões antigas de static/dist antes de gerar.')
+    def build_assets_command(clean):
+        """Gera os estáticos com hash no nome e as versões .gz/.br."""
+        from .utils.assets import build_assets, brotli
+
+        manifest = build_assets(app.static_folder, app.static_url_path, clean=clean)
+        for source, hashed in sorted(manifest.items()):
+            click.echo(f"{source} -> {hashed}")
+        if brotli is None:
+            click.echo("⚠️  Pacote brotli não instalado; apenas .gz gerados")
+        click.echo(f"{len(manifest)} arquivos no manifesto.")
+
+    @app.cli.command('reconcile-uploads')
+    @click.option('--adopt', is_flag=True, help='Move antes os uploads antigos (nome com uuid) para o armazenamento por hash.')
+    def reconcile_uploads_command(adopt):
+        """Recalcula as referências dos arquivos enviados e apaga os que ninguém usa."""
+        from .utils.storage import adopt_legacy_uploads, reconcile_references
+
+        if adopt:
+            adopted, freed = adopt_legacy_uploads()
+            click.echo(f"{adopted} uploads antigos movidos ({freed} bytes duplicados liberados).")
+        removed = reconcile_references()
+        click.echo(f"{removed} arquivos sem referência removidos.")
+
+    @app.cli.command('build-derivatives')
+    @click.option('--force', is_flag=True, help='Reprocessa também as capas que já têm derivados.')
+    def build_derivatives_command(force):
+        """Gera as versões redimensionadas (WebP/JPEG) das capas enviadas."""
+        from .utils.images import Image, process_contents
+
+        if Image is None:
+            click.echo("⚠️  Pacote Pillow não instalado; nada a fazer")
+            return
+        updated = process_contents(force=force)
+        click.echo(f"{updated} conteúdos com derivados atualizados.")
@@ -8,3 +8,67 @@ class BaseConfig:
         f"sqlite:///{os.path.join(basedir, 'database/meubanco.db')}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Dias que o registro de atividades (perfil) é mantido
+    ACTIVITY_RETENTION_DAYS = int(os.getenv("ACTIVITY_RETENTION_DAYS", 90))
+    # Exclusão de contas: linhas apagadas por lote e se o expurgo roda em
+    # uma thread logo após o pedido (senão fica para "flask purge-accounts")
+    ACCOUNT_DELETION_BATCH_SIZE = int(os.getenv("ACCOUNT_DELETION_BATCH_SIZE", 500))
+    ACCOUNT_DELETION_ASYNC = os.getenv("ACCOUNT_DELETION_ASYNC", "1") == "1"
+    # Cria tabelas/migra/semeia na inicialização quando o banco estiver
+    # desatualizado (desenvolvimento); em produção use "flask init-db"
+    AUTO_PROVISION = os.getenv("AUTO_PROVISION", "0") == "1"
+    # Cache de consultas/fragmentos: memory (LRU por processo), redis ou null
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", 60))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+    # Usa os nomes com hash gerados por "flask build-assets" (se houver manifesto)
+    STATIC_FINGERPRINTS = os.getenv("STATIC_FINGERPRINTS", "1") == "1"
+    # Derivados das capas: larguras geradas, processos do pool e se rodam
+    # logo após o upload (senão ficam para "flask build-derivatives")
+    IMAGE_WIDTHS = tuple(int(w) for w in os.getenv("IMAGE_WIDTHS", "320,640,960").split(","))
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+    IMAGE_DERIVATIVES_ASYNC = os.getenv("IMAGE_DERIVATIVES_ASYNC", "1") == "1"
+    # Downloads de obras: python (o worker transmite), x-sendfile ou x-accel
+    # (o proxy transmite; ver app/utils/delivery.py)
+    FILE_DELIVERY = os.getenv("FILE_DELIVERY", "python")
+    FILE_ACCEL_PREFIX = os.getenv("FILE_ACCEL_PREFIX", "/_uploads/")
+    # Visualizações: segundos entre gravações em lote e se a mesma sessão
+    # conta cada conteúdo só uma vez por dia
+    VIEW_FLUSH_INTERVAL = int(os.getenv("VIEW_FLUSH_INTERVAL", 10))
+    VIEW_DEDUP_SESSION = os.getenv("VIEW_DEDUP_SESSION", "1") == "1"
+    # Segundos entre gravações em lote do progresso de leitura (WatchHistory)
+    WATCH_FLUSH_INTERVAL = int(os.getenv("WATCH_FLUSH_INTERVAL", 15))
+    # Entrega das mensagens em tempo real: pub/sub memory (um processo) ou
+    # redis (vários workers)
+    PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+    PUBSUB_REDIS_URL = os.getenv("PUBSUB_REDIS_URL", CACHE_REDIS_URL)
+    # Chat em push (SSE/long-poll): keepalive, duração máxima de cada stream,
+    # espera do long-poll e máximo de mensagens recuperadas na reconexão
+    CHAT_HEARTBEAT_SECONDS = int(os.getenv("CHAT_HEARTBEAT_SECONDS", 15))
+    CHAT_STREAM_MAX_SECONDS = int(os.getenv("CHAT_STREAM_MAX_SECONDS", 300))
+    CHAT_LONGPOLL_SECONDS = int(os.getenv("CHAT_LONGPOLL_SECONDS", 25))
+    CHAT_CATCHUP_LIMIT = int(os.getenv("CHAT_CATCHUP_LIMIT", 200))
+    CHAT_RETRY_MS = int(os.getenv("CHAT_RETRY_MS", 3000))
+    # Linha do tempo inicial: posts guardados por usuário, seguidores a partir
+    # dos quais o autor não tem fan-out (lido na hora), posts copiados ao
+    # seguir alguém e segundos entre os cortes em lote
+    HOME_TIMELINE_MAX = int(os.getenv("HOME_TIMELINE_MAX", 500))
+    HOME_FANOUT_THRESHOLD = int(os.getenv("HOME_FANOUT_THRESHOLD", 1000))
+    HOME_BACKFILL = int(os.getenv("HOME_BACKFILL", 50))
+    HOME_TRIM_INTERVAL = int(os.getenv("HOME_TRIM_INTERVAL", 30))
+    # Senhas: custo do bcrypt (hashes com outro custo são refeitos no login),
+    # threads de hash por processo e cálculos que podem esperar na fila
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
+    PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", 2))
+    PASSWORD_QUEUE_SIZE = int(os.getenv("PASSWORD_QUEUE_SIZE", 8))
+    # Logins errados aceitos por conta e por IP em cada janela (segundos);
+    # atrás de um proxy, configure o ProxyFix para o IP real do cliente
+    LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", 900))
+    LOGIN_MAX_ACCOUNT_FAILURES = int(os.getenv("LOGIN_MAX_ACCOUNT_FAILURES", 10))
+    LOGIN_MAX_IP_FAILURES = int(os.getenv("LOGIN_MAX_IP_FAILURES", 50))
+    # Contadores de logins errados: memory (por processo, até MAX_KEYS chaves)
+    # ou redis (compartilhado entre workers; recomendado com vários processos)
+    LOGIN_THROTTLE_BACKEND = os.getenv("LOGIN_THROTTLE_BACKEND", "memory")
+    LOGIN_THROTTLE_REDIS_URL = os.getenv("LOGIN_THROTTLE_REDIS_URL", CACHE_REDIS_URL)
+    LOGIN_THROTTLE_MAX_KEYS = int(os.getenv("LOGIN_THROTTLE_MAX_KEYS", 10000))
@@ -2,6 +2,7 @@
 Módulo para criar dados padrão: conta MemóriaViva e comunidade oficial
 """
 from .models import db, Usuario, Community
+from .utils.membership import touch_membership
 
 def create_default_account_and_community():
     """
@@ -38,6 +39,8 @@ def create_default_account_and_community():
                 is_filtered=False
             )
             db.session.add(memoria_viva_community)
+            db.session.flush()
+            touch_membership(memoria_viva_user.id, memoria_viva_community.id, role='owner')
             db.session.commit()
             print("✅ Comunidade MemóriaViva criada com sucesso!")
         else:
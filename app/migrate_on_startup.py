@@ -1,7 +1,58 @@
 """
-Módulo para aplicar migrações pendentes na inicialização da aplicação
+Módulo para aplicar migrações pendentes ao banco
+
+A inicialização da aplicação só confere a versão gravada em
+tb_schema_version (uma consulta). Criar tabelas, migrar e semear dados
+padrão é feito por "flask init-db" (ou na inicialização com AUTO_PROVISION=1).
 """
 from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+# Incrementar sempre que uma migração for adicionada a apply_all_migrations
+# ou um modelo novo exigir uma tabela (criada por create_all no provisionamento)
+SCHEMA_VERSION = 12
+
+def get_schema_version(db):
+    """
+    Retorna a versão do esquema gravada no banco (None se nunca provisionado)
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .models import SchemaVersion
+
+    try:
+        return db.session.query(db.func.max(SchemaVersion.version)).scalar()
+    except SQLAlchemyError:
+        # tb_schema_version ainda não existe
+        db.session.rollback()
+        return None
+
+def schema_is_current(db):
+    """
+    Indica se o banco já está na versão esperada pelo código
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    version = get_schema_version(db)
+    return version is not None and version >= SCHEMA_VERSION
+
+def provision_database(db):
+    """
+    Cria as tabelas, aplica todas as migrações e grava SCHEMA_VERSION
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .models import SchemaVersion
+
+    db.create_all()
+    apply_all_migrations(db)
+    db.session.query(SchemaVersion).delete()
+    db.session.add(SchemaVersion(version=SCHEMA_VERSION))
+    db.session.commit()
+    print(f"✅ Esquema do banco na versão {SCHEMA_VERSION}")
 
 def apply_content_migration(db):
     """
@@ -78,6 +129,555 @@ def apply_ratings_migration(db):
         db.session.rollback()
         raise
 
+def apply_pagination_indexes(db):
+    """
+    Cria os índices compostos (created_at, id) usados pela paginação por cursor
+    em tabelas que já existiam antes deles (db.create_all() não os adiciona)
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .models import Usuario, Content, CommunityPost, PrivateMessage, Rating
+
+    try:
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+        for model in (Usuario, Content, CommunityPost, PrivateMessage, Rating):
+            # Índices sobre colunas criadas por migrações posteriores (inclusive
+            # no WHERE de índices parciais) ficam para elas
+            existing = {col['name'] for col in inspector.get_columns(model.__tablename__)}
+            for index in model.__table__.indexes:
+                partial = any(index.dialect_options[name]['where'] is not None for name in ('sqlite', 'postgresql'))
+                if not partial and all(col.name in existing for col in index.columns):
+                    index.create(db.engine, checkfirst=True)
+        print("✓ Índices de paginação verificados")
+    except Exception as e:
+        print(f"❌ Erro ao criar índices de paginação: {e}")
+        raise
+
+def apply_counters_migration(db):
+    """
+    Adiciona as colunas de contadores desnormalizados em tb_community_posts e
+    tb_contents (e as versões usadas nos ETags de conteúdos e comunidades) e,
+    quando alguma coluna é criada, preenche os valores a partir das tabelas
+    de curtidas/comentários/avaliações
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    counter_columns = {
+        'tb_community_posts': ['post_likes_count', 'post_comments_count'],
+        'tb_contents': ['cnt_likes_count', 'cnt_comments_count', 'cnt_ratings_count', 'cnt_version'],
+        'tb_communities': ['com_feed_version'],
+    }
+    try:
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+        tables = inspector.get_table_names()
+
+        added = False
+        for table, names in counter_columns.items():
+            if table not in tables:
+                continue
+            columns = [col['name'] for col in inspector.get_columns(table)]
+            for name in names:
+                if name not in columns:
+                    print(f"📝 Adicionando coluna {name} em {table}...")
+                    db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} INTEGER DEFAULT 0 NOT NULL'))
+                    added = True
+
+        if added:
+            db.session.commit()
+            from .utils.counters import reconcile_counters
+            drift = reconcile_counters(fix=True)
+            print(f"✅ Contadores criados e preenchidos ({len(drift)} linhas ajustadas)")
+        else:
+            print("✓ Colunas de contadores já existem")
+    except Exception as e:
+        print(f"❌ Erro ao aplicar migração de contadores: {e}")
+        db.session.rollback()
+        raise
+
+def apply_search_index(db):
+    """
+    Cria o índice de busca textual do backend em uso e, se ele estiver vazio
+    com conteúdos já cadastrados, faz a indexação inicial
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .models import Content
+    from .utils.search import get_search_backend, rebuild_index
+
+    try:
+        backend = get_search_backend()
+        backend.ensure_schema()
+        if backend.is_empty() and db.session.query(Content.id).first() is not None:
+            print(f"📝 Indexando conteúdos para busca ({backend.name})...")
+            total = rebuild_index()
+            print(f"✅ {total} conteúdos indexados")
+        else:
+            print(f"✓ Índice de busca ({backend.name}) pronto")
+    except Exception as e:
+        print(f"❌ Erro ao preparar índice de busca: {e}")
+        db.session.rollback()
+        raise
+
+def apply_rating_summaries(db):
+    """
+    Preenche tb_rating_summaries a partir de tb_ratings quando a tabela de
+    resumos acabou de ser criada (vazia com avaliações existentes)
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .models import Rating, RatingSummary
+    from .utils.ratings import recompute_summaries
+
+    try:
+        if (db.session.query(RatingSummary.content_id).first() is None
+                and db.session.query(Rating.id).first() is not None):
+            total = recompute_summaries()
+            db.session.commit()
+            print(f"✅ {total} resumos de avaliações criados")
+        else:
+            print("✓ Resumos de avaliações prontos")
+    except Exception as e:
+        print(f"❌ Erro ao preencher resumos de avaliações: {e}")
+        db.session.rollback()
+        raise
+
+def apply_activity_backfill(db):
+    """
+    Preenche tb_user_activity a partir do histórico quando a tabela acabou de
+    ser criada (vazia com posts ou avaliações existentes)
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .models import UserActivity, Rating, CommunityPost
+    from .utils.activity import backfill_activities
+
+    try:
+        if (db.session.query(UserActivity.id).first() is None
+                and (db.session.query(Rating.id).first() is not None
+                     or db.session.query(CommunityPost.id).first() is not None)):
+            total = backfill_activities()
+            print(f"✅ {total} atividades de usuários registradas")
+        else:
+            print("✓ Registro de atividades pronto")
+    except Exception as e:
+        print(f"❌ Erro ao preencher registro de atividades: {e}")
+        db.session.rollback()
+        raise
+
+def apply_user_stats(db):
+    """
+    Preenche tb_user_stats quando a tabela acabou de ser criada (vazia com
+    usuários existentes)
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .models import Usuario, UserStats
+    from .utils.user_stats import recompute_user_stats
+
+    try:
+        if (db.session.query(UserStats.user_id).first() is None
+                and db.session.query(Usuario.id).first() is not None):
+            total = recompute_user_stats()
+            db.session.commit()
+            print(f"✅ Estatísticas de {total} usuários calculadas")
+        else:
+            print("✓ Estatísticas de usuários prontas")
+    except Exception as e:
+        print(f"❌ Erro ao calcular estatísticas de usuários: {e}")
+        db.session.rollback()
+        raise
+
+def apply_unread_messages_column(db):
+    """
+    Adiciona ust_unread_messages_count a tb_user_stats e preenche com as
+    mensagens não lidas de cada usuário
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    try:
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+
+        if 'tb_user_stats' not in inspector.get_table_names():
+            print("⚠️ Tabela tb_user_stats não existe ainda. Será criada pelo db.create_all()")
+            return
+
+        columns = [col['name'] for col in inspector.get_columns('tb_user_stats')]
+        if 'ust_unread_messages_count' in columns:
+            print("✓ Contador de mensagens não lidas pronto")
+            return
+        print("📝 Adicionando coluna ust_unread_messages_count...")
+        db.session.execute(text(
+            "ALTER TABLE tb_user_stats ADD COLUMN ust_unread_messages_count INTEGER DEFAULT 0 NOT NULL"
+        ))
+        db.session.execute(text(
+            "UPDATE tb_user_stats SET ust_unread_messages_count = ("
+            "SELECT COUNT(*) FROM tb_private_messages "
+            "WHERE msg_receiver_id = ust_user_id AND NOT msg_is_read AND msg_sender_id <> msg_receiver_id)"
+        ))
+        db.session.commit()
+        print("✅ Contador de mensagens não lidas preenchido")
+    except Exception as e:
+        print(f"❌ Erro ao adicionar contador de mensagens não lidas: {e}")
+        db.session.rollback()
+        raise
+
+def apply_post_fanout_flag(db):
+    """
+    Adiciona a coluna post_fanned_out (post copiado para as linhas do tempo
+    dos seguidores) a tb_community_posts. Posts existentes de autores com
+    HOME_FANOUT_THRESHOLD seguidores ou mais ficam sem fan-out, como os
+    novos. Roda antes das migrações que carregam posts pelo ORM e da
+    recriação das tabelas (cascatas), que copiaria a coluna já com o valor
+    padrão
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from flask import current_app
+    from .models import CommunityPost, Follower
+    from .utils.home_timeline import DEFAULT_FANOUT_THRESHOLD
+
+    try:
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+
+        if 'tb_community_posts' not in inspector.get_table_names():
+            print("⚠️ Tabela tb_community_posts não existe ainda. Será criada pelo db.create_all()")
+            return
+
+        columns = [col['name'] for col in inspector.get_columns('tb_community_posts')]
+        if 'post_fanned_out' in columns:
+            print("✓ Campo post_fanned_out já existe na tabela tb_community_posts")
+            return
+
+        print("📝 Adicionando coluna post_fanned_out...")
+        db.session.execute(text('ALTER TABLE tb_community_posts ADD COLUMN post_fanned_out BOOLEAN DEFAULT TRUE NOT NULL'))
+        threshold = current_app.config.get('HOME_FANOUT_THRESHOLD', DEFAULT_FANOUT_THRESHOLD)
+        # Contagem direta: tb_user_stats pode ainda não estar preenchida
+        big_authors = (db.select(Follower.followed_id)
+                       .group_by(Follower.followed_id)
+                       .having(db.func.count() >= threshold))
+        pulled = db.session.execute(
+            db.update(CommunityPost)
+            .where(CommunityPost.author_id.in_(big_authors))
+            .values(fanned_out=False)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        for index in CommunityPost.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        print(f"✅ Campo post_fanned_out adicionado ({pulled} posts lidos na hora)")
+    except Exception as e:
+        print(f"❌ Erro ao aplicar migração de fan-out dos posts: {e}")
+        db.session.rollback()
+        raise
+
+def apply_account_deletion_migration(db):
+    """
+    Adiciona a coluna usr_deleted_at (bloqueio de contas em exclusão) à tabela tb_users
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    try:
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+
+        if 'tb_users' not in inspector.get_table_names():
+            print("⚠️ Tabela tb_users não existe ainda. Será criada pelo db.create_all()")
+            return
+
+        columns = [col['name'] for col in inspector.get_columns('tb_users')]
+        if 'usr_deleted_at' not in columns:
+            print("📝 Adicionando coluna usr_deleted_at...")
+            db.session.execute(text('ALTER TABLE tb_users ADD COLUMN usr_deleted_at DATETIME'))
+            db.session.commit()
+            print("✅ Campo usr_deleted_at adicionado com sucesso!")
+        else:
+            print("✓ Campo usr_deleted_at já existe na tabela tb_users")
+
+    except Exception as e:
+        print(f"❌ Erro ao aplicar migração de exclusão de contas: {e}")
+        db.session.rollback()
+        raise
+
+def apply_blocks_version_migration(db):
+    """
+    Adiciona a coluna usr_blocks_version (versão do cache de comunidades
+    bloqueadas) à tabela tb_users
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    try:
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+
+        if 'tb_users' not in inspector.get_table_names():
+            print("⚠️ Tabela tb_users não existe ainda. Será criada pelo db.create_all()")
+            return
+
+        columns = [col['name'] for col in inspector.get_columns('tb_users')]
+        if 'usr_blocks_version' not in columns:
+            print("📝 Adicionando coluna usr_blocks_version...")
+            db.session.execute(text('ALTER TABLE tb_users ADD COLUMN usr_blocks_version INTEGER DEFAULT 0 NOT NULL'))
+            db.session.commit()
+            print("✅ Campo usr_blocks_version adicionado com sucesso!")
+        else:
+            print("✓ Campo usr_blocks_version já existe na tabela tb_users")
+
+    except Exception as e:
+        print(f"❌ Erro ao aplicar migração de versão dos bloqueios: {e}")
+        db.session.rollback()
+        raise
+
+def apply_cascade_foreign_keys(db):
+    """
+    Recria as chaves estrangeiras das tabelas de comunidades com ON DELETE
+    CASCADE, limpando antes as linhas órfãs que as impediriam
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .utils.integrity import add_cascades, missing_cascades, sweep_orphans
+
+    try:
+        tables = missing_cascades()
+        if not tables:
+            print("✓ Chaves estrangeiras em cascata já aplicadas")
+            return
+        removed = sum(total for _, total in sweep_orphans())
+        if removed:
+            print(f"📝 {removed} linhas órfãs removidas")
+        print("📝 Aplicando ON DELETE CASCADE em " + ", ".join(table.name for table in tables) + "...")
+        add_cascades(tables)
+        print("✅ Chaves estrangeiras em cascata aplicadas com sucesso!")
+    except Exception as e:
+        print(f"❌ Erro ao aplicar chaves estrangeiras em cascata: {e}")
+        db.session.rollback()
+        raise
+
+def apply_stored_files(db):
+    """
+    Move os uploads antigos (uploads/obras, uploads/thumbnails) para o
+    armazenamento por hash, juntando arquivos duplicados
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .utils.storage import adopt_legacy_uploads
+
+    try:
+        adopted, freed = adopt_legacy_uploads()
+        if adopted:
+            print(f"✅ {adopted} uploads movidos para o armazenamento por hash ({freed} bytes duplicados liberados)")
+        else:
+            print("✓ Nenhum upload antigo a mover")
+    except Exception as e:
+        print(f"❌ Erro ao mover uploads para o armazenamento por hash: {e}")
+        db.session.rollback()
+        raise
+
+def apply_image_variants_migration(db):
+    """
+    Adiciona a coluna cnt_image_variants (capas redimensionadas) à tabela
+    tb_contents. Os derivados são gerados por "flask build-derivatives"
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    try:
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+
+        if 'tb_contents' not in inspector.get_table_names():
+            print("⚠️ Tabela tb_contents não existe ainda. Será criada pelo db.create_all()")
+            return
+
+        columns = [col['name'] for col in inspector.get_columns('tb_contents')]
+        if 'cnt_image_variants' not in columns:
+            print("📝 Adicionando coluna cnt_image_variants...")
+            db.session.execute(text('ALTER TABLE tb_contents ADD COLUMN cnt_image_variants JSON'))
+            db.session.commit()
+            print("✅ Campo cnt_image_variants adicionado com sucesso!")
+        else:
+            print("✓ Campo cnt_image_variants já existe na tabela tb_contents")
+
+    except Exception as e:
+        print(f"❌ Erro ao aplicar migração de derivados de imagens: {e}")
+        db.session.rollback()
+        raise
+
+def apply_watch_history_indexes(db):
+    """
+    Cria o índice único (usuário, conteúdo) e o índice (usuário, último
+    acesso) em tb_watch_history, mantendo só a linha mais recente de cada
+    par duplicado
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .models import WatchHistory
+
+    try:
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+
+        if 'tb_watch_history' not in inspector.get_table_names():
+            print("⚠️ Tabela tb_watch_history não existe ainda. Será criada pelo db.create_all()")
+            return
+
+        existing = {index['name'] for index in inspector.get_indexes('tb_watch_history')}
+        if 'ux_watch_history_user_content' not in existing:
+            removed = db.session.execute(text(
+                'DELETE FROM tb_watch_history WHERE EXISTS ('
+                'SELECT 1 FROM tb_watch_history AS newer '
+                'WHERE newer.wht_user_id = tb_watch_history.wht_user_id '
+                'AND newer.wht_content_id = tb_watch_history.wht_content_id '
+                'AND (newer.wht_last_watched > tb_watch_history.wht_last_watched '
+                'OR (newer.wht_last_watched = tb_watch_history.wht_last_watched '
+                'AND newer.wht_id > tb_watch_history.wht_id)))'
+            )).rowcount
+            db.session.commit()
+            if removed:
+                print(f"📝 {removed} registros duplicados de histórico removidos")
+        for index in WatchHistory.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        print("✓ Índices do histórico de leitura verificados")
+    except Exception as e:
+        print(f"❌ Erro ao criar índices do histórico de leitura: {e}")
+        db.session.rollback()
+        raise
+
+def apply_message_conversation_migration(db):
+    """
+    Adiciona a chave de conversa (msg_conversation, "menor:maior" id do par)
+    a tb_private_messages, preenche as mensagens existentes e cria o índice
+    (conversa, id)
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .models import PrivateMessage
+
+    try:
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+
+        if 'tb_private_messages' not in inspector.get_table_names():
+            print("⚠️ Tabela tb_private_messages não existe ainda. Será criada pelo db.create_all()")
+            return
+
+        columns = [col['name'] for col in inspector.get_columns('tb_private_messages')]
+        if 'msg_conversation' not in columns:
+            print("📝 Adicionando coluna msg_conversation...")
+            # NOT NULL com default vazio: o UPDATE abaixo preenche as linhas existentes
+            db.session.execute(text(
+                "ALTER TABLE tb_private_messages ADD COLUMN msg_conversation VARCHAR(32) DEFAULT '' NOT NULL"
+            ))
+        filled = db.session.execute(text(
+            "UPDATE tb_private_messages SET msg_conversation = CASE "
+            "WHEN msg_sender_id < msg_receiver_id "
+            "THEN CAST(msg_sender_id AS VARCHAR(16)) || ':' || CAST(msg_receiver_id AS VARCHAR(16)) "
+            "ELSE CAST(msg_receiver_id AS VARCHAR(16)) || ':' || CAST(msg_sender_id AS VARCHAR(16)) END "
+            "WHERE msg_conversation IS NULL OR msg_conversation = ''"
+        )).rowcount
+        db.session.commit()
+        if filled:
+            print(f"✅ Chave de conversa preenchida em {filled} mensagens")
+        for index in PrivateMessage.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        print("✓ Índice de conversas verificado")
+    except Exception as e:
+        print(f"❌ Erro ao aplicar migração de conversas: {e}")
+        db.session.rollback()
+        raise
+
+def apply_conversation_summaries(db):
+    """
+    Preenche tb_conversation_summaries (caixa de entrada) a partir das
+    mensagens quando a tabela acabou de ser criada
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .models import ConversationSummary, PrivateMessage
+    from .utils.inbox import rebuild_summaries
+
+    try:
+        if (db.session.query(ConversationSummary.user_id).first() is None
+                and db.session.query(PrivateMessage.id).first() is not None):
+            total = rebuild_summaries()
+            db.session.commit()
+            print(f"✅ {total} resumos de conversas criados")
+        else:
+            print("✓ Caixas de entrada prontas")
+    except Exception as e:
+        print(f"❌ Erro ao preencher caixas de entrada: {e}")
+        db.session.rollback()
+        raise
+
+def apply_home_timeline(db):
+    """
+    Cria os índices usados pela linha do tempo inicial (seguidores por autor e
+    posts por autor) e preenche tb_home_timeline quando ela acabou de ser
+    criada
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .models import Follower, CommunityPost, HomeTimelineEntry
+    from .utils.home_timeline import rebuild_timelines
+
+    try:
+        for model in (Follower, CommunityPost):
+            for index in model.__table__.indexes:
+                index.create(db.engine, checkfirst=True)
+        print("✓ Índices da linha do tempo verificados")
+        if (db.session.query(HomeTimelineEntry.user_id).first() is None
+                and db.session.query(CommunityPost.id).first() is not None):
+            total = rebuild_timelines()
+            db.session.commit()
+            print(f"✅ Linhas do tempo de {total} usuários preenchidas")
+    except Exception as e:
+        print(f"❌ Erro ao preparar linhas do tempo: {e}")
+        db.session.rollback()
+        raise
+
+def apply_community_memberships(db):
+    """
+    Preenche tb_community_memberships a partir de donos, posts, comentários e
+    curtidas quando ela acabou de ser criada
+
+    Args:
+        db: Instância do SQLAlchemy
+    """
+    from .models import Community, CommunityMembership
+    from .utils.membership import rebuild_memberships
+
+    try:
+        if (db.session.query(CommunityMembership.user_id).first() is None
+                and db.session.query(Community.id).first() is not None):
+            total = rebuild_memberships()
+            db.session.commit()
+            print(f"✅ {total} participações em comunidades preenchidas")
+        else:
+            print("✓ Participações em comunidades já preenchidas")
+    except Exception as e:
+        print(f"❌ Erro ao preencher participações em comunidades: {e}")
+        db.session.rollback()
+        raise
+
 def apply_all_migrations(db):
     """
     Aplica todas as migrações pendentes
@@ -88,6 +688,24 @@ def apply_all_migrations(db):
     print("🔄 Aplicando migrações...")
     apply_content_migration(db)
     apply_ratings_migration(db)
+    apply_pagination_indexes(db)
+    apply_counters_migration(db)
+    apply_post_fanout_flag(db)
+    apply_search_index(db)
+    apply_rating_summaries(db)
+    apply_activity_backfill(db)
+    apply_unread_messages_column(db)
+    apply_user_stats(db)
+    apply_account_deletion_migration(db)
+    apply_blocks_version_migration(db)
+    apply_cascade_foreign_keys(db)
+    apply_stored_files(db)
+    apply_image_variants_migration(db)
+    apply_watch_history_indexes(db)
+    apply_message_conversation_migration(db)
+    apply_conversation_summaries(db)
+    apply_home_timeline(db)
+    apply_community_memberships(db)
     try:
         # Adicionar cnt_views_count em tb_contents se não existir
         from sqlalchemy import inspect
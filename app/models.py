@@ -1,17 +1,28 @@
+import sqlite3
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from flask_login import UserMixin
-from .extensions import bcrypt
-from werkzeug.security import check_password_hash as werkzeug_check_password_hash
 
 db = SQLAlchemy()
 
 db = SQLAlchemy()
 
+# O SQLite só respeita chaves estrangeiras (e ON DELETE CASCADE) quando
+# "PRAGMA foreign_keys" está ligado, e isso vale por conexão
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
 class Usuario(UserMixin, db.Model):
     __tablename__ = 'tb_users'
     __table_args__ = (
         db.UniqueConstraint('usr_email', name='uq_usuario_email'),
+        db.Index('ix_users_created_id', 'usr_created_at', 'usr_id'),
         {'sqlite_autoincrement': True}
     )
 
@@ -24,6 +35,11 @@ class Usuario(UserMixin, db.Model):
     role = db.Column('usr_role', db.String(32), default='visitante', nullable=False)
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
     criado_em = db.Column('usr_created_at', db.DateTime, default=datetime.utcnow, nullable=False)
+    # Preenchido quando a exclusão da conta é pedida; a conta fica bloqueada até ser apagada
+    excluido_em = db.Column('usr_deleted_at', db.DateTime)
+    # Incrementada a cada bloqueio/desbloqueio de comunidade; compõe a chave do
+    # cache dos bloqueios (app.utils.community_access)
+    blocks_version = db.Column('usr_blocks_version', db.Integer, default=0, server_default='0', nullable=False)
 
     seguidores = db.relationship('Follower', foreign_keys='Follower.follower_id', backref='seguidor', lazy='dynamic')
     seguidos = db.relationship('Follower', foreign_keys='Follower.followed_id', backref='seguido', lazy='dynamic')
@@ -33,6 +49,7 @@ class Usuario(UserMixin, db.Model):
     likes = db.relationship('Like', backref='user', lazy='dynamic')
     historico_assistido = db.relationship('WatchHistory', backref='user', lazy='dynamic')
     avaliacoes = db.relationship('Rating', back_populates='usuario', lazy='dynamic')
+    stats = db.relationship('UserStats', uselist=False, cascade='all, delete-orphan')
 
     def __repr__(self):
         return f"<Usuario {self.email}>"
@@ -40,24 +57,41 @@ class Usuario(UserMixin, db.Model):
     def is_administrador(self):
         return self.is_admin
 
+    @property
+    def is_active(self):
+        """Contas com exclusão pendente não podem mais entrar (Flask-Login)"""
+        return self.excluido_em is None
+
+    @property
+    def estatisticas(self):
+        """Contadores do perfil (UserStats); zerados se ainda não houver registro"""
+        return self.stats or UserStats(user_id=self.id, comments_count=0, likes_count=0,
+                                       ratings_count=0, followers_count=0, following_count=0)
+
     @property
     def senha(self):
         raise AttributeError("Senha não pode ser lida diretamente.")
 
     @senha.setter
     def senha(self, senha_plaintext):
-        self._senha_hash = bcrypt.generate_password_hash(senha_plaintext).decode('utf-8')
+        from .utils.passwords import hash_password
+
+        self._senha_hash = hash_password(senha_plaintext)
 
     def checar_senha(self, senha_plaintext):
-        try:
-            if bcrypt.check_password_hash(self._senha_hash, senha_plaintext):
-                return True
-        except Exception:
-            pass
-        try:
-            return werkzeug_check_password_hash(self._senha_hash, senha_plaintext)
-        except Exception:
+        """Confere a senha com o verificador do esquema do hash (bcrypt ou werkzeug legado)"""
+        from .utils.passwords import verify_password
+
+        return verify_password(self._senha_hash, senha_plaintext)
+
+    def atualizar_hash_senha(self, senha_plaintext):
+        """Refaz um hash legado (werkzeug) ou com outro custo; chamar só após checar_senha"""
+        from .utils.passwords import needs_rehash
+
+        if not needs_rehash(self._senha_hash):
             return False
+        self.senha = senha_plaintext
+        return True
     
     # Métodos para gerenciar bloqueios de comunidades
     def block_community(self, community_id, reason=None):
@@ -85,6 +119,7 @@ class Usuario(UserMixin, db.Model):
             reason=reason
         )
         db.session.add(block)
+        self._bump_blocks_version()
         db.session.commit()
         
         return True, "Comunidade bloqueada com sucesso"
@@ -102,18 +137,25 @@ class Usuario(UserMixin, db.Model):
             return False, "Comunidade não está bloqueada"
         
         db.session.delete(block)
+        self._bump_blocks_version()
         db.session.commit()
         
         return True, "Bloqueio removido com sucesso"
     
+    def _bump_blocks_version(self):
+        """Nova versão dos bloqueios: as entradas antigas do cache deixam de valer"""
+        db.session.execute(
+            db.update(Usuario).where(Usuario.id == self.id)
+            .values(blocks_version=Usuario.blocks_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.expire(self, ['blocks_version'])
+
     def is_community_blocked(self, community_id):
-        """Verifica se uma comunidade está bloqueada pelo usuário"""
-        from .models import CommunityBlock
+        """Verifica se uma comunidade está bloqueada pelo usuário (conjunto em cache)"""
+        from .utils.community_access import blocked_community_ids
         
-        return CommunityBlock.query.filter_by(
-            user_id=self.id, 
-            community_id=community_id
-        ).first() is not None
+        return community_id in blocked_community_ids(self)
     
     def get_blocked_communities(self):
         """Retorna todas as comunidades bloqueadas pelo usuário"""
@@ -123,27 +165,56 @@ class Usuario(UserMixin, db.Model):
         return [block.community for block in blocks]
     
     def get_accessible_communities(self, include_filtered=False):
-        """Retorna todas as comunidades acessíveis ao usuário"""
-        from sqlalchemy import select
-        from .models import Community, CommunityBlock
-        
-        # Base: somente comunidades ativas
-        query = Community.query.filter(Community.status == 'active')
-        
-        # Excluir comunidades bloqueadas pelo usuário (subconsulta com select())
-        blocked_ids_select = select(CommunityBlock.community_id).where(CommunityBlock.user_id == self.id)
-        query = query.filter(~Community.id.in_(blocked_ids_select))
-        
-        # Filtrar conteúdo sensível, se aplicável
-        if not include_filtered:
-            query = query.filter(Community.is_filtered.is_(False))
+        """Retorna as comunidades acessíveis ao usuário (snapshots do diretório em cache)"""
+        from .utils.community_access import accessible_communities
         
-        return query.order_by(Community.created_at.asc()).all()
+        return accessible_communities(self, include_filtered=include_filtered)
     
     
 
+#Contadores por usuário exibidos no perfil, mantidos por app.utils.user_stats
+class UserStats(db.Model):
+    __tablename__ = 'tb_user_stats'
+
+    user_id = db.Column('ust_user_id', db.Integer, db.ForeignKey('tb_users.usr_id', ondelete='CASCADE'), primary_key=True)
+    comments_count = db.Column('ust_comments_count', db.Integer, default=0, server_default='0', nullable=False)
+    likes_count = db.Column('ust_likes_count', db.Integer, default=0, server_default='0', nullable=False)
+    ratings_count = db.Column('ust_ratings_count', db.Integer, default=0, server_default='0', nullable=False)
+    followers_count = db.Column('ust_followers_count', db.Integer, default=0, server_default='0', nullable=False)
+    following_count = db.Column('ust_following_count', db.Integer, default=0, server_default='0', nullable=False)
+    unread_messages_count = db.Column('ust_unread_messages_count', db.Integer, default=0, server_default='0', nullable=False)
+
+#Versão do esquema já aplicada ao banco (ver migrate_on_startup.SCHEMA_VERSION)
+class SchemaVersion(db.Model):
+    __tablename__ = 'tb_schema_version'
+
+    version = db.Column('sv_version', db.Integer, primary_key=True)
+    applied_at = db.Column('sv_applied_at', db.DateTime, default=datetime.utcnow, nullable=False)
+
+#Exclusões de conta processadas em segundo plano por app.utils.account_deletion
+class AccountDeletion(db.Model):
+    __tablename__ = 'tb_account_deletions'
+
+    id = db.Column('acd_id', db.Integer, primary_key=True)
+    # Sem chave estrangeira: o usuário é apagado antes de o registro ser concluído
+    user_id = db.Column('acd_user_id', db.Integer, nullable=False, unique=True)
+    status = db.Column('acd_status', db.String(20), default='pending', nullable=False)  # pending, running, done, failed
+    step = db.Column('acd_step', db.Integer, default=0, nullable=False)  # próxima etapa a executar
+    deleted_rows = db.Column('acd_deleted_rows', db.Integer, default=0, nullable=False)
+    error = db.Column('acd_error', db.Text)
+    requested_at = db.Column('acd_requested_at', db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column('acd_updated_at', db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column('acd_finished_at', db.DateTime)
+
+    def __repr__(self):
+        return f"<AccountDeletion user={self.user_id} {self.status} step={self.step}>"
+
 class Follower(db.Model):
     __tablename__ = 'tb_followers'
+    __table_args__ = (
+        # Seguidores de um autor (fan-out da linha do tempo)
+        db.Index('ix_followers_followed', 'fol_followed_id', 'fol_follower_id'),
+    )
 
     follower_id = db.Column('fol_follower_id', db.Integer, db.ForeignKey('tb_users.usr_id'), primary_key=True)
     followed_id = db.Column('fol_followed_id', db.Integer, db.ForeignKey('tb_users.usr_id'), primary_key=True)
@@ -151,34 +222,91 @@ class Follower(db.Model):
 
 class PrivateMessage(db.Model):
     __tablename__ = 'tb_private_messages'
+    __table_args__ = (
+        db.Index('ix_private_messages_pair_sent', 'msg_sender_id', 'msg_receiver_id', 'msg_sent_at', 'msg_id'),
+        # Uma conversa inteira (nos dois sentidos) é um intervalo deste índice
+        db.Index('ix_private_messages_conversation_id', 'msg_conversation', 'msg_id'),
+    )
 
     id = db.Column('msg_id', db.Integer, primary_key=True)
     sender_id = db.Column('msg_sender_id', db.Integer, db.ForeignKey('tb_users.usr_id'), nullable=False)
     receiver_id = db.Column('msg_receiver_id', db.Integer, db.ForeignKey('tb_users.usr_id'), nullable=False)
+    # "menor_id:maior_id" do par de usuários, preenchido ao inserir
+    conversation = db.Column('msg_conversation', db.String(32), nullable=False)
     text = db.Column('msg_text', db.Text, nullable=False)
     sent_at = db.Column('msg_sent_at', db.DateTime, default=datetime.utcnow, nullable=False)
     is_read = db.Column('msg_is_read', db.Boolean, default=False, nullable=False)
 
+    @staticmethod
+    def conversation_key(user_a, user_b):
+        """Chave da conversa entre dois usuários, igual nos dois sentidos."""
+        low, high = sorted((int(user_a), int(user_b)))
+        return f'{low}:{high}'
+
+@event.listens_for(PrivateMessage, 'before_insert')
+def _set_conversation_key(mapper, connection, message):
+    if message.conversation is None:
+        message.conversation = PrivateMessage.conversation_key(message.sender_id, message.receiver_id)
+
+#Linha do tempo inicial de um usuário: posts de quem ele segue, copiados na publicação (app.utils.home_timeline)
+class HomeTimelineEntry(db.Model):
+    __tablename__ = 'tb_home_timeline'
+    __table_args__ = (
+        db.Index('ix_home_timeline_user_created_post', 'htl_user_id', 'htl_created_at', 'htl_post_id'),
+    )
+
+    user_id = db.Column('htl_user_id', db.Integer, db.ForeignKey('tb_users.usr_id', ondelete='CASCADE'), primary_key=True)
+    post_id = db.Column('htl_post_id', db.Integer, db.ForeignKey('tb_community_posts.post_id', ondelete='CASCADE'), primary_key=True)
+    author_id = db.Column('htl_author_id', db.Integer, nullable=False)
+    # Cópia de CommunityPost.created_at, para a leitura por intervalo do índice
+    created_at = db.Column('htl_created_at', db.DateTime, nullable=False)
+
+#Resumo de uma conversa privada na caixa de entrada de um participante (app.utils.inbox)
+class ConversationSummary(db.Model):
+    __tablename__ = 'tb_conversation_summaries'
+    __table_args__ = (
+        # Caixa de entrada: conversas do usuário da mais recente para a mais antiga
+        db.Index('ix_conversation_summaries_user_last', 'cvs_user_id', 'cvs_last_at', 'cvs_last_message_id'),
+    )
+
+    user_id = db.Column('cvs_user_id', db.Integer, db.ForeignKey('tb_users.usr_id', ondelete='CASCADE'), primary_key=True)
+    peer_id = db.Column('cvs_peer_id', db.Integer, db.ForeignKey('tb_users.usr_id', ondelete='CASCADE'), primary_key=True)
+    conversation = db.Column('cvs_conversation', db.String(32), nullable=False)
+    last_message_id = db.Column('cvs_last_message_id', db.Integer, nullable=False)
+    last_sender_id = db.Column('cvs_last_sender_id', db.Integer, nullable=False)
+    last_preview = db.Column('cvs_last_preview', db.String(140), nullable=False)
+    last_at = db.Column('cvs_last_at', db.DateTime, nullable=False)
+    unread_count = db.Column('cvs_unread_count', db.Integer, default=0, server_default='0', nullable=False)
+
+    peer = db.relationship('Usuario', foreign_keys=[peer_id], lazy='joined')
+
 #Classe para que as mensagens fiquem visiveis para todos os usuários
 class CommunityPost(db.Model):
     __tablename__ = 'tb_community_posts'
+    __table_args__ = (
+        db.Index('ix_community_posts_created_id', 'post_created_at', 'post_id'),
+        db.Index('ix_community_posts_community_created_id', 'post_community_id', 'post_created_at', 'post_id'),
+        db.Index('ix_community_posts_author_created_id', 'post_author_id', 'post_created_at', 'post_id'),
+        # Linha do tempo inicial: só os posts sem fan-out, lidos na hora
+        db.Index('ix_community_posts_pulled', 'post_author_id', 'post_created_at', 'post_id',
+                 sqlite_where=db.text('post_fanned_out = 0'), postgresql_where=db.text('post_fanned_out = false')),
+    )
 
     id = db.Column('post_id', db.Integer, primary_key=True)
     author_id = db.Column('post_author_id', db.Integer, db.ForeignKey('tb_users.usr_id'), nullable=False)
-    community_id = db.Column('post_community_id', db.Integer, db.ForeignKey('tb_communities.com_id'), nullable=False)
+    community_id = db.Column('post_community_id', db.Integer, db.ForeignKey('tb_communities.com_id', ondelete='CASCADE'), nullable=False)
     content = db.Column('post_content', db.Text, nullable=False)
     created_at = db.Column('post_created_at', db.DateTime, default=datetime.utcnow, nullable=False)
+    # Contadores desnormalizados, mantidos por app.utils.counters.bump()
+    likes_count = db.Column('post_likes_count', db.Integer, default=0, server_default='0', nullable=False)
+    comments_count = db.Column('post_comments_count', db.Integer, default=0, server_default='0', nullable=False)
+    # Copiado para as linhas do tempo dos seguidores ao ser publicado (app.utils.home_timeline)
+    fanned_out = db.Column('post_fanned_out', db.Boolean, default=True, server_default=db.true(), nullable=False)
 
     usuario = db.relationship('Usuario', backref='community_posts')
     comunidade = db.relationship('Community', back_populates='posts')
 
     # Helpers
-    def likes_count(self):
-        return CommunityPostLike.query.filter_by(post_id=self.id).count()
-
-    def comments_count(self):
-        return CommunityPostComment.query.filter_by(post_id=self.id).count()
-
     def get_comments(self):
         return (CommunityPostComment.query
                 .filter_by(post_id=self.id)
@@ -200,10 +328,13 @@ class Community(db.Model):
     is_filtered = db.Column('com_is_filtered', db.Boolean, default=False, nullable=False)  # para conteúdo sensível
     filter_reason = db.Column('com_filter_reason', db.String(255))  # motivo do filtro
     created_at = db.Column('com_created_at', db.DateTime, default=datetime.utcnow, nullable=False)
+    # Incrementada a cada post/curtida/comentário; compõe o ETag do feed
+    feed_version = db.Column('com_feed_version', db.Integer, default=0, server_default='0', nullable=False)
 
     owner = db.relationship('Usuario', backref='owned_communities')
-    posts = db.relationship('CommunityPost', back_populates='comunidade', lazy='dynamic')
-    blocks = db.relationship('CommunityBlock', backref='community', lazy='dynamic')
+    # Posts e bloqueios são apagados pelo banco (ON DELETE CASCADE)
+    posts = db.relationship('CommunityPost', back_populates='comunidade', lazy='dynamic', passive_deletes=True)
+    blocks = db.relationship('CommunityBlock', backref='community', lazy='dynamic', passive_deletes=True)
 
     def is_blocked(self):
         """Verifica se a comunidade está bloqueada"""
@@ -228,7 +359,7 @@ class CommunityBlock(db.Model):
 
     id = db.Column('blk_id', db.Integer, primary_key=True)
     user_id = db.Column('blk_user_id', db.Integer, db.ForeignKey('tb_users.usr_id'), nullable=False)
-    community_id = db.Column('blk_community_id', db.Integer, db.ForeignKey('tb_communities.com_id'), nullable=False)
+    community_id = db.Column('blk_community_id', db.Integer, db.ForeignKey('tb_communities.com_id', ondelete='CASCADE'), nullable=False)
     reason = db.Column('blk_reason', db.String(255))  # motivo do bloqueio
     created_at = db.Column('blk_created_at', db.DateTime, default=datetime.utcnow, server_default=db.func.current_timestamp(), nullable=False)
 
@@ -237,6 +368,59 @@ class CommunityBlock(db.Model):
     def __repr__(self):
         return f"<CommunityBlock {self.user_id} -> {self.community_id}>"
 
+#Participação de um usuário em uma comunidade (dono ou quem postou, comentou ou curtiu), mantida por app.utils.membership
+class CommunityMembership(db.Model):
+    __tablename__ = 'tb_community_memberships'
+    __table_args__ = (
+        # "Minhas comunidades": as do usuário pela atividade mais recente
+        db.Index('ix_community_memberships_user_activity', 'cmb_user_id', 'cmb_last_activity_at'),
+        # Contagem de membros por comunidade
+        db.Index('ix_community_memberships_community', 'cmb_community_id', 'cmb_user_id'),
+    )
+
+    user_id = db.Column('cmb_user_id', db.Integer, db.ForeignKey('tb_users.usr_id', ondelete='CASCADE'), primary_key=True)
+    community_id = db.Column('cmb_community_id', db.Integer, db.ForeignKey('tb_communities.com_id', ondelete='CASCADE'), primary_key=True)
+    role = db.Column('cmb_role', db.String(20), default='member', nullable=False)  # owner, member
+    joined_at = db.Column('cmb_joined_at', db.DateTime, default=datetime.utcnow, nullable=False)
+    last_activity_at = db.Column('cmb_last_activity_at', db.DateTime, default=datetime.utcnow, nullable=False)
+
+#Registro (somente inserção) das atividades recentes exibidas no perfil
+class UserActivity(db.Model):
+    __tablename__ = 'tb_user_activity'
+    __table_args__ = (
+        db.Index('ix_user_activity_user_created', 'act_user_id', 'act_created_at'),
+        db.Index('ix_user_activity_source', 'act_type', 'act_source_id'),
+    )
+
+    # Ícone e cor de cada tipo de atividade no perfil
+    STYLES = {
+        'rating': ('fas fa-star', 'warning'),
+        'post': ('fas fa-comment', 'primary'),
+        'comment': ('fas fa-reply', 'info'),
+        'like': ('fas fa-heart', 'danger'),
+    }
+
+    id = db.Column('act_id', db.Integer, primary_key=True)
+    user_id = db.Column('act_user_id', db.Integer, db.ForeignKey('tb_users.usr_id'), nullable=False)
+    type = db.Column('act_type', db.String(20), nullable=False)  # rating, post, comment, like
+    source_id = db.Column('act_source_id', db.Integer)  # id da avaliação/post/comentário/curtida
+    title = db.Column('act_title', db.String(255), nullable=False)
+    description = db.Column('act_description', db.String(500))
+    url = db.Column('act_url', db.String(500))
+    created_at = db.Column('act_created_at', db.DateTime, default=datetime.utcnow, nullable=False)
+
+    @property
+    def icon(self):
+        return self.STYLES.get(self.type, ('fas fa-circle', 'secondary'))[0]
+
+    @property
+    def color(self):
+        return self.STYLES.get(self.type, ('fas fa-circle', 'secondary'))[1]
+
+    @property
+    def date(self):
+        return self.created_at
+
 class Comment(db.Model):
     __tablename__ = 'tb_comments'
 
@@ -259,7 +443,7 @@ class CommunityPostLike(db.Model):
 
     id = db.Column('cpl_id', db.Integer, primary_key=True)
     user_id = db.Column('cpl_user_id', db.Integer, db.ForeignKey('tb_users.usr_id'), nullable=False)
-    post_id = db.Column('cpl_post_id', db.Integer, db.ForeignKey('tb_community_posts.post_id'), nullable=False)
+    post_id = db.Column('cpl_post_id', db.Integer, db.ForeignKey('tb_community_posts.post_id', ondelete='CASCADE'), nullable=False)
     created_at = db.Column('cpl_created_at', db.DateTime, default=datetime.utcnow, nullable=False)
     
     # Relationship helpers for rendering
@@ -271,7 +455,7 @@ class CommunityPostComment(db.Model):
 
     id = db.Column('cpc_id', db.Integer, primary_key=True)
     user_id = db.Column('cpc_user_id', db.Integer, db.ForeignKey('tb_users.usr_id'), nullable=False)
-    post_id = db.Column('cpc_post_id', db.Integer, db.ForeignKey('tb_community_posts.post_id'), nullable=False)
+    post_id = db.Column('cpc_post_id', db.Integer, db.ForeignKey('tb_community_posts.post_id', ondelete='CASCADE'), nullable=False)
     text = db.Column('cpc_text', db.Text, nullable=False)
     created_at = db.Column('cpc_created_at', db.DateTime, default=datetime.utcnow, nullable=False)
 
@@ -281,15 +465,24 @@ class CommunityPostComment(db.Model):
 
 class WatchHistory(db.Model):
     __tablename__ = 'tb_watch_history'
+    __table_args__ = (
+        # Uma linha por usuário/conteúdo: alvo do upsert de app.utils.watch_progress
+        db.Index('ux_watch_history_user_content', 'wht_user_id', 'wht_content_id', unique=True),
+        db.Index('ix_watch_history_user_last', 'wht_user_id', 'wht_last_watched'),
+    )
 
     id = db.Column('wht_id', db.Integer, primary_key=True)
     user_id = db.Column('wht_user_id', db.Integer, db.ForeignKey('tb_users.usr_id'), nullable=False)
     content_id = db.Column('wht_content_id', db.Integer, db.ForeignKey('tb_contents.cnt_id'), nullable=False)
     last_watched = db.Column('wht_last_watched', db.DateTime, default=datetime.utcnow, nullable=False)
-    progress = db.Column('wht_progress', db.Float, nullable=False)
+    progress = db.Column('wht_progress', db.Float, nullable=False)  # fração lida/assistida, de 0 a 1
 
 class Rating(db.Model):
     __tablename__ = 'tb_ratings'
+    __table_args__ = (
+        db.Index('ix_ratings_content_created_id', 'rat_content_id', 'rat_created_at', 'rat_id'),
+        db.Index('ix_ratings_user_content', 'rat_user_id', 'rat_content_id'),
+    )
 
     id = db.Column('rat_id', db.Integer, primary_key=True)
     user_id = db.Column('rat_user_id', db.Integer, db.ForeignKey('tb_users.usr_id'), nullable=False)
@@ -301,8 +494,37 @@ class Rating(db.Model):
     # Relacionamento com usuário
     usuario = db.relationship('Usuario', back_populates='avaliacoes', lazy=True)
 
+#Resumo das avaliações de um conteúdo, mantido incrementalmente (app.utils.ratings)
+class RatingSummary(db.Model):
+    __tablename__ = 'tb_rating_summaries'
+
+    content_id = db.Column('rsm_content_id', db.Integer, db.ForeignKey('tb_contents.cnt_id', ondelete='CASCADE'), primary_key=True)
+    count = db.Column('rsm_count', db.Integer, default=0, server_default='0', nullable=False)
+    total = db.Column('rsm_sum', db.Integer, default=0, server_default='0', nullable=False)
+    star_1 = db.Column('rsm_star_1', db.Integer, default=0, server_default='0', nullable=False)
+    star_2 = db.Column('rsm_star_2', db.Integer, default=0, server_default='0', nullable=False)
+    star_3 = db.Column('rsm_star_3', db.Integer, default=0, server_default='0', nullable=False)
+    star_4 = db.Column('rsm_star_4', db.Integer, default=0, server_default='0', nullable=False)
+    star_5 = db.Column('rsm_star_5', db.Integer, default=0, server_default='0', nullable=False)
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def histogram(self):
+        """Lista de (estrelas, quantidade, percentual) de 5 a 1."""
+        return [
+            (star, getattr(self, f'star_{star}'),
+             round(100 * getattr(self, f'star_{star}') / self.count) if self.count else 0)
+            for star in range(5, 0, -1)
+        ]
+
 class Content(db.Model):
     __tablename__ = 'tb_contents'
+    __table_args__ = (
+        db.Index('ix_contents_created_id', 'cnt_created_at', 'cnt_id'),
+    )
 
     id = db.Column('cnt_id', db.Integer, primary_key=True)
     title = db.Column('cnt_title', db.String(255), nullable=False)
@@ -315,6 +537,14 @@ class Content(db.Model):
     file_type = db.Column('cnt_file_type', db.String(10))  # pdf, epub, etc.
     created_at = db.Column('cnt_created_at', db.DateTime, default=datetime.utcnow, nullable=False)
     views_count = db.Column('cnt_views_count', db.Integer, default=0, nullable=False)
+    # Contadores desnormalizados, mantidos por app.utils.counters.bump()
+    likes_count = db.Column('cnt_likes_count', db.Integer, default=0, server_default='0', nullable=False)
+    comments_count = db.Column('cnt_comments_count', db.Integer, default=0, server_default='0', nullable=False)
+    ratings_count = db.Column('cnt_ratings_count', db.Integer, default=0, server_default='0', nullable=False)
+    # Incrementada a cada edição/avaliação; compõe o ETag de view_content
+    version = db.Column('cnt_version', db.Integer, default=0, server_default='0', nullable=False)
+    # Versões redimensionadas da capa ({'source', 'webp', 'jpeg'}), gravadas por app.utils.images
+    image_variants = db.Column('cnt_image_variants', db.JSON)
 
     # 🔹 Adiciona referência ao autor/criador
     user_id = db.Column('cnt_user_id', db.Integer, db.ForeignKey('tb_users.usr_id'), nullable=False)
@@ -326,8 +556,28 @@ class Content(db.Model):
     historico_assistido = db.relationship('WatchHistory', backref='content', lazy='dynamic', cascade='all, delete-orphan')
     avaliacoes = db.relationship('Rating', backref='content', lazy='dynamic', cascade='all, delete-orphan')
     categorias = db.relationship('ContentCategory', backref='content', lazy='dynamic', cascade='all, delete-orphan')
+    rating_summary = db.relationship('RatingSummary', uselist=False, cascade='all, delete-orphan')
     
 
+#Arquivo enviado, guardado uma única vez pelo hash do conteúdo (app.utils.storage)
+class StoredFile(db.Model):
+    __tablename__ = 'tb_stored_files'
+
+    sha256 = db.Column('stf_sha256', db.String(64), primary_key=True)
+    path = db.Column('stf_path', db.String(500), nullable=False, unique=True)  # relativo a static/
+    size = db.Column('stf_size', db.BigInteger, nullable=False)
+    # Quantos Content.file_path/Content.thumbnail apontam para o arquivo
+    ref_count = db.Column('stf_ref_count', db.Integer, default=0, server_default='0', nullable=False)
+    created_at = db.Column('stf_created_at', db.DateTime, default=datetime.utcnow, nullable=False)
+
+#Visualizações de um conteúdo por dia (UTC), gravadas em lote por app.utils.view_counter
+class ContentViewDaily(db.Model):
+    __tablename__ = 'tb_content_views_daily'
+
+    content_id = db.Column('cvd_content_id', db.Integer, db.ForeignKey('tb_contents.cnt_id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column('cvd_day', db.Date, primary_key=True)
+    views = db.Column('cvd_views', db.Integer, default=0, server_default='0', nullable=False)
+
 class Category(db.Model):
     __tablename__ = 'tb_categories'
 
@@ -0,0 +1,262 @@
+# app/utils/account_deletion.py
+"""
+Exclusão de contas em segundo plano.
+
+A requisição apenas marca a conta como excluída (o usuário perde o acesso na
+hora) e registra um AccountDeletion. O expurgo roda depois, fora da
+requisição, como uma sequência de etapas:
+
+- etapas "únicas" (ajuste de contadores, avaliações, seguidores) rodam em
+  uma transação junto com o avanço do progresso, então nunca são aplicadas
+  duas vezes;
+- etapas em lote apagam no máximo batch_size linhas por vez com
+  "DELETE ... WHERE id IN (SELECT id ... LIMIT n)" e fazem commit a cada
+  lote, liberando o lock de escrita do SQLite entre um lote e outro.
+
+O número da próxima etapa fica gravado em tb_account_deletions, de modo que
+um processo interrompido retoma de onde parou (flask purge-accounts).
+"""
+import threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, select, union, update
+
+from ..models import (db, Usuario, AccountDeletion, UserStats, UserActivity, Follower, PrivateMessage,
+                      ConversationSummary, Content, Comment, Like, Rating, WatchHistory, Community, CommunityBlock, CommunityPost,
+                      CommunityPostComment, CommunityPostLike)
+from .counters import _pk, discount_user
+from .ratings import recompute_summaries
+from .activity import retract_post_activities
+from .cache import invalidate
+
+DEFAULT_BATCH_SIZE = 500
+# Conta que herda os conteúdos publicados por contas excluídas (ver init_default_data)
+OFFICIAL_ACCOUNT_EMAIL = 'memoriaviva@oficial'
+
+
+def _owned_communities(user_id):
+    return select(Community.id).where(Community.owner_id == user_id)
+
+
+def _doomed_posts(user_id):
+    """Posts que somem com a conta: os do usuário e os das comunidades dele."""
+    return select(CommunityPost.id).where(
+        (CommunityPost.author_id == user_id) | CommunityPost.community_id.in_(_owned_communities(user_id))
+    )
+
+
+# Etapas únicas: recebem o user_id e rodam em uma única transação
+
+def _discount_counters(user_id):
+    """Desconta dos contadores de terceiros o que vai ser apagado."""
+    discount_user(user_id)
+    # Quem o usuário seguia perde um seguidor; quem o seguia passa a seguir um a menos
+    for name, column, other in (('followers_count', Follower.follower_id, Follower.followed_id),
+                                ('following_count', Follower.followed_id, Follower.follower_id)):
+        counter = getattr(UserStats, name)
+        db.session.execute(
+            update(UserStats)
+            .where(UserStats.user_id.in_(select(other).where(column == user_id)))
+            .values({counter: counter - 1})
+            .execution_options(synchronize_session=False)
+        )
+    # Mensagens não lidas enviadas pelo usuário somem das caixas de entrada
+    unread = (select(ConversationSummary.unread_count)
+              .where(ConversationSummary.user_id == UserStats.user_id, ConversationSummary.peer_id == user_id)
+              .scalar_subquery())
+    db.session.execute(
+        update(UserStats)
+        .where(UserStats.user_id.in_(select(ConversationSummary.user_id)
+                                     .where(ConversationSummary.peer_id == user_id,
+                                            ConversationSummary.unread_count > 0)))
+        .values(unread_messages_count=UserStats.unread_messages_count - unread)
+        .execution_options(synchronize_session=False)
+    )
+    retract_post_activities(_doomed_posts(user_id))
+    # Feeds com posts, curtidas ou comentários do usuário mudam de versão (ETag)
+    touched = union(
+        select(CommunityPost.community_id).where(CommunityPost.author_id == user_id),
+        select(CommunityPost.community_id)
+        .join(CommunityPostLike, CommunityPostLike.post_id == CommunityPost.id)
+        .where(CommunityPostLike.user_id == user_id),
+        select(CommunityPost.community_id)
+        .join(CommunityPostComment, CommunityPostComment.post_id == CommunityPost.id)
+        .where(CommunityPostComment.user_id == user_id),
+    )
+    db.session.execute(
+        update(Community).where(Community.id.in_(touched))
+        .values(feed_version=Community.feed_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _delete_ratings(user_id):
+    rated_ids = [row[0] for row in db.session.query(Rating.content_id).filter_by(user_id=user_id)]
+    Rating.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    recompute_summaries(rated_ids)
+    db.session.execute(
+        update(Content).where(Content.id.in_(rated_ids))
+        .values(version=Content.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _delete_followers(user_id):
+    Follower.query.filter(
+        (Follower.follower_id == user_id) | (Follower.followed_id == user_id)
+    ).delete(synchronize_session=False)
+
+
+def _delete_conversations(user_id):
+    # Uma linha por conversa de cada lado: poucas, e a chave é composta (sem lote por id)
+    ConversationSummary.query.filter(
+        (ConversationSummary.user_id == user_id) | (ConversationSummary.peer_id == user_id)
+    ).delete(synchronize_session=False)
+
+
+def _transfer_contents(user_id):
+    """Obras do acervo não somem com a conta: passam para a conta oficial."""
+    official = select(Usuario.id).where(Usuario.email == OFFICIAL_ACCOUNT_EMAIL).scalar_subquery()
+    db.session.execute(
+        update(Content).where(Content.user_id == user_id).values(user_id=official)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _delete_user(user_id):
+    UserStats.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    db.session.execute(delete(Usuario).where(Usuario.id == user_id))
+
+
+# Etapas em lote: (modelo, critério) das linhas a apagar
+
+def _batched(model, criterion):
+    return lambda user_id: (model, criterion(user_id))
+
+
+STEPS = (
+    ('contadores', _discount_counters),
+    ('avaliações', _delete_ratings),
+    ('atividades', _batched(UserActivity, lambda uid: UserActivity.user_id == uid)),
+    ('curtidas em posts', _batched(CommunityPostLike, lambda uid: (CommunityPostLike.user_id == uid)
+                                   | CommunityPostLike.post_id.in_(_doomed_posts(uid)))),
+    ('comentários em posts', _batched(CommunityPostComment, lambda uid: (CommunityPostComment.user_id == uid)
+                                      | CommunityPostComment.post_id.in_(_doomed_posts(uid)))),
+    ('posts', _batched(CommunityPost, lambda uid: CommunityPost.id.in_(_doomed_posts(uid)))),
+    ('bloqueios', _batched(CommunityBlock, lambda uid: (CommunityBlock.user_id == uid)
+                           | CommunityBlock.community_id.in_(_owned_communities(uid)))),
+    ('comunidades', _batched(Community, lambda uid: Community.owner_id == uid)),
+    ('comentários', _batched(Comment, lambda uid: Comment.user_id == uid)),
+    ('curtidas', _batched(Like, lambda uid: Like.user_id == uid)),
+    ('histórico', _batched(WatchHistory, lambda uid: WatchHistory.user_id == uid)),
+    ('mensagens', _batched(PrivateMessage, lambda uid: (PrivateMessage.sender_id == uid)
+                           | (PrivateMessage.receiver_id == uid))),
+    ('conversas', _delete_conversations),
+    ('seguidores', _delete_followers),
+    ('conteúdos', _transfer_contents),
+    ('usuário', _delete_user),
+)
+
+
+def _purge_batch(model, criterion, batch_size):
+    """Apaga até batch_size linhas que atendem ao critério. Retorna quantas saíram."""
+    pk = _pk(model)
+    batch = select(pk).where(criterion).limit(batch_size).scalar_subquery()
+    result = db.session.execute(
+        delete(model).where(pk.in_(batch)).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def request_account_deletion(usuario):
+    """Bloqueia a conta e agenda a exclusão. Faz commit e retorna o AccountDeletion."""
+    job = AccountDeletion.query.filter_by(user_id=usuario.id).first()
+    if job is None:
+        job = AccountDeletion(user_id=usuario.id)
+        db.session.add(job)
+    usuario.excluido_em = usuario.excluido_em or datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def run_deletion(job_id, batch_size=None):
+    """Executa (ou retoma) as etapas pendentes de uma exclusão de conta.
+
+    Returns:
+        O AccountDeletion atualizado (status 'done' ou 'failed')
+    """
+    batch_size = batch_size or current_app.config.get('ACCOUNT_DELETION_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    job = db.session.get(AccountDeletion, job_id)
+    if job is None or job.status == 'done':
+        return job
+
+    job.status = 'running'
+    job.error = None
+    db.session.commit()
+    user_id = job.user_id
+
+    try:
+        while job.step < len(STEPS):
+            current = job.step
+            name, action = STEPS[current]
+            target = action(user_id)
+            if target is None:
+                # Etapa única: a ação e o avanço do progresso vão no mesmo commit
+                job.step += 1
+            else:
+                removed = _purge_batch(*target, batch_size)
+                job.deleted_rows += removed
+                if removed < batch_size:
+                    job.step += 1
+            job.updated_at = datetime.utcnow()
+            db.session.commit()
+            if job.step > current:
+                print(f"✓ Exclusão da conta {user_id}: {name}")
+
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        # Posts, curtidas e comunidades do usuário saíram de vários feeds
+        invalidate('communities', 'feeds')
+        print(f"✅ Conta {user_id} excluída ({job.deleted_rows} linhas em lote)")
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(AccountDeletion, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+        print(f"❌ Erro ao excluir a conta {user_id}: {e}")
+    return job
+
+
+def pending_deletions():
+    """Exclusões não concluídas (inclusive as interrompidas no meio)."""
+    return AccountDeletion.query.filter(AccountDeletion.status != 'done').order_by(AccountDeletion.id).all()
+
+
+def resume_deletions(batch_size=None):
+    """Retoma todas as exclusões pendentes no processo atual. Retorna os jobs processados."""
+    return [run_deletion(job.id, batch_size) for job in pending_deletions()]
+
+
+def _worker(app, job_ids):
+    with app.app_context():
+        for job_id in job_ids:
+            run_deletion(job_id)
+
+
+def start_deletion(job_ids):
+    """Dispara o expurgo em uma thread, fora do ciclo da requisição.
+
+    Com ACCOUNT_DELETION_ASYNC=False nada é iniciado e as exclusões ficam
+    para "flask purge-accounts" (ex.: agendado no cron).
+    """
+    app = current_app._get_current_object()
+    if not app.config.get('ACCOUNT_DELETION_ASYNC', True) or not job_ids:
+        return None
+    thread = threading.Thread(target=_worker, args=(app, list(job_ids)),
+                              name='account-deletion', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,188 @@
+# app/utils/activity.py
+"""
+Registro de atividades dos usuários (tb_user_activity).
+
+As rotas de avaliação, post, comentário e curtida gravam aqui, na mesma
+transação, uma linha já com título, descrição e URL prontos. O perfil então
+lê as últimas atividades com uma única consulta "LIMIT 10" sobre o índice
+(user_id, created_at), sem percorrer relacionamentos.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app, url_for
+from sqlalchemy import insert
+
+from ..models import (db, UserActivity, Rating, Content, Community, CommunityPost,
+                      CommunityPostComment, CommunityPostLike)
+
+PROFILE_ACTIVITY_LIMIT = 10
+PROFILE_ACTIVITY_DAYS = 30
+DEFAULT_RETENTION_DAYS = 90
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _preview(value, size=100):
+    value = value or ''
+    return value[:size] + ('...' if len(value) > size else '')
+
+
+def rating_activity(rating, content_title):
+    return {
+        'user_id': rating.user_id,
+        'type': 'rating',
+        'source_id': rating.id,
+        'title': f'Avaliou "{content_title}"',
+        'description': f'{rating.rating} estrelas' + (f' - "{rating.review}"' if rating.review else ''),
+        'url': url_for('content.view_content', content_id=rating.content_id),
+        'created_at': rating.created_at,
+    }
+
+
+def post_activity(post, community_name):
+    return {
+        'user_id': post.author_id,
+        'type': 'post',
+        'source_id': post.id,
+        'title': f'Postou em "{community_name}"',
+        'description': _preview(post.content),
+        'url': url_for('comunidade.comunidade_users', community_id=post.community_id),
+        'created_at': post.created_at,
+    }
+
+
+def comment_activity(comment, community_id, community_name):
+    return {
+        'user_id': comment.user_id,
+        'type': 'comment',
+        'source_id': comment.id,
+        'title': f'Comentou em "{community_name}"',
+        'description': _preview(comment.text),
+        'url': url_for('comunidade.comunidade_users', community_id=community_id),
+        'created_at': comment.created_at,
+    }
+
+
+def like_activity(like, post_content, community_id, community_name):
+    return {
+        'user_id': like.user_id,
+        'type': 'like',
+        'source_id': like.id,
+        'title': f'Curtiu post em "{community_name}"',
+        'description': _preview(post_content),
+        'url': url_for('comunidade.comunidade_users', community_id=community_id),
+        'created_at': like.created_at,
+    }
+
+
+def record_activity(values):
+    """Adiciona uma atividade à sessão (sem commit).
+
+    values vem de rating_activity/post_activity/comment_activity/like_activity;
+    o objeto de origem já deve ter sido inserido (flush) para ter id.
+    """
+    values = dict(values)
+    values['created_at'] = values.get('created_at') or datetime.utcnow()
+    db.session.add(UserActivity(**values))
+
+
+def retract_activity(kind, source_id):
+    """Remove a atividade ligada a algo desfeito (descurtir, apagar comentário...)."""
+    UserActivity.query.filter_by(type=kind, source_id=source_id).delete(synchronize_session=False)
+
+
+def retract_post_activities(post_ids):
+    """Remove as atividades de posts apagados e de seus comentários/curtidas.
+
+    post_ids pode ser uma lista ou um select() de ids de posts.
+    """
+    comment_ids = db.select(CommunityPostComment.id).where(CommunityPostComment.post_id.in_(post_ids))
+    like_ids = db.select(CommunityPostLike.id).where(CommunityPostLike.post_id.in_(post_ids))
+    for kind, source_ids in (('post', post_ids), ('comment', comment_ids), ('like', like_ids)):
+        (UserActivity.query
+            .filter(UserActivity.type == kind, UserActivity.source_id.in_(source_ids))
+            .delete(synchronize_session=False))
+
+
+def retract_content_activities(content_id):
+    """Remove as atividades das avaliações de um conteúdo apagado."""
+    rating_ids = db.select(Rating.id).where(Rating.content_id == content_id)
+    (UserActivity.query
+        .filter(UserActivity.type == 'rating', UserActivity.source_id.in_(rating_ids))
+        .delete(synchronize_session=False))
+
+
+def recent_activities(user_id, limit=PROFILE_ACTIVITY_LIMIT, days=PROFILE_ACTIVITY_DAYS):
+    """Últimas atividades do usuário (uma consulta no índice user_id, created_at)."""
+    since = datetime.utcnow() - timedelta(days=days)
+    return (UserActivity.query
+            .filter(UserActivity.user_id == user_id, UserActivity.created_at >= since)
+            .order_by(UserActivity.created_at.desc(), UserActivity.id.desc())
+            .limit(limit)
+            .all())
+
+
+def prune_activities(retention_days=None):
+    """Apaga atividades mais antigas que a retenção configurada.
+
+    Returns:
+        Quantidade de linhas removidas
+    """
+    if retention_days is None:
+        retention_days = current_app.config.get('ACTIVITY_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    removed = UserActivity.query.filter(UserActivity.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def backfill_activities(days=None, batch_size=BACKFILL_BATCH_SIZE):
+    """Recria o registro a partir das tabelas de origem, dentro da janela de retenção.
+
+    Cada tipo é lido com uma consulta que já traz o título (JOIN com conteúdo
+    ou comunidade) e gravado com INSERTs em lote. Atividades existentes na
+    janela são substituídas, então o comando pode ser repetido.
+
+    Returns:
+        Quantidade de atividades gravadas
+    """
+    if days is None:
+        days = current_app.config.get('ACTIVITY_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    since = datetime.utcnow() - timedelta(days=days)
+
+    sources = (
+        (db.session.query(Rating, Content.title)
+            .join(Content, Content.id == Rating.content_id)
+            .filter(Rating.created_at >= since),
+         lambda row: rating_activity(row[0], row[1])),
+        (db.session.query(CommunityPost, Community.name)
+            .join(Community, Community.id == CommunityPost.community_id)
+            .filter(CommunityPost.created_at >= since),
+         lambda row: post_activity(row[0], row[1])),
+        (db.session.query(CommunityPostComment, CommunityPost.community_id, Community.name)
+            .join(CommunityPost, CommunityPost.id == CommunityPostComment.post_id)
+            .join(Community, Community.id == CommunityPost.community_id)
+            .filter(CommunityPostComment.created_at >= since),
+         lambda row: comment_activity(row[0], row[1], row[2])),
+        (db.session.query(CommunityPostLike, CommunityPost.content, CommunityPost.community_id, Community.name)
+            .join(CommunityPost, CommunityPost.id == CommunityPostLike.post_id)
+            .join(Community, Community.id == CommunityPost.community_id)
+            .filter(CommunityPostLike.created_at >= since),
+         lambda row: like_activity(row[0], row[1], row[2], row[3])),
+    )
+
+    UserActivity.query.filter(UserActivity.created_at >= since).delete(synchronize_session=False)
+    total = 0
+    with current_app.test_request_context():
+        for query, build in sources:
+            batch = []
+            for row in query.yield_per(batch_size):
+                batch.append(build(row))
+                if len(batch) >= batch_size:
+                    db.session.execute(insert(UserActivity), batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                db.session.execute(insert(UserActivity), batch)
+                total += len(batch)
+    db.session.commit()
+    return total
@@ -0,0 +1,200 @@
+# app/utils/assets.py
+"""
+Arquivos estáticos com hash no nome e pré-comprimidos.
+
+"flask build-assets" copia cada arquivo de app/static (menos uploads/) para
+app/static/dist/ com um trecho do SHA-256 do conteúdo no nome
+(css/style.css -> dist/css/style.3f2a9c1b0d4e.css), grava versões .gz e
+.br dos arquivos de texto e escreve dist/manifest.json com o mapeamento.
+
+Com o manifesto presente, url_for('static', filename='css/style.css') passa
+a gerar o nome com hash. Como o nome muda sempre que o conteúdo muda, esses
+arquivos são servidos com "Cache-Control: public, max-age=31536000,
+immutable" e, se o navegador aceitar, na versão comprimida (br, depois gzip).
+Arquivos fora do manifesto (ex.: uploads) continuam servidos como antes.
+
+A compressão brotli usa o pacote opcional "brotli"; sem ele só os .gz são
+gerados.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import current_app, request, send_from_directory
+
+from .storage import DERIVED_DIR, blob_hash
+
+try:
+    import brotli
+except ImportError:  # dependência opcional
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+# Pastas de app/static que não passam pelo pipeline (conteúdo enviado por usuários)
+EXCLUDED_DIRS = ('uploads', DIST_DIR)
+# Formatos de texto que valem a pena comprimir; imagens já são comprimidas
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.ico', '.xml'}
+COMPRESS_MIN_SIZE = 256
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASH_LENGTH = 12
+
+# url('/static/img/a.png'), url("../img/a.png"), url(img/a.png)
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def _source_files(static_folder):
+    for root, dirs, files in os.walk(static_folder):
+        rel_root = os.path.relpath(root, static_folder)
+        if rel_root == '.':
+            dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            yield os.path.normpath(os.path.join(rel_root, name)).replace(os.sep, '/')
+
+
+def _hashed_name(path, data):
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    base, ext = os.path.splitext(path)
+    return f'{DIST_DIR}/{base}.{digest}{ext}'
+
+
+def _rewrite_css(path, text, manifest, static_url):
+    """Troca as referências url(...) do CSS pelos nomes com hash."""
+    def replace(match):
+        quote, ref = match.groups()
+        if ref.startswith(static_url + '/'):
+            target = ref[len(static_url) + 1:]
+        elif '://' in ref or ref.startswith(('data:', '/', '#')):
+            return match.group(0)
+        else:
+            target = os.path.normpath(os.path.join(os.path.dirname(path), ref)).replace(os.sep, '/')
+        hashed = manifest.get(target.split('?')[0].split('#')[0])
+        if hashed is None:
+            return match.group(0)
+        return f'url({quote}{static_url}/{hashed}{quote})'
+    return CSS_URL.sub(replace, text)
+
+
+def _write_compressed(full_path, data):
+    written = []
+    if len(data) < COMPRESS_MIN_SIZE:
+        return written
+    with open(full_path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    written.append('gzip')
+    if brotli is not None:
+        with open(full_path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+        written.append('br')
+    return written
+
+
+def build_assets(static_folder, static_url='/static', clean=False):
+    """Gera app/static/dist e o manifesto.
+
+    CSS é processado por último para que as referências a imagens e fontes
+    já apontem para os nomes com hash (e o hash do CSS mude junto).
+
+    Args:
+        static_folder: Caminho de app/static
+        static_url: Prefixo de URL dos estáticos (app.static_url_path)
+        clean: Apaga a dist anterior; por padrão as versões antigas ficam,
+               para páginas ainda abertas durante um deploy
+
+    Returns:
+        Dict caminho original -> caminho com hash
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    if clean and os.path.isdir(dist):
+        shutil.rmtree(dist)
+
+    sources = list(_source_files(static_folder))
+    sources.sort(key=lambda path: path.endswith('.css'))
+    manifest = {}
+    for path in sources:
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = _rewrite_css(path, data.decode('utf-8'), manifest, static_url).encode('utf-8')
+
+        hashed = _hashed_name(path, data)
+        target = os.path.join(static_folder, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if not os.path.exists(target):
+            with open(target, 'wb') as f:
+                f.write(data)
+            if os.path.splitext(path)[1].lower() in COMPRESSIBLE:
+                _write_compressed(target, data)
+        manifest[path] = hashed
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    """Lê dist/manifest.json; retorna {} se o build ainda não foi feito."""
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _immutable(response):
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    response.cache_control.no_cache = None
+    return response
+
+
+def serve_static(filename):
+    """Substitui a view 'static': arquivos da dist são imutáveis e pré-comprimidos.
+
+    Uploads do armazenamento por hash (app.utils.storage) e seus derivados
+    também nunca mudam de conteúdo; os blobs recebem o hash como ETag forte.
+    """
+    static_folder = current_app.static_folder
+    sha256 = blob_hash(filename)
+    if sha256:
+        return _immutable(send_from_directory(static_folder, filename, etag=sha256))
+    if filename.startswith(DERIVED_DIR + '/'):
+        return _immutable(send_from_directory(static_folder, filename))
+    if not filename.startswith(DIST_DIR + '/'):
+        return current_app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = None
+    for suffix, encoding in (('.br', 'br'), ('.gz', 'gzip')):
+        if encoding in request.accept_encodings and os.path.isfile(os.path.join(static_folder, filename + suffix)):
+            response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(static_folder, filename, mimetype=mimetype)
+
+    response.vary.add('Accept-Encoding')
+    return _immutable(response)
+
+
+def init_assets(app):
+    """Carrega o manifesto e liga url_for/view de estáticos aos nomes com hash."""
+    manifest = load_manifest(app.static_folder) if app.config.get('STATIC_FINGERPRINTS', True) else {}
+    app.extensions['assets'] = manifest
+    app.view_functions['static'] = serve_static
+    if not manifest:
+        return
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static':
+            hashed = manifest.get(values.get('filename'))
+            if hashed:
+                values['filename'] = hashed
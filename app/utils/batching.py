@@ -0,0 +1,92 @@
+# app/utils/batching.py
+"""
+Buffers de escrita em memória gravados periodicamente em lote.
+
+Usados para eventos muito frequentes (visualizações, progresso de leitura)
+em que uma escrita por evento disputaria o lock de escrita do SQLite. Cada
+processo acumula os eventos por chave, combinando os repetidos, e uma
+thread chama write() a cada intervalo com tudo o que juntou.
+
+Se o processo morrer, perde-se no máximo um intervalo; no encerramento
+normal o que falta é gravado (atexit). Se write() falhar, o lote volta
+para o buffer e entra na próxima gravação.
+"""
+import atexit
+import os
+import threading
+
+
+class BatchBuffer:
+    """Base: subclasses definem merge() e write()."""
+
+    name = 'batch'
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self.flushes = 0
+        atexit.register(self.stop)
+
+    def merge(self, current, value):
+        """Combina um valor novo com o acumulado para a mesma chave."""
+        raise NotImplementedError
+
+    def write(self, batch):
+        """Grava o lote {chave: valor}; roda em um app context. Deve fazer commit."""
+        raise NotImplementedError
+
+    def add(self, key, value):
+        with self._lock:
+            current = self._pending.get(key)
+            self._pending[key] = value if current is None else self.merge(current, value)
+        self._ensure_thread()
+
+    def snapshot(self):
+        """Cópia do que ainda não foi gravado."""
+        with self._lock:
+            return dict(self._pending)
+
+    def _ensure_thread(self):
+        # A thread é por processo: workers criados por fork não herdam a do pai
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """Grava o acumulado. Retorna quantas chaves foram gravadas."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                with self.app.app_context():
+                    self.write(batch)
+            except Exception as e:
+                with self._lock:
+                    for key, value in batch.items():
+                        current = self._pending.get(key)
+                        self._pending[key] = value if current is None else self.merge(value, current)
+                print(f"❌ Erro ao gravar lote de {self.name}: {e}")
+                return 0
+            self.flushes += 1
+            return len(batch)
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
@@ -0,0 +1,280 @@
+# app/utils/cache.py
+"""
+Cache de resultados de consultas e de fragmentos renderizados.
+
+Cada entrada é gravada com um ou mais tags (ex.: "content:12",
+"community:3", "contents"). Invalidar um tag incrementa a sua versão; como
+a versão de cada tag faz parte da chave, as entradas antigas deixam de ser
+encontradas na hora e saem depois pela expiração (TTL) ou pelo LRU. Assim
+invalidar custa uma escrita, qualquer que seja o número de entradas.
+
+Backends (CACHE_BACKEND):
+- "memory": LRU em processo, limitado a CACHE_MAX_ENTRIES entradas. Cada
+  worker tem o seu; invalidações feitas em um worker não chegam aos outros
+  e só o TTL limita a defasagem.
+- "redis": compartilhado entre workers (CACHE_REDIS_URL). Requer o pacote
+  redis; sem ele cai no backend em memória.
+- "null": desliga o cache.
+
+Enquanto um valor é calculado, outras threads que pedem a mesma chave
+esperam pelo resultado em vez de repetir a consulta (proteção contra
+"stampede"). Acertos/erros são contados e expostos por cache_stats().
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from flask import current_app
+from markupsafe import Markup
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 1024
+
+# Sentinela para distinguir "não está no cache" de um valor None armazenado
+MISSING = object()
+
+
+class MemoryBackend:
+    """LRU em processo com expiração por entrada."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def incr(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (0, None))
+            self._data[key] = (value + 1, expires_at)
+            self._data.move_to_end(key)
+            return value + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """Backend compartilhado; os valores são serializados com pickle."""
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='mv:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0  # a política de despejo fica a cargo do próprio Redis
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        raw = self.client.mget([self.prefix + key for key in keys])
+        return [MISSING if value is None else self._load(value) for value in raw]
+
+    @staticmethod
+    def _load(value):
+        # Contadores (versões dos tags) são gravados pelo INCR como inteiros em texto
+        return int(value) if value.isdigit() else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl or None)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(self.prefix + '*'))
+
+
+class NullBackend:
+    """Não guarda nada (CACHE_BACKEND=null ou testes)."""
+
+    name = 'null'
+    evictions = 0
+
+    def get(self, key):
+        return MISSING
+
+    def get_many(self, keys):
+        return [MISSING] * len(keys)
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def incr(self, key):
+        return 0
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class Cache:
+    """Fachada com tags, TTL padrão, proteção contra stampede e métricas."""
+
+    def __init__(self, backend, default_ttl=DEFAULT_TTL):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _versioned_key(self, key, tags):
+        if not tags:
+            return key
+        versions = self.backend.get_many([f'tag:{tag}' for tag in tags])
+        stamp = ','.join(f'{tag}={0 if version is MISSING else version}' for tag, version in zip(tags, versions))
+        return f'{key}|{stamp}'
+
+    def _lock_for(self, key):
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def get_or_set(self, key, compute, tags=(), ttl=None):
+        """Retorna o valor em cache ou calcula com compute() e grava.
+
+        Só uma thread por processo calcula uma mesma chave de cada vez; as
+        demais esperam e reaproveitam o resultado.
+        """
+        tags = tuple(tags)
+        full_key = self._versioned_key(key, tags)
+        value = self.backend.get(full_key)
+        if value is not MISSING:
+            self.hits += 1
+            return value
+
+        lock = self._lock_for(full_key)
+        with lock:
+            value = self.backend.get(full_key)
+            if value is not MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+            value = compute()
+            self.backend.set(full_key, value, self.default_ttl if ttl is None else ttl)
+        with self._locks_guard:
+            if self._locks.get(full_key) is lock and not lock.locked():
+                del self._locks[full_key]
+        return value
+
+    def invalidate(self, *tags):
+        """Invalida todas as entradas gravadas com qualquer um dos tags."""
+        for tag in tags:
+            self.backend.incr(f'tag:{tag}')
+            self.invalidations += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            'invalidations': self.invalidations,
+            'evictions': self.backend.evictions,
+        }
+
+
+def _make_backend(config):
+    name = config.get('CACHE_BACKEND', 'memory')
+    if name == 'null':
+        return NullBackend()
+    if name == 'redis':
+        try:
+            return RedisBackend(config['CACHE_REDIS_URL'])
+        except ImportError:
+            print("⚠️  Pacote redis não instalado; usando cache em memória")
+    return MemoryBackend(config.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+
+
+def init_cache(app):
+    """Cria o cache da aplicação e registra o helper cache_fragment nos templates."""
+    app.extensions['cache'] = Cache(_make_backend(app.config),
+                                    default_ttl=app.config.get('CACHE_DEFAULT_TTL', DEFAULT_TTL))
+    app.jinja_env.globals['cache_fragment'] = cache_fragment
+
+
+def get_cache():
+    return current_app.extensions['cache']
+
+
+def cached(key, compute, tags=(), ttl=None):
+    """Atalho para get_cache().get_or_set(...)."""
+    return get_cache().get_or_set(key, compute, tags=tags, ttl=ttl)
+
+
+def invalidate(*tags):
+    """Invalida os tags informados (chamar depois do commit da escrita)."""
+    get_cache().invalidate(*tags)
+
+
+def cache_stats():
+    return get_cache().stats()
+
+
+def cache_fragment(key, tags=(), ttl=None, caller=None):
+    """Cacheia o HTML de um bloco de template.
+
+    Uso: {% call cache_fragment('chave', tags=['contents']) %} ... {% endcall %}
+    O bloco não deve depender do usuário logado.
+    """
+    return Markup(cached(f'fragment:{key}', lambda: str(caller()), tags=tags, ttl=ttl))
+
+
+def snapshot(obj):
+    """Cópia simples (só colunas) de uma entidade, segura para guardar no cache.
+
+    Entidades do ORM ficam presas à sessão que as carregou; o snapshot pode
+    ser lido por outras requisições e serializado pelo backend compartilhado.
+    """
+    mapper = obj.__mapper__
+    return SimpleNamespace(**{attr.key: getattr(obj, attr.key) for attr in mapper.column_attrs})
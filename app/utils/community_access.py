@@ -0,0 +1,76 @@
+# app/utils/community_access.py
+"""
+Controle de acesso às comunidades com conjuntos em cache.
+
+- blocked_community_ids(usuario): frozenset das comunidades bloqueadas pelo
+  usuário. A chave do cache inclui Usuario.blocks_version, incrementada por
+  block_community/unblock_community; como o usuário logado já é carregado
+  a cada requisição, a versão vem de graça e uma versão nova nunca
+  encontra um conjunto antigo, mesmo com um cache em memória por worker.
+- community_directory(): snapshots das comunidades ativas, com a contagem
+  de membros (tag "communities", invalidado pelas rotas que criam, apagam
+  ou mudam o status/filtro de uma comunidade e quando alguém entra em uma).
+
+Com os dois em mãos, verificar o acesso a uma comunidade e filtrar a lista
+do usuário são operações de conjunto em memória, sem NOT IN (subconsulta).
+"""
+from types import SimpleNamespace
+
+from flask import g, has_request_context
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+from ..models import db, Community, CommunityBlock
+from .cache import cached, snapshot
+from .membership import member_counts
+
+# Os bloqueios só mudam com uma versão nova; o TTL só limpa versões antigas
+BLOCKS_TTL = 3600
+
+
+def blocked_community_ids(usuario):
+    """IDs das comunidades bloqueadas pelo usuário (frozenset)."""
+    memo = g.setdefault('_blocked_communities', {}) if has_request_context() else {}
+    key = (usuario.id, usuario.blocks_version)
+    if key not in memo:
+        memo[key] = cached(
+            f'user:{usuario.id}:blocked-communities:{usuario.blocks_version}',
+            lambda: frozenset(db.session.scalars(
+                db.select(CommunityBlock.community_id).where(CommunityBlock.user_id == usuario.id)
+            )),
+            ttl=BLOCKS_TTL,
+        )
+    return memo[key]
+
+
+def community_directory():
+    """Snapshots das comunidades ativas (com o nome do dono e a contagem de membros), por data de criação."""
+    def load():
+        result = []
+        counts = member_counts()
+        communities = (db.session.query(Community, func.coalesce(counts.c.members, 0))
+                       .options(joinedload(Community.owner))
+                       .outerjoin(counts, counts.c.community_id == Community.id)
+                       .filter(Community.status == 'active')
+                       .order_by(Community.created_at.asc()))
+        for community, members in communities:
+            item = snapshot(community)
+            item.owner = SimpleNamespace(id=community.owner_id,
+                                         nome=community.owner.nome if community.owner else '')
+            item.member_count = members
+            result.append(item)
+        return result
+
+    return cached('communities:directory', load, tags=('communities',))
+
+
+def accessible_communities(usuario, include_filtered=False):
+    """Comunidades ativas que o usuário não bloqueou (e não filtradas, por padrão)."""
+    blocked = blocked_community_ids(usuario)
+    return [community for community in community_directory()
+            if community.id not in blocked and (include_filtered or not community.is_filtered)]
+
+
+def can_access(usuario, community):
+    """Status da comunidade (blocked/private) e bloqueio feito pelo próprio usuário."""
+    return community.can_user_access(usuario.id) and community.id not in blocked_community_ids(usuario)
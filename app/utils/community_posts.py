@@ -0,0 +1,36 @@
+# app/utils/community_posts.py
+"""
+Publicação de posts em comunidades.
+
+Os dois formulários (página da comunidade e /posts/create) passam por
+publish_post(), que faz na mesma transação tudo o que um post novo exige:
+atividade no perfil, fan-out para a linha do tempo dos seguidores,
+participação do autor na comunidade e nova versão do feed (ETag).
+"""
+from ..models import db, Community, CommunityPost
+from .activity import post_activity, record_activity
+from .counters import bump
+from .home_timeline import fan_out_post
+from .membership import touch_membership
+
+
+def publish_post(author_id, community, content):
+    """Cria o post e atualiza o que depende dele (sem commit).
+
+    Args:
+        author_id: Autor do post
+        community: Community onde o post é publicado
+        content: Texto do post
+
+    Returns:
+        Tags de cache a invalidar após o commit
+    """
+    post = CommunityPost(content=content, author_id=author_id, community_id=community.id)
+    db.session.add(post)
+    db.session.flush()
+    record_activity(post_activity(post, community.name))
+    fan_out_post(post)
+    joined = touch_membership(author_id, community.id)
+    bump(Community, community.id, feed_version=1)
+    # Um membro novo muda a contagem de membros do diretório
+    return (f'community:{community.id}', 'communities') if joined else (f'community:{community.id}',)
@@ -0,0 +1,79 @@
+# app/utils/conditional.py
+"""
+GET condicional (ETag / Last-Modified / 304).
+
+As views calculam um validador barato (versão ou max(id)/max(data) das
+linhas exibidas) e chamam not_modified() antes de qualquer consulta pesada
+ou renderização; se o cliente já tem a versão atual, a resposta é um 304
+sem corpo. Como as páginas variam com o usuário logado, o id do visitante
+e o contador de mensagens não lidas da barra de navegação entram no ETag e
+as respostas são marcadas como privadas.
+"""
+import hashlib
+from datetime import timezone
+
+from flask import current_app, request, session
+from flask_login import current_user
+
+from .inbox import unread_total
+
+
+def make_etag(*parts):
+    """ETag a partir das partes que identificam a versão da resposta.
+
+    O visitante, o seu total de não lidas (badge do base.html, leitura por
+    chave primária) e a URL completa (cursor, per_page, format) entram sempre.
+    """
+    viewer = unread = None
+    if current_user.is_authenticated:
+        viewer = current_user.get_id()
+        unread = unread_total(current_user.id)
+    raw = repr((viewer, unread, request.full_path, parts))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:24]
+
+
+def _as_http_date(value):
+    # Datas do banco são UTC sem fuso; HTTP só tem precisão de segundos
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def _mark(response, etag, last_modified=None):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = _as_http_date(last_modified)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    """Retorna uma resposta 304 se o cliente já tem esta versão, senão None.
+
+    If-None-Match tem precedência. If-Modified-Since só é considerado para
+    visitantes anônimos: a data não identifica o usuário, e um navegador
+    compartilhado poderia receber 304 para a página cacheada de outra conta.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    # Mensagens flash pendentes só aparecem se a página for renderizada
+    if session.get('_flashes'):
+        return None
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif current_user.is_authenticated:
+        fresh = False
+    else:
+        since = request.if_modified_since
+        fresh = bool(since and last_modified is not None and _as_http_date(last_modified) <= since)
+    if not fresh:
+        return None
+    return _mark(current_app.response_class(status=304), etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    """Anexa ETag/Last-Modified à resposta completa."""
+    if not hasattr(response, 'set_etag'):
+        response = current_app.make_response(response)
+    return _mark(response, etag, last_modified)
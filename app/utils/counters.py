@@ -0,0 +1,124 @@
+# app/utils/counters.py
+"""
+Contadores de engajamento desnormalizados (curtidas, comentários, avaliações).
+
+Os contadores ficam em colunas de CommunityPost e Content e são atualizados
+com "UPDATE ... SET n = n + 1" na mesma transação da escrita que os altera,
+de modo que ler o total de um post/conteúdo é O(1). reconcile_counters()
+recalcula tudo em lote e relata divergências.
+"""
+from sqlalchemy import func, select, update
+
+from ..models import (db, Content, CommunityPost, CommunityPostLike, CommunityPostComment,
+                      Like, Comment, Rating)
+
+# (modelo pai, atributo contador, modelo filho, atributo FK do filho)
+COUNTERS = (
+    (CommunityPost, 'likes_count', CommunityPostLike, 'post_id'),
+    (CommunityPost, 'comments_count', CommunityPostComment, 'post_id'),
+    (Content, 'likes_count', Like, 'content_id'),
+    (Content, 'comments_count', Comment, 'content_id'),
+    (Content, 'ratings_count', Rating, 'content_id'),
+)
+
+
+def _pk(model):
+    """Atributo ORM da chave primária (ex.: CommunityPost.id, RatingSummary.content_id)."""
+    mapper = model.__mapper__
+    return getattr(model, mapper.get_property_by_column(mapper.primary_key[0]).key)
+
+
+def bump(model, pk, **deltas):
+    """Incrementa/decrementa contadores de uma linha de forma atômica.
+
+    Não faz commit: a alteração entra na transação corrente, junto com a
+    escrita que a motivou. Ex.: bump(CommunityPost, post.id, likes_count=1)
+    """
+    values = {getattr(model, name): getattr(model, name) + delta for name, delta in deltas.items()}
+    db.session.execute(update(model).where(_pk(model) == pk).values(values))
+
+
+def get_counter(model, pk, name):
+    """Lê o valor atual de um contador (consulta por chave primária)."""
+    return db.session.execute(select(getattr(model, name)).where(_pk(model) == pk)).scalar() or 0
+
+
+def ensure_row(model, pk):
+    """Garante que exista a linha de chave pk em uma tabela de contadores.
+
+    Usa INSERT ... ON CONFLICT DO NOTHING no SQLite/PostgreSQL, então é
+    seguro chamar antes de todo bump() sem sobrescrever valores.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        if db.session.get(model, pk) is None:
+            db.session.add(model(**{_pk(model).key: pk}))
+            db.session.flush()
+        return
+    db.session.execute(insert(model).values({_pk(model): pk}).on_conflict_do_nothing())
+
+
+def discount_user(user_id):
+    """Desconta dos contadores tudo o que um usuário fez, antes de apagar suas linhas.
+
+    Usado quando curtidas/comentários/avaliações de um usuário são removidos em
+    lote (ex.: exclusão de conta). Cada contador é ajustado com um único UPDATE
+    com subconsulta correlacionada.
+    """
+    for parent, name, child, fk in COUNTERS:
+        child_fk = getattr(child, fk)
+        owned = (select(func.count())
+                 .where(child_fk == parent.id, child.user_id == user_id)
+                 .scalar_subquery())
+        touched = select(child_fk).where(child.user_id == user_id)
+        counter = getattr(parent, name)
+        db.session.execute(
+            update(parent)
+            .where(parent.id.in_(touched))
+            .values({counter: counter - owned})
+            .execution_options(synchronize_session=False)
+        )
+
+
+def reconcile_counters(fix=True):
+    """Recalcula todos os contadores em lote e retorna as divergências encontradas.
+
+    Para cada contador é feita uma única consulta agregada (LEFT JOIN com
+    GROUP BY) que devolve só as linhas divergentes; com fix=True elas são
+    corrigidas em um UPDATE em lote por chave primária.
+
+    Returns:
+        Lista de dicts {'table', 'counter', 'id', 'stored', 'actual'}
+    """
+    drift = []
+    for parent, name, child, fk in COUNTERS:
+        child_fk = getattr(child, fk)
+        counter = getattr(parent, name)
+        totals = (select(child_fk.label('parent_id'), func.count().label('total'))
+                  .group_by(child_fk)
+                  .subquery())
+        actual = func.coalesce(totals.c.total, 0)
+        rows = db.session.execute(
+            select(parent.id, counter, actual)
+            .outerjoin(totals, totals.c.parent_id == parent.id)
+            .where(counter != actual)
+        ).all()
+
+        for pk, stored, real in rows:
+            drift.append({
+                'table': parent.__tablename__,
+                'counter': name,
+                'id': pk,
+                'stored': stored,
+                'actual': real,
+            })
+        if fix and rows:
+            db.session.execute(update(parent), [{'id': pk, name: real} for pk, _, real in rows])
+
+    if fix:
+        db.session.commit()
+    return drift
@@ -0,0 +1,75 @@
+# app/utils/delivery.py
+"""
+Entrega dos arquivos enviados (downloads de obras).
+
+FILE_DELIVERY escolhe quem transmite os bytes:
+
+- "python" (padrão): o próprio worker, com suporte a Range/If-Range
+  (downloads retomáveis, leitores de PDF no navegador) e ao
+  wsgi.file_wrapper do servidor, que usa sendfile() sem cópia quando a
+  requisição pede o arquivo inteiro;
+- "x-sendfile": responde só com os cabeçalhos e "X-Sendfile: <caminho>"
+  (Apache mod_xsendfile, lighttpd);
+- "x-accel": responde com "X-Accel-Redirect: FILE_ACCEL_PREFIX<caminho>" e
+  o nginx serve o arquivo, por exemplo:
+
+      location /_uploads/ {
+          internal;
+          alias /caminho/para/app/static/;
+      }
+
+Nos dois últimos modos o proxy cuida de Range e da transmissão, e o worker
+fica livre assim que a resposta é montada; a aplicação ainda responde 304
+quando o ETag do cliente já é o atual.
+"""
+import os
+from urllib.parse import quote
+
+from flask import current_app, request, send_file
+from werkzeug.utils import send_file as _werkzeug_send_file
+
+DELIVERY_MODES = ('python', 'x-sendfile', 'x-accel')
+DEFAULT_ACCEL_PREFIX = '/_uploads/'
+
+
+def _offloaded(full_path, download_name, as_attachment, etag, max_age, mode):
+    response = _werkzeug_send_file(
+        full_path, request.environ, as_attachment=as_attachment, download_name=download_name,
+        etag=etag, max_age=max_age, use_x_sendfile=True, conditional=False,
+        response_class=current_app.response_class,
+    )
+    # Só 304/412; Range fica com o proxy, que tem o arquivo em mãos
+    response = response.make_conditional(request.environ)
+    if mode == 'x-accel':
+        response.headers.pop('X-Sendfile', None)
+        if response.status_code == 200:
+            relative = os.path.relpath(full_path, current_app.static_folder).replace(os.sep, '/')
+            prefix = current_app.config.get('FILE_ACCEL_PREFIX', DEFAULT_ACCEL_PREFIX)
+            response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(relative)
+    elif response.status_code != 200:
+        response.headers.pop('X-Sendfile', None)
+    return response
+
+
+def send_upload(path, download_name=None, as_attachment=True, etag=True, max_age=None):
+    """Resposta que entrega um arquivo de static/ conforme FILE_DELIVERY.
+
+    Args:
+        path: Caminho relativo a static/ (ex.: Content.file_path)
+        download_name: Nome sugerido ao navegador
+        as_attachment: False abre no navegador (ex.: leitor de PDF)
+        etag: ETag forte (str) ou True para o calculado pelo Werkzeug
+        max_age: Segundos de cache no cliente (None = revalidar sempre)
+    """
+    full_path = os.path.join(current_app.static_folder, path)
+    mode = current_app.config.get('FILE_DELIVERY', 'python')
+    if mode not in DELIVERY_MODES:
+        raise ValueError(f'FILE_DELIVERY inválido: {mode}')
+    if mode == 'python':
+        response = send_file(full_path, as_attachment=as_attachment, download_name=download_name,
+                             etag=etag, max_age=max_age, conditional=True)
+        # Leitores de PDF só pedem trechos se a resposta completa anunciar Range
+        if response.status_code == 200:
+            response.accept_ranges = 'bytes'
+        return response
+    return _offloaded(full_path, download_name, as_attachment, etag, max_age, mode)
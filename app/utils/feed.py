@@ -0,0 +1,198 @@
+# app/utils/feed.py
+"""
+Montagem do feed de posts das comunidades.
+
+Carrega posts, autores, contagens de curtidas/comentários, o estado de curtida
+do usuário logado e os últimos comentários de cada post em um número fixo de
+consultas, independente de quantos posts a página tenha. O resultado
+é um modelo de leitura (FeedPost/FeedComment) que os templates renderizam sem
+tocar no ORM novamente.
+"""
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+
+from sqlalchemy import func
+
+from ..models import db, Usuario, Community, CommunityPost, CommunityPostLike, CommunityPostComment
+from .pagination import DEFAULT_PER_PAGE, keyset_criterion, make_page
+
+# Quantidade de comentários mais recentes carregados por post
+FEED_COMMENTS_PER_POST = 5
+
+
+@dataclass
+class FeedComment:
+    id: int
+    post_id: int
+    user_id: int
+    author_name: str
+    text: str
+    created_at: datetime
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'post_id': self.post_id,
+            'user_id': self.user_id,
+            'author': self.author_name,
+            'text': self.text,
+            'created_at': self.created_at.strftime('%d/%m/%Y %H:%M'),
+        }
+
+
+@dataclass
+class FeedPost:
+    id: int
+    community_id: int
+    community_name: str
+    author_id: int
+    author_name: str
+    content: str
+    created_at: datetime
+    likes_count: int = 0
+    comments_count: int = 0
+    liked_by_viewer: bool = False
+    comments: list = field(default_factory=list)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'community_id': self.community_id,
+            'community': self.community_name,
+            'author_id': self.author_id,
+            'author': self.author_name,
+            'content': self.content,
+            'created_at': self.created_at.strftime('%d/%m/%Y %H:%M'),
+            'likes_count': self.likes_count,
+            'comments_count': self.comments_count,
+            'liked': self.liked_by_viewer,
+            'comments': [comment.to_dict() for comment in self.comments],
+        }
+
+
+def load_feed(*criteria, viewer_id=None, limit=None, comments_per_post=FEED_COMMENTS_PER_POST):
+    """Retorna uma lista de FeedPost para os posts que atendem aos filtros.
+
+    Os posts são ordenados do mais recente para o mais antigo por
+    (created_at, id). São executadas no máximo três consultas: posts com
+    autor, comunidade e contadores desnormalizados, curtidas do visitante e
+    últimos comentários por post.
+
+    Args:
+        *criteria: Expressões de filtro sobre CommunityPost
+        viewer_id: ID do usuário logado (None para visitantes anônimos)
+        limit: Número máximo de posts retornados
+        comments_per_post: Quantos comentários recentes carregar por post
+    """
+    query = (db.session.query(
+                CommunityPost.id,
+                CommunityPost.community_id,
+                CommunityPost.author_id,
+                CommunityPost.content,
+                CommunityPost.created_at,
+                CommunityPost.likes_count,
+                CommunityPost.comments_count,
+                Usuario.nome,
+                Community.name,
+            )
+            .outerjoin(Usuario, Usuario.id == CommunityPost.author_id)
+            .outerjoin(Community, Community.id == CommunityPost.community_id)
+            .filter(*criteria)
+            .order_by(CommunityPost.created_at.desc(), CommunityPost.id.desc()))
+    if limit is not None:
+        query = query.limit(limit)
+
+    posts = [
+        FeedPost(
+            id=row[0],
+            community_id=row[1],
+            author_id=row[2],
+            content=row[3],
+            created_at=row[4],
+            likes_count=row[5],
+            comments_count=row[6],
+            author_name=row[7] or 'Usuário removido',
+            community_name=row[8] or '',
+        )
+        for row in query.all()
+    ]
+    if not posts:
+        return posts
+
+    by_id = {post.id: post for post in posts}
+    post_ids = list(by_id)
+
+    # Posts que o visitante já curtiu
+    if viewer_id is not None:
+        _mark_liked(by_id, viewer_id)
+
+    # Últimos N comentários de cada post (row_number particionado por post)
+    if comments_per_post:
+        position = func.row_number().over(
+            partition_by=CommunityPostComment.post_id,
+            order_by=(CommunityPostComment.created_at.desc(), CommunityPostComment.id.desc()),
+        ).label('position')
+        ranked = (db.session.query(
+                      CommunityPostComment.id.label('id'),
+                      CommunityPostComment.post_id.label('post_id'),
+                      CommunityPostComment.user_id.label('user_id'),
+                      CommunityPostComment.text.label('text'),
+                      CommunityPostComment.created_at.label('created_at'),
+                      position,
+                  )
+                  .filter(CommunityPostComment.post_id.in_(post_ids))
+                  .subquery())
+        comments = (db.session.query(ranked, Usuario.nome)
+                    .outerjoin(Usuario, Usuario.id == ranked.c.user_id)
+                    .filter(ranked.c.position <= comments_per_post)
+                    .order_by(ranked.c.post_id, ranked.c.position))
+        for row in comments:
+            by_id[row.post_id].comments.append(FeedComment(
+                id=row.id,
+                post_id=row.post_id,
+                user_id=row.user_id,
+                author_name=row.nome or 'Usuário removido',
+                text=row.text,
+                created_at=row.created_at,
+            ))
+
+    return posts
+
+
+def _mark_liked(by_id, viewer_id):
+    liked = (db.session.query(CommunityPostLike.post_id)
+             .filter(CommunityPostLike.user_id == viewer_id,
+                     CommunityPostLike.post_id.in_(list(by_id))))
+    for (post_id,) in liked:
+        by_id[post_id].liked_by_viewer = True
+
+
+def with_viewer(posts, viewer_id):
+    """Cópias dos posts com liked_by_viewer preenchido para o visitante.
+
+    Permite guardar no cache um feed montado sem visitante (igual para
+    todos) e acrescentar o estado de curtida com uma única consulta.
+    """
+    posts = [replace(post, liked_by_viewer=False) for post in posts]
+    if viewer_id is not None and posts:
+        _mark_liked({post.id: post for post in posts}, viewer_id)
+    return posts
+
+
+def load_post(post_id, viewer_id=None, comments_per_post=FEED_COMMENTS_PER_POST):
+    """Retorna o FeedPost de um único post, ou None se ele não existir."""
+    posts = load_feed(CommunityPost.id == post_id, viewer_id=viewer_id, limit=1,
+                      comments_per_post=comments_per_post)
+    return posts[0] if posts else None
+
+
+def load_feed_page(*criteria, cursor=None, per_page=DEFAULT_PER_PAGE, viewer_id=None,
+                   comments_per_post=FEED_COMMENTS_PER_POST):
+    """Versão paginada de load_feed: retorna uma Page de FeedPost após o cursor."""
+    criteria = list(criteria)
+    after = keyset_criterion(CommunityPost.created_at, CommunityPost.id, cursor)
+    if after is not None:
+        criteria.append(after)
+    posts = load_feed(*criteria, viewer_id=viewer_id, limit=per_page + 1,
+                      comments_per_post=comments_per_post)
+    return make_page(posts, per_page, lambda post: (post.created_at, post.id))
@@ -0,0 +1,253 @@
+# app/utils/home_timeline.py
+"""
+Linha do tempo inicial: posts de quem o usuário segue (e os dele).
+
+Fan-out híbrido:
+
+- autores comuns: ao publicar, o post é copiado com um INSERT ... SELECT
+  para tb_home_timeline de cada seguidor (e do próprio autor);
+- autores com HOME_FANOUT_THRESHOLD seguidores ou mais (ex.: a conta
+  oficial): nada é copiado e o post fica com fanned_out = False; posts
+  assim entram na leitura, pelo índice parcial (autor, created_at, id) de
+  tb_community_posts.
+
+A decisão fica gravada no post, e não na contagem atual de seguidores:
+um autor que cruza o limite (para cima ou para baixo) não perde posts nem
+os duplica.
+
+Ler uma página é um intervalo do índice (usuário, created_at, post) de
+tb_home_timeline, unido aos posts recentes dos autores "grandes" seguidos,
+com o mesmo cursor (created_at, id) do restante da aplicação.
+
+Cada linha do tempo guarda no máximo HOME_TIMELINE_MAX posts. O corte é
+feito em lote, fora da requisição: o fan-out só anota quais usuários
+receberam posts e um TrimBuffer (app.utils.batching) apaga o excedente a
+cada HOME_TRIM_INTERVAL segundos.
+
+Seguir copia os HOME_BACKFILL posts mais recentes do autor que tiveram
+fan-out; deixar de seguir remove os dele da linha do tempo.
+"""
+from flask import current_app
+from sqlalchemy import delete, false, func, literal, select, true, tuple_, union
+
+from ..models import db, CommunityPost, Follower, HomeTimelineEntry, UserStats
+from .batching import BatchBuffer
+from .feed import load_feed_page
+from .pagination import DEFAULT_PER_PAGE, keyset_criterion
+from .user_stats import bump_user_stats
+
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_FANOUT_THRESHOLD = 1000
+DEFAULT_BACKFILL = 50
+DEFAULT_TRIM_INTERVAL = 30
+# Usuários por comando de corte (limite de parâmetros do SQLite)
+TRIM_CHUNK = 500
+
+
+class TrimBuffer(BatchBuffer):
+    """Usuários cujas linhas do tempo cresceram desde o último corte."""
+
+    name = 'home-timeline-trim'
+
+    def merge(self, current, value):
+        return current
+
+    def write(self, batch):
+        trim_timelines(list(batch))
+        db.session.commit()
+
+
+def _config(name, default):
+    return current_app.config.get(name, default)
+
+
+def _insert():
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def is_fanout_author(author_id):
+    """False para autores com seguidores demais (lidos no momento da leitura)."""
+    followers = db.session.execute(
+        select(UserStats.followers_count).where(UserStats.user_id == author_id)
+    ).scalar() or 0
+    return followers < _config('HOME_FANOUT_THRESHOLD', DEFAULT_FANOUT_THRESHOLD)
+
+
+def fan_out_post(post):
+    """Copia um post novo para as linhas do tempo dos seguidores (sem commit).
+
+    Returns:
+        Quantidade de linhas do tempo que receberam o post
+    """
+    db.session.flush()
+    post.fanned_out = is_fanout_author(post.author_id)
+    if post.fanned_out:
+        readers = union(
+            select(Follower.follower_id.label('user_id')).where(Follower.followed_id == post.author_id),
+            select(literal(post.author_id).label('user_id')),
+        ).subquery()
+    else:
+        # Só o próprio autor; os seguidores leem os posts dele na hora
+        readers = select(literal(post.author_id).label('user_id')).subquery()
+    stmt = _insert()(HomeTimelineEntry).from_select(
+        [HomeTimelineEntry.user_id, HomeTimelineEntry.post_id, HomeTimelineEntry.author_id,
+         HomeTimelineEntry.created_at],
+        select(readers.c.user_id, literal(post.id), literal(post.author_id),
+               literal(post.created_at, HomeTimelineEntry.created_at.type))
+        # Sem WHERE o SQLite lê o "ON CONFLICT" como ON de um JOIN
+        .where(true()),
+    ).on_conflict_do_nothing()
+    db.session.execute(stmt)
+    user_ids = [row[0] for row in db.session.execute(select(readers.c.user_id))]
+    _schedule_trim(user_ids)
+    return len(user_ids)
+
+
+def _schedule_trim(user_ids):
+    buffer = current_app.extensions.get('home_timeline_trim')
+    if buffer is None:
+        return
+    for user_id in user_ids:
+        buffer.add(user_id, True)
+
+
+def trim_timelines(user_ids, max_entries=None):
+    """Apaga o que passa de max_entries nas linhas do tempo dos usuários (sem commit).
+
+    Returns:
+        Quantidade de linhas apagadas
+    """
+    max_entries = max_entries or _config('HOME_TIMELINE_MAX', DEFAULT_MAX_ENTRIES)
+    removed = 0
+    for start in range(0, len(user_ids), TRIM_CHUNK):
+        position = func.row_number().over(
+            partition_by=HomeTimelineEntry.user_id,
+            order_by=(HomeTimelineEntry.created_at.desc(), HomeTimelineEntry.post_id.desc()),
+        ).label('position')
+        ranked = (select(HomeTimelineEntry.user_id.label('user_id'), HomeTimelineEntry.post_id.label('post_id'),
+                         position)
+                  .where(HomeTimelineEntry.user_id.in_(user_ids[start:start + TRIM_CHUNK]))
+                  .subquery())
+        excess = select(ranked.c.user_id, ranked.c.post_id).where(ranked.c.position > max_entries)
+        removed += db.session.execute(
+            delete(HomeTimelineEntry)
+            .where(tuple_(HomeTimelineEntry.user_id, HomeTimelineEntry.post_id).in_(excess))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    return removed
+
+
+def follow(follower_id, followed_id):
+    """Passa a seguir um usuário e copia os posts recentes dele (sem commit).
+
+    Returns:
+        False se já seguia (ou se é o próprio usuário)
+    """
+    if follower_id == followed_id or db.session.get(Follower, (follower_id, followed_id)) is not None:
+        return False
+    db.session.add(Follower(follower_id=follower_id, followed_id=followed_id))
+    db.session.flush()
+    bump_user_stats(followed_id, followers_count=1)
+    bump_user_stats(follower_id, following_count=1)
+    _copy_recent(follower_id, followed_id)
+    _schedule_trim([follower_id])
+    return True
+
+
+def _copy_recent(user_id, author_id):
+    """Copia os HOME_BACKFILL posts mais recentes do autor (com fan-out) para a linha do tempo.
+
+    Os posts sem fan-out não são copiados: eles já entram na leitura.
+    """
+    recent = (select(literal(user_id), CommunityPost.id, CommunityPost.author_id, CommunityPost.created_at)
+              .where(CommunityPost.author_id == author_id, CommunityPost.fanned_out == true())
+              .order_by(CommunityPost.created_at.desc(), CommunityPost.id.desc())
+              .limit(_config('HOME_BACKFILL', DEFAULT_BACKFILL)))
+    db.session.execute(_insert()(HomeTimelineEntry).from_select(
+        [HomeTimelineEntry.user_id, HomeTimelineEntry.post_id, HomeTimelineEntry.author_id,
+         HomeTimelineEntry.created_at],
+        recent,
+    ).on_conflict_do_nothing())
+
+
+def rebuild_timelines():
+    """Preenche as linhas do tempo a partir dos seguidores existentes (sem commit).
+
+    Returns:
+        Quantidade de usuários com linha do tempo
+    """
+    db.session.execute(delete(HomeTimelineEntry))
+    pairs = db.session.execute(select(Follower.follower_id, Follower.followed_id)).all()
+    authors = db.session.scalars(select(CommunityPost.author_id).distinct()).all()
+    for follower_id, followed_id in pairs:
+        _copy_recent(follower_id, followed_id)
+    for author_id in authors:
+        _copy_recent(author_id, author_id)
+    user_ids = db.session.scalars(select(HomeTimelineEntry.user_id).distinct()).all()
+    trim_timelines(user_ids)
+    return len(user_ids)
+
+
+def unfollow(follower_id, followed_id):
+    """Deixa de seguir e tira os posts do autor da linha do tempo (sem commit).
+
+    Returns:
+        False se não seguia
+    """
+    removed = db.session.execute(
+        delete(Follower).where(Follower.follower_id == follower_id, Follower.followed_id == followed_id)
+    ).rowcount
+    if not removed:
+        return False
+    bump_user_stats(followed_id, followers_count=-1)
+    bump_user_stats(follower_id, following_count=-1)
+    db.session.execute(
+        delete(HomeTimelineEntry)
+        .where(HomeTimelineEntry.user_id == follower_id, HomeTimelineEntry.author_id == followed_id)
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+def is_following(follower_id, followed_id):
+    return db.session.get(Follower, (follower_id, followed_id)) is not None
+
+
+def _candidates(user_id, cursor, limit):
+    """IDs dos próximos posts: da linha do tempo e os sem fan-out de quem o usuário segue."""
+    stored = (select(HomeTimelineEntry.post_id.label('post_id'))
+              .where(HomeTimelineEntry.user_id == user_id)
+              .order_by(HomeTimelineEntry.created_at.desc(), HomeTimelineEntry.post_id.desc())
+              .limit(limit))
+    after = keyset_criterion(HomeTimelineEntry.created_at, HomeTimelineEntry.post_id, cursor)
+    if after is not None:
+        stored = stored.where(after)
+
+    followed = select(Follower.followed_id).where(Follower.follower_id == user_id)
+    pulled = (select(CommunityPost.id.label('post_id'))
+              # "= false" (e não IS) para o planejador usar o índice parcial
+              .where(CommunityPost.author_id.in_(followed), CommunityPost.fanned_out == false())
+              .order_by(CommunityPost.created_at.desc(), CommunityPost.id.desc())
+              .limit(limit))
+    after = keyset_criterion(CommunityPost.created_at, CommunityPost.id, cursor)
+    if after is not None:
+        pulled = pulled.where(after)
+    return union(stored.subquery().select(), pulled.subquery().select())
+
+
+def home_feed_page(user_id, cursor=None, per_page=DEFAULT_PER_PAGE, comments_per_post=0):
+    """Página da linha do tempo inicial (Page de FeedPost)."""
+    return load_feed_page(CommunityPost.id.in_(_candidates(user_id, cursor, per_page + 1)),
+                          cursor=cursor, per_page=per_page, viewer_id=user_id,
+                          comments_per_post=comments_per_post)
+
+
+def init_home_timeline(app):
+    """Cria o buffer de corte das linhas do tempo da aplicação."""
+    buffer = TrimBuffer(app, app.config.get('HOME_TRIM_INTERVAL', DEFAULT_TRIM_INTERVAL))
+    app.extensions['home_timeline_trim'] = buffer
+    return buffer
@@ -0,0 +1,216 @@
+# app/utils/images.py
+"""
+Versões redimensionadas das capas enviadas.
+
+Depois que uma capa é enviada, os derivados (WebP e JPEG em algumas
+larguras fixas, sem metadados EXIF/ICC) são gerados fora da requisição: uma
+thread coordena e o redimensionamento, que usa CPU, roda em um pool de
+processos. Os caminhos ficam em Content.image_variants e o helper de
+template responsive_image() monta um <picture> com srcset.
+
+Os derivados têm nome fixo a partir do hash da capa
+(uploads/derived/<xx>/<sha256>-<largura>.<ext>), então gerar de novo não
+refaz o que já existe e "flask build-derivatives" pode rodar sobre todo o
+acervo quantas vezes for preciso.
+
+Requer o pacote Pillow; sem ele as páginas continuam usando a capa original.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from flask import current_app, url_for
+from markupsafe import Markup, escape
+from sqlalchemy import update
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # dependência opcional
+    Image = None
+
+from ..models import db, Content
+from .cache import invalidate
+from .storage import blob_hash, derived_path
+
+DEFAULT_WIDTHS = (320, 640, 960)
+DEFAULT_WORKERS = 2
+# (extensão, formato do Pillow, opções de gravação)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 6}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+# Largura máxima da imagem <img src> usada por navegadores sem srcset
+FALLBACK_WIDTH = 640
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _flatten(image):
+    """Imagem RGB para JPEG; áreas transparentes viram fundo branco."""
+    if 'A' in image.getbands():
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variants(static_folder, source, sha256, widths):
+    """Gera os derivados que ainda não existem. Roda em um processo do pool.
+
+    Larguras maiores que a original não são ampliadas: viram uma única
+    variante na largura original.
+
+    Returns:
+        {'webp': {'320': caminho, ...}, 'jpeg': {...}}
+    """
+    with Image.open(os.path.join(static_folder, source)) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    variants = {ext: {} for ext, _, _ in FORMATS}
+    for width in sorted({min(width, image.width) for width in widths}):
+        resized = None
+        for ext, fmt, options in FORMATS:
+            path = derived_path(sha256, width, ext)
+            target = os.path.join(static_folder, path)
+            if not os.path.exists(target):
+                if resized is None:
+                    height = max(1, round(image.height * width / image.width))
+                    resized = image.resize((width, height), Image.LANCZOS)
+                frame = _flatten(resized) if fmt == 'JPEG' else resized.copy()
+                frame.info = {}  # não leva EXIF/ICC/XMP da original
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                temp = f'{target}.{os.getpid()}.tmp'
+                frame.save(temp, fmt, **options)
+                os.replace(temp, target)
+            variants[ext][str(width)] = path
+    return variants
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: o processo web tem threads e conexões abertas que não devem ser copiadas
+            _pool = ProcessPoolExecutor(max_workers=current_app.config.get('IMAGE_WORKERS', DEFAULT_WORKERS),
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _pending(content_ids, force):
+    """(id, capa, hash) dos conteúdos cujos derivados faltam ou estão desatualizados."""
+    query = db.session.query(Content.id, Content.thumbnail, Content.image_variants).filter(
+        Content.thumbnail.like('uploads/%'))
+    if content_ids is not None:
+        query = query.filter(Content.id.in_(content_ids))
+    pending = []
+    for content_id, thumbnail, variants in query:
+        sha256 = blob_hash(thumbnail)
+        if sha256 and (force or not variants or variants.get('source') != thumbnail):
+            pending.append((content_id, thumbnail, sha256))
+    return pending
+
+
+def process_contents(content_ids=None, force=False):
+    """Gera os derivados das capas e grava Content.image_variants. Faz commit.
+
+    Args:
+        content_ids: Conteúdos a processar (None = todo o acervo)
+        force: Reprocessa mesmo os que já têm derivados registrados
+
+    Returns:
+        Número de conteúdos atualizados
+    """
+    if Image is None:
+        return 0
+    pending = _pending(content_ids, force)
+    if not pending:
+        return 0
+
+    static_folder = current_app.static_folder
+    widths = current_app.config.get('IMAGE_WIDTHS', DEFAULT_WIDTHS)
+    pool = _get_pool()
+    futures = {pool.submit(render_variants, static_folder, thumbnail, sha256, widths): (content_id, thumbnail)
+               for content_id, thumbnail, sha256 in pending}
+    updated = []
+    for future in as_completed(futures):
+        content_id, thumbnail = futures[future]
+        try:
+            variants = future.result()
+        except Exception as e:
+            print(f"❌ Erro ao gerar derivados da capa do conteúdo {content_id}: {e}")
+            continue
+        variants['source'] = thumbnail
+        # A capa pode ter sido trocada enquanto os derivados eram gerados
+        result = db.session.execute(
+            update(Content).where(Content.id == content_id, Content.thumbnail == thumbnail)
+            .values(image_variants=variants, version=Content.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount:
+            updated.append(content_id)
+
+    if updated:
+        invalidate('contents', *(f'content:{content_id}' for content_id in updated))
+    return len(updated)
+
+
+def _worker(app, content_ids):
+    with app.app_context():
+        try:
+            process_contents(content_ids)
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Erro ao gerar derivados de imagens: {e}")
+
+
+def schedule_derivatives(content_ids):
+    """Dispara a geração dos derivados em uma thread, fora do ciclo da requisição.
+
+    Com IMAGE_DERIVATIVES_ASYNC=False (ou sem Pillow) nada é iniciado e os
+    derivados ficam para "flask build-derivatives".
+    """
+    app = current_app._get_current_object()
+    if Image is None or not app.config.get('IMAGE_DERIVATIVES_ASYNC', True) or not content_ids:
+        return None
+    thread = threading.Thread(target=_worker, args=(app, list(content_ids)),
+                              name='image-derivatives', daemon=True)
+    thread.start()
+    return thread
+
+
+def _srcset(paths):
+    return ', '.join(f"{url_for('static', filename=path)} {width}w"
+                     for width, path in sorted(paths.items(), key=lambda item: int(item[0])))
+
+
+def responsive_image(content, sizes='100vw', **attrs):
+    """<img> da capa; com derivados, um <picture> com srcset WebP e JPEG.
+
+    Uso: {{ responsive_image(content, sizes='33vw', class='card-img-top') }}
+    """
+    thumbnail = content.thumbnail
+    src = url_for('static', filename=thumbnail) if thumbnail.startswith('uploads/') else thumbnail
+    extra = ''.join(f' {name}="{escape(value)}"' for name, value in attrs.items())
+    variants = getattr(content, 'image_variants', None)
+    if not variants or variants.get('source') != thumbnail:
+        return Markup(f'<img src="{escape(src)}"{extra}>')
+
+    jpeg = variants['jpeg']
+    widths = sorted(int(width) for width in jpeg)
+    fallback = jpeg[str(max([w for w in widths if w <= FALLBACK_WIDTH] or widths[:1]))]
+    return Markup(
+        f'<picture><source type="image/webp" srcset="{_srcset(variants["webp"])}" sizes="{escape(sizes)}">'
+        f'<img src="{url_for("static", filename=fallback)}" srcset="{_srcset(jpeg)}" sizes="{escape(sizes)}"{extra}>'
+        f'</picture>'
+    )
+
+
+def init_images(app):
+    """Registra o helper responsive_image nos templates."""
+    app.jinja_env.globals['responsive_image'] = responsive_image
@@ -0,0 +1,167 @@
+# app/utils/inbox.py
+"""
+Caixa de entrada das mensagens privadas.
+
+Cada participante de uma conversa tem uma linha em tb_conversation_summaries
+com a última mensagem (id, remetente, prévia, data) e quantas mensagens dele
+ainda não foram lidas. A linha é atualizada por upsert na mesma transação
+de send_message, e o total de não lidas do usuário fica em
+UserStats.unread_messages_count. Assim:
+
+- a caixa de entrada é um intervalo do índice (usuário, última data),
+  paginado por cursor, sem GROUP BY sobre tb_private_messages;
+- o contador da barra de navegação é uma leitura por chave primária;
+- marcar uma conversa como lida é um único UPDATE nas mensagens, mais o
+  zeramento do resumo e o desconto no total.
+"""
+from flask_login import current_user
+from sqlalchemy import case, func, insert, select, update
+
+from ..models import db, ConversationSummary, PrivateMessage, UserStats
+from .pagination import paginate
+from .user_stats import bump_user_stats
+
+PREVIEW_LENGTH = 140
+# Colunas copiadas da mensagem mais nova a cada envio
+LAST_COLUMNS = ('cvs_last_message_id', 'cvs_last_sender_id', 'cvs_last_preview', 'cvs_last_at')
+
+
+def _preview(text):
+    return text[:PREVIEW_LENGTH]
+
+
+def record_message(message):
+    """Atualiza os resumos dos dois participantes com uma mensagem nova (sem commit)."""
+    db.session.flush()
+    base = {
+        'conversation': message.conversation,
+        'last_message_id': message.id,
+        'last_sender_id': message.sender_id,
+        'last_preview': _preview(message.text),
+        'last_at': message.sent_at,
+    }
+    rows = [dict(base, user_id=message.sender_id, peer_id=message.receiver_id, unread_count=0)]
+    if message.receiver_id != message.sender_id:
+        rows.append(dict(base, user_id=message.receiver_id, peer_id=message.sender_id, unread_count=1))
+        bump_user_stats(message.receiver_id, unread_messages_count=1)
+    _upsert(rows)
+
+
+def _upsert(rows):
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(ConversationSummary).values(rows)
+        table = ConversationSummary.__table__
+        # Só uma mensagem mais nova substitui a "última"; o contador sempre soma
+        newer = stmt.excluded.cvs_last_message_id > table.c.cvs_last_message_id
+        set_ = {name: case((newer, stmt.excluded[name]), else_=table.c[name]) for name in LAST_COLUMNS}
+        set_['cvs_unread_count'] = table.c.cvs_unread_count + stmt.excluded.cvs_unread_count
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[ConversationSummary.user_id, ConversationSummary.peer_id],
+            set_=set_,
+        ))
+        return
+    for row in rows:
+        summary = db.session.get(ConversationSummary, (row['user_id'], row['peer_id']))
+        if summary is None:
+            db.session.add(ConversationSummary(**row))
+            continue
+        if row['last_message_id'] > summary.last_message_id:
+            for key in ('last_message_id', 'last_sender_id', 'last_preview', 'last_at'):
+                setattr(summary, key, row[key])
+        summary.unread_count += row['unread_count']
+    db.session.flush()
+
+
+def mark_conversation_read(user_id, peer_id):
+    """Marca como lidas as mensagens recebidas de peer_id (sem commit).
+
+    Returns:
+        Quantidade de mensagens marcadas
+    """
+    if user_id == peer_id:
+        # Mensagens para si mesmo não contam como não lidas
+        return 0
+    marked = db.session.execute(
+        update(PrivateMessage)
+        .where(PrivateMessage.conversation == PrivateMessage.conversation_key(user_id, peer_id),
+               PrivateMessage.receiver_id == user_id,
+               PrivateMessage.is_read.is_(False))
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if marked:
+        db.session.execute(
+            update(ConversationSummary)
+            .where(ConversationSummary.user_id == user_id, ConversationSummary.peer_id == peer_id)
+            .values(unread_count=0)
+            .execution_options(synchronize_session=False)
+        )
+        bump_user_stats(user_id, unread_messages_count=-marked)
+    return marked
+
+
+def inbox_page(user_id, cursor=None, per_page=20):
+    """Página da caixa de entrada (Page de ConversationSummary com peer carregado)."""
+    query = ConversationSummary.query.filter(ConversationSummary.user_id == user_id)
+    return paginate(query, ConversationSummary.last_at, ConversationSummary.last_message_id, cursor, per_page)
+
+
+def unread_total(user_id):
+    """Mensagens não lidas do usuário (leitura por chave primária)."""
+    stats = db.session.get(UserStats, user_id)
+    return max(stats.unread_messages_count, 0) if stats is not None else 0
+
+
+def rebuild_summaries():
+    """Recria tb_conversation_summaries a partir das mensagens (sem commit).
+
+    A última mensagem de cada conversa vem de um GROUP BY pela chave da
+    conversa e as não lidas de outro, por (destinatário, conversa); cada
+    lado da conversa é inserido com um INSERT ... SELECT.
+
+    Returns:
+        Quantidade de resumos criados
+    """
+    last = (select(PrivateMessage.conversation.label('conversation'), func.max(PrivateMessage.id).label('last_id'))
+            .group_by(PrivateMessage.conversation)
+            .subquery('last'))
+    unread = (select(PrivateMessage.receiver_id.label('user_id'),
+                     PrivateMessage.conversation.label('conversation'),
+                     func.count().label('total'))
+              .where(PrivateMessage.is_read.is_(False), PrivateMessage.sender_id != PrivateMessage.receiver_id)
+              .group_by(PrivateMessage.receiver_id, PrivateMessage.conversation)
+              .subquery('unread'))
+
+    db.session.execute(ConversationSummary.__table__.delete())
+    target = [getattr(ConversationSummary, name).expression
+              for name in ('user_id', 'peer_id', 'conversation', 'last_message_id', 'last_sender_id',
+                           'last_preview', 'last_at', 'unread_count')]
+    for owner, peer in ((PrivateMessage.sender_id, PrivateMessage.receiver_id),
+                        (PrivateMessage.receiver_id, PrivateMessage.sender_id)):
+        query = (select(owner, peer, PrivateMessage.conversation, PrivateMessage.id, PrivateMessage.sender_id,
+                        func.substr(PrivateMessage.text, 1, PREVIEW_LENGTH), PrivateMessage.sent_at,
+                        func.coalesce(unread.c.total, 0))
+                 .join(last, last.c.last_id == PrivateMessage.id)
+                 .outerjoin(unread, (unread.c.user_id == owner)
+                            & (unread.c.conversation == PrivateMessage.conversation)))
+        if owner is PrivateMessage.receiver_id:
+            # Mensagens para si mesmo já entraram pelo lado do remetente
+            query = query.where(PrivateMessage.sender_id != PrivateMessage.receiver_id)
+        db.session.execute(insert(ConversationSummary.__table__).from_select(target, query))
+    return db.session.query(func.count()).select_from(ConversationSummary).scalar()
+
+
+def init_inbox(app):
+    """Registra unread_messages() nos templates (contador da barra de navegação)."""
+
+    def unread_messages():
+        if not current_user.is_authenticated:
+            return 0
+        return unread_total(current_user.id)
+
+    app.jinja_env.globals['unread_messages'] = unread_messages
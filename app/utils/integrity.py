@@ -0,0 +1,167 @@
+# app/utils/integrity.py
+"""
+Integridade referencial dos dados de comunidades.
+
+Posts, curtidas, comentários e bloqueios dependem de chaves estrangeiras com
+ON DELETE CASCADE: apagar uma comunidade ou um post é um único DELETE e o
+banco remove o resto. Bancos criados antes disso não têm as cascatas nem
+garantem as chaves; add_cascades() recria as restrições e sweep_orphans()
+limpa as linhas órfãs deixadas pelos DELETEs em lote antigos.
+"""
+from sqlalchemy import delete, exists, func, inspect, select
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from ..models import (db, Community, CommunityBlock, CommunityPost, CommunityPostComment,
+                      CommunityPostLike, UserActivity)
+
+# (modelo filho, atributo FK, modelo pai), na ordem em que as órfãs aparecem:
+# posts sem comunidade deixam curtidas e comentários sem post
+CASCADES = (
+    (CommunityPost, 'community_id', Community),
+    (CommunityBlock, 'community_id', Community),
+    (CommunityPostLike, 'post_id', CommunityPost),
+    (CommunityPostComment, 'post_id', CommunityPost),
+)
+
+# Tipo de atividade (perfil) gerada por cada modelo
+ACTIVITY_TYPES = {
+    CommunityPost: 'post',
+    CommunityPostLike: 'like',
+    CommunityPostComment: 'comment',
+}
+
+
+def _orphan_criterion(child, fk, parent):
+    return ~exists().where(parent.id == getattr(child, fk))
+
+
+def sweep_orphans(dry_run=False):
+    """Apaga linhas cujo pai (comunidade ou post) não existe mais.
+
+    Cada tabela é limpa com um único DELETE ... WHERE NOT EXISTS; as
+    atividades de perfil das linhas removidas vão junto. Com dry_run=True
+    apenas conta. Faz commit.
+
+    Returns:
+        Lista de (tabela, quantidade de órfãs)
+    """
+    found = []
+    for child, fk, parent in CASCADES:
+        orphans = _orphan_criterion(child, fk, parent)
+        if dry_run:
+            total = db.session.execute(select(func.count()).select_from(child).where(orphans)).scalar()
+        else:
+            kind = ACTIVITY_TYPES.get(child)
+            if kind:
+                (UserActivity.query
+                    .filter(UserActivity.type == kind,
+                            UserActivity.source_id.in_(select(child.id).where(orphans)))
+                    .delete(synchronize_session=False))
+            total = db.session.execute(
+                delete(child).where(orphans).execution_options(synchronize_session=False)
+            ).rowcount
+        found.append((child.__tablename__, total))
+
+    if not dry_run:
+        db.session.commit()
+    return found
+
+
+def missing_cascades():
+    """Tabelas filhas cuja chave estrangeira ainda não tem ON DELETE CASCADE."""
+    inspector = inspect(db.engine)
+    tables = inspector.get_table_names()
+    missing = []
+    for child, fk, parent in CASCADES:
+        table = child.__table__
+        if table.name not in tables or table in missing:
+            continue
+        column = getattr(child, fk).expression.name
+        current = [key for key in inspector.get_foreign_keys(table.name)
+                   if key['constrained_columns'] == [column]]
+        if not current or (current[0].get('options') or {}).get('ondelete', '').upper() != 'CASCADE':
+            missing.append(table)
+    return missing
+
+
+def _rebuild_sqlite_tables(tables):
+    """Recria tabelas SQLite com o esquema atual dos modelos, preservando os dados.
+
+    O SQLite não altera restrições de tabelas existentes; segue-se o
+    procedimento da documentação (criar a nova tabela, copiar, apagar a
+    antiga e renomear) em uma única transação, com as chaves desligadas.
+    """
+    dialect = db.engine.dialect
+    inspector = inspect(db.engine)
+    raw = db.engine.raw_connection()
+    connection = raw.driver_connection
+    isolation_level = connection.isolation_level
+    connection.isolation_level = None  # BEGIN/COMMIT explícitos
+    cursor = connection.cursor()
+    try:
+        cursor.execute('PRAGMA foreign_keys=OFF')
+        cursor.execute('BEGIN')
+        try:
+            for table in tables:
+                new_name = f'{table.name}__new'
+                existing = {col['name'] for col in inspector.get_columns(table.name)}
+                columns = ', '.join(col.name for col in table.columns if col.name in existing)
+
+                ddl = str(CreateTable(table).compile(dialect=dialect)).strip()
+                cursor.execute(ddl.replace(f'CREATE TABLE {table.name} ', f'CREATE TABLE {new_name} ', 1))
+                cursor.execute(f'INSERT INTO {new_name} ({columns}) SELECT {columns} FROM {table.name}')
+                cursor.execute(f'DROP TABLE {table.name}')
+                cursor.execute(f'ALTER TABLE {new_name} RENAME TO {table.name}')
+                for index in table.indexes:
+                    cursor.execute(str(CreateIndex(index).compile(dialect=dialect)))
+
+            problems = cursor.execute('PRAGMA foreign_key_check').fetchall()
+            if problems:
+                raise RuntimeError(f'{len(problems)} linhas violam chaves estrangeiras: {problems[:5]}')
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+    finally:
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+        connection.isolation_level = isolation_level
+        raw.close()
+
+
+def _alter_postgresql_tables(tables):
+    """Troca as restrições de chave estrangeira por versões com ON DELETE CASCADE."""
+    inspector = inspect(db.engine)
+    for table in tables:
+        for constraint in table.foreign_key_constraints:
+            if constraint.ondelete != 'CASCADE':
+                continue
+            columns = [col.name for col in constraint.columns]
+            for key in inspector.get_foreign_keys(table.name):
+                if key['constrained_columns'] == columns and key.get('name'):
+                    db.session.execute(db.text(f'ALTER TABLE {table.name} DROP CONSTRAINT {key["name"]}'))
+            referred = constraint.elements[0].column
+            db.session.execute(db.text(
+                f'ALTER TABLE {table.name} ADD FOREIGN KEY ({", ".join(columns)}) '
+                f'REFERENCES {referred.table.name} ({referred.name}) ON DELETE CASCADE'
+            ))
+    db.session.commit()
+
+
+def add_cascades(tables=None):
+    """Aplica ON DELETE CASCADE às tabelas de comunidades que ainda não o têm.
+
+    Returns:
+        Nomes das tabelas alteradas
+    """
+    tables = missing_cascades() if tables is None else tables
+    if not tables:
+        return []
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        _rebuild_sqlite_tables(tables)
+    elif dialect == 'postgresql':
+        _alter_postgresql_tables(tables)
+    else:
+        raise NotImplementedError(f'Cascatas não suportadas para o banco {dialect}')
+    return [table.name for table in tables]
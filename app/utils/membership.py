@@ -0,0 +1,115 @@
+# app/utils/membership.py
+"""
+Participação dos usuários nas comunidades (tb_community_memberships).
+
+Uma linha por (usuário, comunidade), criada quando o usuário cria a
+comunidade (papel "owner") ou posta, comenta ou curte nela ("member"), e
+atualizada com a data da atividade mais recente, na mesma transação da
+escrita. "Minhas comunidades" passa a ser um intervalo do índice
+(usuário, última atividade) unido a tb_communities, e o diretório mostra a
+contagem de membros (app.utils.community_access).
+
+Sair de uma comunidade não é registrado: apagar um post, um comentário ou
+uma curtida não remove a participação. rebuild_memberships() recria a
+tabela a partir do histórico (backfill).
+"""
+from datetime import datetime
+
+from sqlalchemy import case, func, insert, literal, select, union_all, update
+
+from ..models import db, Community, CommunityMembership, CommunityPost, CommunityPostComment, CommunityPostLike
+
+
+def touch_membership(user_id, community_id, role='member', at=None):
+    """Registra atividade do usuário na comunidade (sem commit).
+
+    Args:
+        user_id: Usuário que postou, comentou, curtiu ou criou a comunidade
+        community_id: Comunidade
+        role: 'owner' promove o usuário a dono; 'member' mantém o papel atual
+        at: Momento da atividade (padrão: agora)
+
+    Returns:
+        True se o usuário acabou de entrar na comunidade (a contagem de
+        membros mudou: invalidar o tag "communities" após o commit)
+    """
+    at = at or datetime.utcnow()
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        joined = db.session.execute(
+            dialect_insert(CommunityMembership)
+            .values(user_id=user_id, community_id=community_id, role=role, joined_at=at, last_activity_at=at)
+            .on_conflict_do_nothing()
+        ).rowcount == 1
+    else:
+        joined = db.session.get(CommunityMembership, (user_id, community_id)) is None
+        if joined:
+            db.session.add(CommunityMembership(user_id=user_id, community_id=community_id, role=role,
+                                               joined_at=at, last_activity_at=at))
+            db.session.flush()
+    if not joined:
+        values = {CommunityMembership.last_activity_at: at}
+        if role == 'owner':
+            values[CommunityMembership.role] = 'owner'
+        db.session.execute(
+            update(CommunityMembership)
+            .where(CommunityMembership.user_id == user_id, CommunityMembership.community_id == community_id)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+    return joined
+
+
+def member_community_ids(user_id):
+    """IDs das comunidades ativas do usuário, da atividade mais recente para a mais antiga."""
+    return list(db.session.scalars(
+        select(CommunityMembership.community_id)
+        .join(Community, Community.id == CommunityMembership.community_id)
+        .where(CommunityMembership.user_id == user_id, Community.status == 'active')
+        .order_by(CommunityMembership.last_activity_at.desc())
+    ))
+
+
+def member_counts():
+    """Subconsulta (community_id, members) para juntar às comunidades."""
+    return (select(CommunityMembership.community_id.label('community_id'),
+                   func.count().label('members'))
+            .group_by(CommunityMembership.community_id)
+            .subquery('member_counts'))
+
+
+def rebuild_memberships():
+    """Recria tb_community_memberships a partir do histórico (sem commit).
+
+    Donos, posts, comentários e curtidas entram em um único UNION ALL,
+    agrupado por (usuário, comunidade): a primeira atividade vira a data de
+    entrada e a última, a última atividade.
+
+    Returns:
+        Quantidade de participações criadas
+    """
+    activity = union_all(
+        select(Community.owner_id.label('user_id'), Community.id.label('community_id'),
+               Community.created_at.label('at')),
+        select(CommunityPost.author_id, CommunityPost.community_id, CommunityPost.created_at),
+        select(CommunityPostComment.user_id, CommunityPost.community_id, CommunityPostComment.created_at)
+        .join(CommunityPost, CommunityPost.id == CommunityPostComment.post_id),
+        select(CommunityPostLike.user_id, CommunityPost.community_id, CommunityPostLike.created_at)
+        .join(CommunityPost, CommunityPost.id == CommunityPostLike.post_id),
+    ).subquery('activity')
+    query = (select(activity.c.user_id, activity.c.community_id,
+                    func.max(case((Community.owner_id == activity.c.user_id, literal('owner')),
+                                  else_=literal('member'))),
+                    func.min(activity.c.at), func.max(activity.c.at))
+             .join(Community, Community.id == activity.c.community_id)
+             .group_by(activity.c.user_id, activity.c.community_id))
+
+    db.session.execute(CommunityMembership.__table__.delete())
+    target = [getattr(CommunityMembership, name).expression
+              for name in ('user_id', 'community_id', 'role', 'joined_at', 'last_activity_at')]
+    db.session.execute(insert(CommunityMembership.__table__).from_select(target, query))
+    return db.session.query(func.count()).select_from(CommunityMembership).scalar()
@@ -0,0 +1,104 @@
+# app/utils/pagination.py
+"""
+Paginação por cursor (keyset) baseada no par (created_at, id).
+
+Ao contrário de OFFSET, a próxima página é obtida com um filtro
+"(created_at, id) < (último created_at, último id)" servido pelos índices
+compostos de cada tabela, então a página 1000 custa o mesmo que a primeira.
+O cursor enviado ao cliente é um token opaco (base64) com esse par.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from flask import request
+from sqlalchemy import tuple_
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+
+class Page:
+    """Uma página de resultados e o cursor para a próxima."""
+
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(created_at, item_id):
+    """Codifica (created_at, id) em um token opaco seguro para URLs."""
+    raw = f"{created_at.isoformat()}|{item_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decodifica um token gerado por encode_cursor. Retorna None se inválido."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        created_at, item_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, UnicodeError, binascii.Error):
+        return None
+
+
+def get_page_args(default_per_page=DEFAULT_PER_PAGE):
+    """Lê ?cursor= e ?per_page= da requisição atual."""
+    per_page = request.args.get('per_page', default_per_page, type=int)
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    return decode_cursor(request.args.get('cursor')), per_page
+
+
+def wants_json():
+    """Indica se o cliente pediu a variante JSON ("carregar mais")."""
+    return request.args.get('format') == 'json'
+
+
+def keyset_criterion(created_col, id_col, cursor, descending=True):
+    """Filtro que posiciona a consulta logo após o cursor informado."""
+    if cursor is None:
+        return None
+    key = tuple_(created_col, id_col)
+    return key < tuple_(*cursor) if descending else key > tuple_(*cursor)
+
+
+def keyset_order(created_col, id_col, descending=True):
+    """Ordenação compatível com keyset_criterion."""
+    if descending:
+        return created_col.desc(), id_col.desc()
+    return created_col.asc(), id_col.asc()
+
+
+def make_page(rows, per_page, key):
+    """Monta uma Page a partir de per_page + 1 linhas já ordenadas.
+
+    A linha extra só serve para saber se existe próxima página; key extrai
+    o par (created_at, id) de um item.
+    """
+    items = list(rows[:per_page])
+    next_cursor = None
+    if len(rows) > per_page and items:
+        next_cursor = encode_cursor(*key(items[-1]))
+    return Page(items, next_cursor)
+
+
+def paginate(query, created_col, id_col, cursor=None, per_page=DEFAULT_PER_PAGE, descending=True):
+    """Aplica paginação keyset a uma query ORM e retorna uma Page de entidades."""
+    criterion = keyset_criterion(created_col, id_col, cursor, descending)
+    if criterion is not None:
+        query = query.filter(criterion)
+    rows = query.order_by(*keyset_order(created_col, id_col, descending)).limit(per_page + 1).all()
+    return make_page(rows, per_page, lambda item: (getattr(item, created_col.key), getattr(item, id_col.key)))
@@ -0,0 +1,236 @@
+# app/utils/passwords.py
+"""
+Hash e verificação de senhas, com limite de tentativas de login.
+
+- Hashes novos usam bcrypt com custo BCRYPT_LOG_ROUNDS (lido pelo
+  Flask-Bcrypt). O esquema de um hash guardado sai do prefixo ($2a$, $2b$,
+  $2y$: bcrypt; pbkdf2:, scrypt:: werkzeug, das contas antigas), então cada
+  tentativa roda um único verificador.
+- Depois de um login certo, needs_rehash() indica hashes werkzeug ou bcrypt
+  com custo diferente do configurado, e o hash é refeito com a senha que
+  acabou de ser conferida.
+- O cálculo roda em um pool de PASSWORD_WORKERS threads por processo (o
+  bcrypt libera o GIL). Com PASSWORD_QUEUE_SIZE cálculos já esperando, um
+  pedido novo recebe PasswordBusy na hora em vez de entrar na fila: uma
+  rajada de logins não ocupa mais que o pool.
+- Logins errados são contados por conta (e-mail) e por IP em janelas fixas
+  de LOGIN_WINDOW_SECONDS, em um armazenamento próprio, fora do cache de
+  páginas (LOGIN_THROTTLE_BACKEND): "memory" guarda até
+  LOGIN_THROTTLE_MAX_KEYS chaves por processo, e cada worker conta
+  separadamente; "redis" compartilha os contadores entre os workers (use em
+  produção com mais de um processo). Passado o limite, a tentativa é
+  recusada antes de qualquer hash.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, request
+from werkzeug.security import check_password_hash as werkzeug_check_password_hash
+
+from ..extensions import bcrypt
+
+DEFAULT_ROUNDS = 12
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 8
+DEFAULT_WINDOW = 900
+DEFAULT_MAX_ACCOUNT_FAILURES = 10
+DEFAULT_MAX_IP_FAILURES = 50
+DEFAULT_THROTTLE_KEYS = 10000
+
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+WERKZEUG_PREFIXES = ('pbkdf2:', 'scrypt:')
+
+
+class PasswordBusy(Exception):
+    """O pool de hash está cheio; a requisição deve ser recusada (tentar de novo)."""
+
+
+_executor = None
+_slots = None
+_pid = None
+_executor_lock = threading.Lock()
+
+
+def _config(name, default):
+    return current_app.config.get(name, default)
+
+
+def _get_executor():
+    global _executor, _slots, _pid
+    with _executor_lock:
+        # O pool é por processo: workers criados por fork não herdam as threads do pai
+        if _executor is None or _pid != os.getpid():
+            workers = _config('PASSWORD_WORKERS', DEFAULT_WORKERS)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+            _slots = threading.BoundedSemaphore(workers + _config('PASSWORD_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+            _pid = os.getpid()
+        return _executor, _slots
+
+
+def _run(fn, *args):
+    """Roda fn(*args) no pool e espera o resultado (PasswordBusy se estiver cheio)."""
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        raise PasswordBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future.result()
+
+
+def hash_scheme(password_hash):
+    """'bcrypt', 'werkzeug' ou None (hash vazio ou desconhecido)."""
+    if not password_hash:
+        return None
+    if password_hash.startswith(BCRYPT_PREFIXES):
+        return 'bcrypt'
+    if password_hash.startswith(WERKZEUG_PREFIXES):
+        return 'werkzeug'
+    return None
+
+
+def _bcrypt_check(password_hash, password):
+    try:
+        return bcrypt.check_password_hash(password_hash, password)
+    except ValueError:
+        # Hash corrompido ou senha acima do limite do bcrypt (72 bytes)
+        return False
+
+
+def hash_password(password):
+    """Hash bcrypt da senha, com o custo configurado (no pool)."""
+    return _run(bcrypt.generate_password_hash, password).decode('utf-8')
+
+
+def verify_password(password_hash, password):
+    """Confere a senha com o verificador do esquema do hash (no pool)."""
+    scheme = hash_scheme(password_hash)
+    if scheme == 'bcrypt':
+        return _run(_bcrypt_check, password_hash, password)
+    if scheme == 'werkzeug':
+        return _run(werkzeug_check_password_hash, password_hash, password)
+    return False
+
+
+def needs_rehash(password_hash):
+    """True para hashes werkzeug e bcrypt com custo diferente de BCRYPT_LOG_ROUNDS."""
+    scheme = hash_scheme(password_hash)
+    if scheme == 'werkzeug':
+        return True
+    if scheme == 'bcrypt':
+        # $2b$<custo>$<sal e hash>
+        return int(password_hash.split('$')[2]) != _config('BCRYPT_LOG_ROUNDS', DEFAULT_ROUNDS)
+    return False
+
+
+class MemoryThrottleStore:
+    """Contadores com prazo em processo, limitados a max_keys chaves.
+
+    Cheio, descarta primeiro os expirados e depois os de menor contagem:
+    espalhar tentativas por muitas chaves não apaga as contas e IPs que já
+    estão perto do limite. Cada worker conta separadamente.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_keys=DEFAULT_THROTTLE_KEYS):
+        self.max_keys = max_keys
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            values = []
+            for key in keys:
+                count, expires_at = self._data.get(key, (0, now))
+                values.append(count if expires_at > now else 0)
+            return values
+
+    def incr(self, key, ttl):
+        now = time.monotonic()
+        with self._lock:
+            count, expires_at = self._data.get(key, (0, now))
+            if expires_at <= now:
+                count, expires_at = 0, now + ttl
+                if key not in self._data and len(self._data) >= self.max_keys:
+                    self._evict(now)
+            self._data[key] = (count + 1, expires_at)
+            return count + 1
+
+    def _evict(self, now):
+        for key in [key for key, (_, expires_at) in self._data.items() if expires_at <= now]:
+            del self._data[key]
+        excess = len(self._data) - self.max_keys + 1
+        if excess > 0:
+            # Um décimo de folga para não ordenar a cada chave nova
+            drop = max(excess, self.max_keys // 10)
+            for key in sorted(self._data, key=lambda k: self._data[k][0])[:drop]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisThrottleStore:
+    """Contadores compartilhados entre workers (INCR + EXPIRE)."""
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='mv:login:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get_many(self, keys):
+        return [int(value or 0) for value in self.client.mget([self.prefix + key for key in keys])]
+
+    def incr(self, key, ttl):
+        value = self.client.incr(self.prefix + key)
+        if value == 1:
+            # O prazo conta a partir do primeiro erro da janela
+            self.client.expire(self.prefix + key, ttl)
+        return value
+
+
+def _make_throttle_store(config):
+    if config.get('LOGIN_THROTTLE_BACKEND', 'memory') == 'redis':
+        try:
+            return RedisThrottleStore(config['LOGIN_THROTTLE_REDIS_URL'])
+        except ImportError:
+            print("⚠️  Pacote redis não instalado; limite de logins em memória (por worker)")
+    return MemoryThrottleStore(config.get('LOGIN_THROTTLE_MAX_KEYS', DEFAULT_THROTTLE_KEYS))
+
+
+def init_passwords(app):
+    """Cria o armazenamento dos contadores de logins errados da aplicação."""
+    app.extensions['login_throttle'] = _make_throttle_store(app.config)
+
+
+def _throttle_keys(email):
+    window = _config('LOGIN_WINDOW_SECONDS', DEFAULT_WINDOW)
+    slot = int(time.time() // window)
+    account = (email or '').strip().lower()
+    return (f'account:{account}:{slot}', f'ip:{request.remote_addr}:{slot}')
+
+
+def login_throttled(email):
+    """True se a conta ou o IP da requisição passaram do limite de logins errados."""
+    store = current_app.extensions['login_throttle']
+    account_failures, ip_failures = store.get_many(_throttle_keys(email))
+    return (account_failures >= _config('LOGIN_MAX_ACCOUNT_FAILURES', DEFAULT_MAX_ACCOUNT_FAILURES)
+            or ip_failures >= _config('LOGIN_MAX_IP_FAILURES', DEFAULT_MAX_IP_FAILURES))
+
+
+def record_login_failure(email):
+    """Conta um login errado para a conta e para o IP da requisição."""
+    store = current_app.extensions['login_throttle']
+    window = _config('LOGIN_WINDOW_SECONDS', DEFAULT_WINDOW)
+    for key in _throttle_keys(email):
+        store.incr(key, window)
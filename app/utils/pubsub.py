@@ -0,0 +1,155 @@
+# app/utils/pubsub.py
+"""
+Publicação/assinatura de eventos para entrega em tempo real (chat).
+
+Cada usuário tem um canal ("user:<id>"); send_message publica a mensagem
+nos canais do remetente e do destinatário depois do commit, e as conexões
+SSE/long-poll abertas esperam no canal sem consultar o banco.
+
+Backends (PUBSUB_BACKEND):
+- "memory": filas em processo; só entrega para conexões do mesmo worker
+  (desenvolvimento, testes ou um único processo);
+- "redis": PUBLISH/SUBSCRIBE no Redis (PUBSUB_REDIS_URL), para vários
+  workers. Requer o pacote redis; sem ele cai no backend em memória.
+"""
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+
+# Eventos guardados por assinatura enquanto o cliente não lê (excedentes são
+# descartados; o cliente recupera pelo Last-Event-ID ao reconectar)
+SUBSCRIPTION_BUFFER = 256
+
+
+class MemorySubscription:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=SUBSCRIPTION_BUFFER)
+
+    def get(self, timeout):
+        """Próximo evento ou None se nada chegar em timeout segundos."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker._unsubscribe(self)
+
+
+class MemoryBroker:
+    """Pub/sub em processo."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def subscribe(self, channel):
+        subscription = MemorySubscription(self, channel)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def subscribers(self):
+        with self._lock:
+            return sum(len(subs) for subs in self._subscriptions.values())
+
+
+class RedisSubscription:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    def get(self, timeout):
+        # timeout <= 0 ainda lê o que já chegou (drenagem sem espera)
+        deadline = time.monotonic() + max(timeout, 0)
+        while True:
+            remaining = max(deadline - time.monotonic(), 0)
+            # As confirmações de inscrição são filtradas aqui: com
+            # ignore_subscribe_messages um None não distinguiria "fila vazia"
+            message = self.pubsub.get_message(timeout=remaining)
+            if message is None:
+                if remaining <= 0:
+                    return None
+                continue
+            if message['type'] == 'message':
+                return json.loads(message['data'])
+
+    def close(self):
+        self.pubsub.close()
+
+
+class RedisBroker:
+    """Pub/sub entre workers via Redis; eventos serializados em JSON."""
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='mv:events:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def publish(self, channel, event):
+        self.client.publish(self.prefix + channel, json.dumps(event))
+
+    def subscribe(self, channel):
+        pubsub = self.client.pubsub()
+        pubsub.subscribe(self.prefix + channel)
+        return RedisSubscription(pubsub)
+
+    def subscribers(self):
+        return None
+
+
+def _make_broker(config):
+    if config.get('PUBSUB_BACKEND', 'memory') == 'redis':
+        try:
+            return RedisBroker(config['PUBSUB_REDIS_URL'])
+        except ImportError:
+            print("⚠️  Pacote redis não instalado; usando pub/sub em memória")
+    return MemoryBroker()
+
+
+def init_pubsub(app):
+    """Cria o broker de eventos da aplicação."""
+    app.extensions['pubsub'] = _make_broker(app.config)
+
+
+def get_broker():
+    return current_app.extensions['pubsub']
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def publish(channel, event):
+    """Publica um evento (dict serializável em JSON). Falhas só são registradas."""
+    try:
+        get_broker().publish(channel, event)
+    except Exception as e:
+        print(f"❌ Erro ao publicar evento em {channel}: {e}")
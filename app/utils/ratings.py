@@ -0,0 +1,86 @@
+# app/utils/ratings.py
+"""
+Resumo de avaliações por conteúdo (tb_rating_summaries).
+
+Guarda quantidade, soma e histograma de 1 a 5 estrelas, atualizados de forma
+incremental e atômica na mesma transação de rate_content/remove_rating. Assim
+a página do conteúdo lê a média e o histograma em uma consulta por chave
+primária, independente de quantas pessoas avaliaram.
+"""
+from sqlalchemy import case, func, select, update
+
+from ..models import db, Rating, RatingSummary
+from .counters import ensure_row
+
+
+def apply_rating_change(content_id, old=None, new=None):
+    """Aplica ao resumo a troca de uma nota (old -> new).
+
+    old=None significa avaliação nova; new=None significa avaliação removida.
+    Não faz commit.
+    """
+    if old == new:
+        return
+    ensure_row(RatingSummary, content_id)
+    values = {}
+    if old is None:
+        values[RatingSummary.count] = RatingSummary.count + 1
+    if new is None:
+        values[RatingSummary.count] = RatingSummary.count - 1
+    values[RatingSummary.total] = RatingSummary.total + (new or 0) - (old or 0)
+    if old is not None:
+        column = getattr(RatingSummary, f'star_{old}')
+        values[column] = column - 1
+    if new is not None:
+        column = getattr(RatingSummary, f'star_{new}')
+        values[column] = column + 1
+    db.session.execute(
+        update(RatingSummary)
+        .where(RatingSummary.content_id == content_id)
+        .values(values)
+    )
+
+
+def get_summary(content_id):
+    """Resumo do conteúdo; um resumo zerado (não persistido) se não houver avaliações."""
+    summary = db.session.get(RatingSummary, content_id)
+    if summary is None:
+        summary = RatingSummary(content_id=content_id, count=0, total=0,
+                                star_1=0, star_2=0, star_3=0, star_4=0, star_5=0)
+    return summary
+
+
+def recompute_summaries(content_ids=None):
+    """Recalcula os resumos em lote a partir de tb_ratings (um GROUP BY).
+
+    Com content_ids, limita-se a esses conteúdos (ex.: após apagar as
+    avaliações de um usuário). Não faz commit.
+
+    Returns:
+        Quantidade de resumos gravados
+    """
+    columns = [
+        Rating.content_id,
+        func.count(Rating.id),
+        func.coalesce(func.sum(Rating.rating), 0),
+    ] + [func.sum(case((Rating.rating == star, 1), else_=0)) for star in range(1, 6)]
+    query = select(*columns).group_by(Rating.content_id)
+    if content_ids is not None:
+        content_ids = list(content_ids)
+        if not content_ids:
+            return 0
+        query = query.where(Rating.content_id.in_(content_ids))
+        db.session.execute(RatingSummary.__table__.delete().where(
+            RatingSummary.content_id.in_(content_ids)))
+    else:
+        db.session.execute(RatingSummary.__table__.delete())
+
+    rows = [
+        {'rsm_content_id': row[0], 'rsm_count': row[1], 'rsm_sum': row[2],
+         'rsm_star_1': row[3], 'rsm_star_2': row[4], 'rsm_star_3': row[5],
+         'rsm_star_4': row[6], 'rsm_star_5': row[7]}
+        for row in db.session.execute(query)
+    ]
+    if rows:
+        db.session.execute(RatingSummary.__table__.insert(), rows)
+    return len(rows)
@@ -0,0 +1,351 @@
+# app/utils/search.py
+"""
+Busca textual de conteúdos com índice plugável.
+
+- SQLite: tabela virtual FTS5 (tb_contents_fts), ranking bm25().
+- PostgreSQL: tabela tb_contents_search com coluna tsvector e índice GIN,
+  ranking ts_rank_cd() com peso maior para o título.
+- Outros bancos: fallback com ILIKE (comportamento antigo).
+
+O texto indexado e os termos da busca passam pelo mesmo normalizador
+(minúsculas, sem acentos, stemmer leve de português), então "tradições"
+encontra "tradicao" e "Tradição". Os trechos destacados são gerados em Python
+a partir do texto original, de forma igual em todos os backends.
+"""
+import re
+import unicodedata
+from dataclasses import dataclass
+
+from flask import current_app
+from markupsafe import Markup, escape
+from sqlalchemy import text
+
+from ..models import db, Content, ContentCategory
+
+SEARCH_PER_PAGE = 20
+REINDEX_BATCH_SIZE = 1000
+SNIPPET_WORDS = 30
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Reduções de plural, da mais específica para a mais genérica
+_PLURAL_SUFFIXES = (
+    ('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'), ('eis', 'el'), ('ois', 'ol'),
+    ('res', 'r'), ('zes', 'z'), ('les', 'l'), ('ns', 'm'),
+)
+
+
+def strip_accents(value):
+    """Remove acentos/diacríticos: 'Tradição' -> 'Tradicao'."""
+    decomposed = unicodedata.normalize('NFKD', value)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def stem(word):
+    """Stemmer leve de português: sem acentos, sem plural e sem vogal temática."""
+    word = strip_accents(word.lower())
+    if len(word) < 4 or not word.isalpha():
+        return word
+    for suffix, replacement in _PLURAL_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 2:
+            word = word[:-len(suffix)] + replacement
+            break
+    else:
+        if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+            word = word[:-1]
+    if word.endswith('mente') and len(word) > 7:
+        word = word[:-5]
+    if len(word) > 4 and word[-1] in 'aeo':
+        word = word[:-1]
+    return word
+
+
+def analyze(value):
+    """Lista de termos normalizados de um texto."""
+    return [stem(token) for token in _WORD_RE.findall(value or '')]
+
+
+def highlight(value, terms, max_words=None):
+    """Escapa o texto e envolve em <mark> as palavras cujo termo está em terms.
+
+    Com max_words, retorna apenas uma janela de palavras em torno da primeira
+    ocorrência (trecho/snippet).
+    """
+    value = value or ''
+    tokens = list(_WORD_RE.finditer(value))
+    start, end = 0, len(value)
+    if max_words and len(tokens) > max_words:
+        first = next((i for i, t in enumerate(tokens) if stem(t.group()) in terms), 0)
+        lo = max(0, first - max_words // 3)
+        hi = min(len(tokens), lo + max_words)
+        start = tokens[lo].start() if lo else 0
+        end = tokens[hi - 1].end() if hi < len(tokens) else len(value)
+        tokens = tokens[lo:hi]
+
+    parts, cursor = [], start
+    for token in tokens:
+        if stem(token.group()) in terms:
+            parts.append(escape(value[cursor:token.start()]))
+            parts.append(Markup('<mark>%s</mark>') % token.group())
+            cursor = token.end()
+    parts.append(escape(value[cursor:end]))
+    snippet = Markup('').join(parts)
+    if start > 0:
+        snippet = Markup('…') + snippet
+    if end < len(value):
+        snippet = snippet + Markup('…')
+    return snippet
+
+
+@dataclass
+class SearchHit:
+    content: Content
+    rank: float
+    title_html: Markup
+    snippet_html: Markup
+
+
+class SearchBackend:
+    """Interface comum dos backends de busca."""
+
+    name = 'base'
+
+    def ensure_schema(self):
+        pass
+
+    def is_empty(self):
+        return False
+
+    def index(self, contents, replace=True):
+        pass
+
+    def remove(self, content_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def terms(self, termo):
+        """Termos da busca no mesmo formato em que foram indexados."""
+        return analyze(termo)
+
+    def query_ids(self, terms, category_id=None, limit=SEARCH_PER_PAGE, offset=0):
+        """Retorna [(content_id, rank)] ordenado por relevância."""
+        raise NotImplementedError
+
+    def _document(self, content):
+        return ' '.join(analyze(content.title)), ' '.join(analyze(content.description))
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Índice FTS5 em uma tabela virtual cujo rowid é o cnt_id."""
+
+    name = 'sqlite-fts5'
+
+    def ensure_schema(self):
+        db.session.execute(text(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS tb_contents_fts USING fts5('
+            "title, description, tokenize='unicode61 remove_diacritics 2')"
+        ))
+        db.session.commit()
+
+    def is_empty(self):
+        return db.session.execute(text('SELECT rowid FROM tb_contents_fts LIMIT 1')).first() is None
+
+    def index(self, contents, replace=True):
+        rows = []
+        for content in contents:
+            title, description = self._document(content)
+            rows.append({'id': content.id, 'title': title, 'description': description})
+        if not rows:
+            return
+        if replace:
+            self.remove([row['id'] for row in rows])
+        db.session.execute(text(
+            'INSERT INTO tb_contents_fts(rowid, title, description) VALUES (:id, :title, :description)'
+        ), rows)
+
+    def remove(self, content_ids):
+        if content_ids:
+            db.session.execute(text('DELETE FROM tb_contents_fts WHERE rowid = :id'),
+                               [{'id': pk} for pk in content_ids])
+
+    def clear(self):
+        db.session.execute(text('DELETE FROM tb_contents_fts'))
+
+    def query_ids(self, terms, category_id=None, limit=SEARCH_PER_PAGE, offset=0):
+        # Cada termo entre aspas (evita sintaxe FTS injetada) e com prefixo
+        match = ' '.join('"%s"*' % term.replace('"', '') for term in terms)
+        sql = ('SELECT tb_contents_fts.rowid, bm25(tb_contents_fts, 10.0, 1.0) AS rank '
+               'FROM tb_contents_fts ')
+        params = {'match': match, 'limit': limit, 'offset': offset}
+        if category_id:
+            sql += ('JOIN tb_content_categories cc ON cc.cct_content_id = tb_contents_fts.rowid '
+                    'AND cc.cct_category_id = :category_id ')
+            params['category_id'] = category_id
+        # bm25() é menor quanto mais relevante
+        sql += 'WHERE tb_contents_fts MATCH :match ORDER BY rank LIMIT :limit OFFSET :offset'
+        return [(row[0], -row[1]) for row in db.session.execute(text(sql), params)]
+
+
+class PostgresBackend(SearchBackend):
+    """Índice tsvector com GIN em tabela auxiliar (cnt_id -> documento)."""
+
+    name = 'postgresql'
+
+    def ensure_schema(self):
+        db.session.execute(text(
+            'CREATE TABLE IF NOT EXISTS tb_contents_search ('
+            'cnt_id INTEGER PRIMARY KEY REFERENCES tb_contents(cnt_id) ON DELETE CASCADE, '
+            'document TSVECTOR NOT NULL)'
+        ))
+        db.session.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_contents_search_document '
+            'ON tb_contents_search USING GIN (document)'
+        ))
+        db.session.commit()
+
+    def is_empty(self):
+        return db.session.execute(text('SELECT cnt_id FROM tb_contents_search LIMIT 1')).first() is None
+
+    def index(self, contents, replace=True):
+        rows = []
+        for content in contents:
+            title, description = self._document(content)
+            rows.append({'id': content.id, 'title': title, 'description': description})
+        if not rows:
+            return
+        # Os termos já chegam normalizados; 'simple' evita um segundo stemming
+        db.session.execute(text(
+            'INSERT INTO tb_contents_search (cnt_id, document) VALUES ('
+            ":id, setweight(to_tsvector('simple', :title), 'A') || "
+            "setweight(to_tsvector('simple', :description), 'B')) "
+            'ON CONFLICT (cnt_id) DO UPDATE SET document = EXCLUDED.document'
+        ), rows)
+
+    def remove(self, content_ids):
+        if content_ids:
+            db.session.execute(text('DELETE FROM tb_contents_search WHERE cnt_id = ANY(:ids)'),
+                               {'ids': list(content_ids)})
+
+    def clear(self):
+        db.session.execute(text('TRUNCATE tb_contents_search'))
+
+    def query_ids(self, terms, category_id=None, limit=SEARCH_PER_PAGE, offset=0):
+        tsquery = ' & '.join("%s:*" % re.sub(r'\W', '', term) for term in terms if re.sub(r'\W', '', term))
+        if not tsquery:
+            return []
+        sql = ("SELECT s.cnt_id, ts_rank_cd(s.document, to_tsquery('simple', :q)) AS rank "
+               'FROM tb_contents_search s ')
+        params = {'q': tsquery, 'limit': limit, 'offset': offset}
+        if category_id:
+            sql += ('JOIN tb_content_categories cc ON cc.cct_content_id = s.cnt_id '
+                    'AND cc.cct_category_id = :category_id ')
+            params['category_id'] = category_id
+        sql += ("WHERE s.document @@ to_tsquery('simple', :q) "
+                'ORDER BY rank DESC, s.cnt_id DESC LIMIT :limit OFFSET :offset')
+        return [(row[0], row[1]) for row in db.session.execute(text(sql), params)]
+
+
+class LikeBackend(SearchBackend):
+    """Fallback sem índice: ILIKE em título e descrição."""
+
+    name = 'like'
+
+    def terms(self, termo):
+        return _WORD_RE.findall(termo or '')
+
+    def query_ids(self, terms, category_id=None, limit=SEARCH_PER_PAGE, offset=0):
+        query = db.session.query(Content.id)
+        for term in terms:
+            query = query.filter(db.or_(Content.title.ilike(f'%{term}%'),
+                                        Content.description.ilike(f'%{term}%')))
+        if category_id:
+            query = query.join(ContentCategory, Content.id == ContentCategory.content_id)
+            query = query.filter(ContentCategory.category_id == category_id)
+        rows = query.order_by(Content.created_at.desc()).limit(limit).offset(offset)
+        return [(row[0], 0.0) for row in rows]
+
+
+def get_search_backend():
+    """Backend configurado (SEARCH_BACKEND) ou escolhido pelo dialeto do banco."""
+    name = current_app.config.get('SEARCH_BACKEND') or db.engine.dialect.name
+    if name in ('sqlite', 'sqlite-fts5'):
+        return SQLiteFTSBackend()
+    if name in ('postgresql', 'postgres'):
+        return PostgresBackend()
+    return LikeBackend()
+
+
+def index_content(content):
+    """Atualiza o índice para um conteúdo (na transação corrente)."""
+    get_search_backend().index([content])
+
+
+def remove_content(content_id):
+    """Remove um conteúdo do índice (na transação corrente)."""
+    get_search_backend().remove([content_id])
+
+
+def search_contents(termo, category_id=None, limit=SEARCH_PER_PAGE, offset=0):
+    """Executa a busca e retorna uma lista de SearchHit em ordem de relevância."""
+    backend = get_search_backend()
+    terms = backend.terms(termo)
+    if not terms:
+        return []
+
+    ranked = backend.query_ids(terms, category_id=category_id, limit=limit, offset=offset)
+    if not ranked:
+        return []
+
+    contents = {c.id: c for c in Content.query.filter(Content.id.in_([pk for pk, _ in ranked]))}
+    stems = set(analyze(termo))
+    return [
+        SearchHit(
+            content=contents[pk],
+            rank=rank,
+            title_html=highlight(contents[pk].title, stems),
+            snippet_html=highlight(contents[pk].description, stems, max_words=SNIPPET_WORDS),
+        )
+        for pk, rank in ranked if pk in contents
+    ]
+
+
+def browse_category(category_id, limit=SEARCH_PER_PAGE, offset=0):
+    """Conteúdos de uma categoria (busca sem termo), mais recentes primeiro."""
+    contents = (Content.query
+                .join(ContentCategory, Content.id == ContentCategory.content_id)
+                .filter(ContentCategory.category_id == category_id)
+                .order_by(Content.created_at.desc(), Content.id.desc())
+                .limit(limit)
+                .offset(offset))
+    return [
+        SearchHit(content=c, rank=0.0, title_html=escape(c.title),
+                  snippet_html=highlight(c.description, set(), max_words=SNIPPET_WORDS))
+        for c in contents
+    ]
+
+
+def rebuild_index(batch_size=REINDEX_BATCH_SIZE):
+    """Reconstrói o índice inteiro em lotes (INSERT em lote por página de ids).
+
+    Returns:
+        Quantidade de conteúdos indexados
+    """
+    backend = get_search_backend()
+    backend.ensure_schema()
+    backend.clear()
+    total, last_id = 0, 0
+    while True:
+        batch = (db.session.query(Content.id, Content.title, Content.description)
+                 .filter(Content.id > last_id)
+                 .order_by(Content.id.asc())
+                 .limit(batch_size)
+                 .all())
+        if not batch:
+            break
+        backend.index(batch, replace=False)
+        db.session.commit()
+        total += len(batch)
+        last_id = batch[-1].id
+    return total
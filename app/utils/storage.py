@@ -0,0 +1,268 @@
+# app/utils/storage.py
+"""
+Armazenamento dos arquivos enviados endereçado pelo conteúdo.
+
+Cada upload é lido em blocos e gravado em um arquivo temporário enquanto o
+SHA-256 é calculado; o arquivo final fica em
+static/uploads/blobs/<2 primeiros dígitos>/<sha256>.<ext>. Um mesmo arquivo
+enviado várias vezes é guardado uma única vez: tb_stored_files conta quantas
+referências (Content.file_path / Content.thumbnail) apontam para ele, e o
+arquivo só sai do disco quando a contagem chega a zero.
+
+Fluxo nas views: save_upload() e release() entram na transação da escrita;
+depois do commit, discard() apaga do disco o que ficou sem referência.
+
+Como o nome é o próprio hash, ele também serve de ETag forte (blob_hash()).
+Versões redimensionadas de imagens (app.utils.images) ficam em
+uploads/derived com o hash da original no nome e saem junto com ela.
+"""
+import hashlib
+import os
+import re
+import glob
+import tempfile
+
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+
+from ..models import db, Content, StoredFile
+
+CHUNK_SIZE = 64 * 1024
+BLOB_DIR = 'uploads/blobs'
+DERIVED_DIR = 'uploads/derived'
+BLOB_PATH = re.compile(r'^uploads/blobs/[0-9a-f]{2}/([0-9a-f]{64})(\.[a-z0-9]+)?$')
+
+
+def _full_path(path):
+    return os.path.join(current_app.static_folder, path)
+
+
+def blob_hash(path):
+    """SHA-256 de um caminho do armazenamento (None para outros caminhos)."""
+    match = BLOB_PATH.match(path or '')
+    return match.group(1) if match else None
+
+
+def derived_path(sha256, width, ext):
+    """Caminho de uma versão redimensionada do blob sha256."""
+    return f'{DERIVED_DIR}/{sha256[:2]}/{sha256}-{width}.{ext}'
+
+
+def _remove_derivatives(sha256):
+    for path in glob.glob(_full_path(f'{DERIVED_DIR}/{sha256[:2]}/{sha256}-*')):
+        os.remove(path)
+
+
+def _stream_to_temp(stream):
+    """Copia o stream em blocos para um temporário no diretório dos blobs.
+
+    Returns:
+        (caminho do temporário, sha256, tamanho)
+    """
+    blob_root = _full_path(BLOB_DIR)
+    os.makedirs(blob_root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=blob_root, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), size
+
+
+def _add_reference(sha256, path, size, count=1):
+    """Cria a linha do blob ou soma count referências. Retorna o caminho gravado."""
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(StoredFile).values(sha256=sha256, path=path, size=size, ref_count=count)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[StoredFile.sha256],
+            set_={'stf_ref_count': StoredFile.ref_count + count},
+        ))
+    else:
+        stored = db.session.get(StoredFile, sha256)
+        if stored is None:
+            db.session.add(StoredFile(sha256=sha256, path=path, size=size, ref_count=count))
+        else:
+            stored.ref_count += count
+        db.session.flush()
+    return db.session.execute(select(StoredFile.path).where(StoredFile.sha256 == sha256)).scalar()
+
+
+def _place(temp_path, path):
+    """Move o temporário para o caminho final.
+
+    Mesmo que o blob já exista o arquivo é substituído: o conteúdo é idêntico
+    e a troca é atômica, e o existente pode estar sendo apagado por discard().
+    """
+    target = _full_path(path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(temp_path, target)
+
+
+def save_upload(file_storage, ext):
+    """Guarda um arquivo enviado e registra uma referência a ele.
+
+    Não faz commit. Se o mesmo conteúdo já existe, nada é gravado de novo.
+
+    Args:
+        file_storage: werkzeug FileStorage do request.files
+        ext: Extensão já validada (sem ponto)
+
+    Returns:
+        Caminho relativo a static/ para gravar no Content
+    """
+    temp_path, sha256, size = _stream_to_temp(file_storage.stream)
+    try:
+        suffix = f'.{ext.lower()}' if ext else ''
+        path = _add_reference(sha256, f'{BLOB_DIR}/{sha256[:2]}/{sha256}{suffix}', size)
+        _place(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return path
+
+
+def release(*paths):
+    """Remove uma referência de cada caminho. Não faz commit.
+
+    Returns:
+        Os caminhos de uploads que devem ser passados a discard() após o commit
+    """
+    released = []
+    for path in paths:
+        if not path or not path.startswith('uploads/'):
+            continue
+        sha256 = blob_hash(path)
+        if sha256:
+            db.session.execute(
+                update(StoredFile).where(StoredFile.sha256 == sha256)
+                .values(ref_count=StoredFile.ref_count - 1)
+                .execution_options(synchronize_session=False)
+            )
+        released.append(path)
+    return released
+
+
+def discard(paths):
+    """Apaga do disco os arquivos liberados que ficaram sem referência. Faz commit.
+
+    Arquivos anteriores ao armazenamento por hash (uploads/obras, thumbnails)
+    pertencem a um único conteúdo e são apagados diretamente.
+    """
+    for path in paths:
+        sha256 = blob_hash(path)
+        if sha256:
+            removed = db.session.execute(
+                delete(StoredFile).where(StoredFile.sha256 == sha256, StoredFile.ref_count <= 0)
+            ).rowcount
+            db.session.commit()
+            if not removed:
+                continue
+            # Reenviado por outra requisição depois do DELETE: o blob voltou a ser usado
+            if db.session.execute(select(StoredFile.sha256).where(StoredFile.sha256 == sha256)).first():
+                continue
+        try:
+            os.remove(_full_path(path))
+            if sha256:
+                _remove_derivatives(sha256)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Erro ao remover arquivo {path}: {e}")
+
+
+def adopt_legacy_uploads():
+    """Move os uploads antigos (nome com uuid) para o armazenamento por hash.
+
+    Arquivos idênticos viram um único blob; os conteúdos passam a apontar
+    para ele e as contagens de referência são somadas. Faz commit.
+
+    Returns:
+        (arquivos adotados, bytes liberados por duplicatas)
+    """
+    columns = (Content.file_path, Content.thumbnail)
+    legacy = set()
+    for column in columns:
+        legacy.update(path for (path,) in db.session.query(column).filter(
+            column.like('uploads/%'), ~column.like(f'{BLOB_DIR}/%')).distinct())
+
+    adopted = freed = 0
+    for old_path in sorted(legacy):
+        source = _full_path(old_path)
+        if not os.path.isfile(source):
+            continue
+        with open(source, 'rb') as f:
+            temp_path, sha256, size = _stream_to_temp(f)
+        refs = sum(db.session.query(func.count()).filter(column == old_path).scalar() for column in columns)
+        suffix = os.path.splitext(old_path)[1].lower()
+        path = _add_reference(sha256, f'{BLOB_DIR}/{sha256[:2]}/{sha256}{suffix}', size, count=refs)
+        if os.path.exists(_full_path(path)):
+            freed += size
+        _place(temp_path, path)
+        for column in columns:
+            db.session.execute(
+                update(Content).where(column == old_path).values({column: path})
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+        os.remove(source)
+        adopted += 1
+    return adopted, freed
+
+
+def reconcile_references():
+    """Recalcula ref_count a partir dos conteúdos e apaga blobs sem referência.
+
+    Também remove do disco blobs sem linha em tb_stored_files. Faz commit.
+
+    Returns:
+        Número de blobs removidos
+    """
+    referenced = {}
+    for column in (Content.file_path, Content.thumbnail):
+        for path, total in (db.session.query(column, func.count())
+                            .filter(column.like(f'{BLOB_DIR}/%')).group_by(column)):
+            referenced[path] = referenced.get(path, 0) + total
+
+    unused = []
+    known = set()
+    for stored in StoredFile.query.all():
+        stored.ref_count = referenced.get(stored.path, 0)
+        known.add(stored.path)
+        if not stored.ref_count:
+            unused.append(stored.path)
+    db.session.commit()
+
+    discard(unused)
+
+    # Arquivos gravados por transações que não chegaram ao commit e
+    # derivados de blobs que já não existem
+    known_hashes = {blob_hash(path) for path in known}
+    stray = 0
+    for directory in (BLOB_DIR, DERIVED_DIR):
+        for root, _, files in os.walk(_full_path(directory)):
+            for name in files:
+                path = os.path.relpath(os.path.join(root, name), current_app.static_folder).replace(os.sep, '/')
+                if name.startswith('.'):
+                    continue
+                if path in known or (directory == DERIVED_DIR and name.split('-')[0] in known_hashes):
+                    continue
+                os.remove(os.path.join(root, name))
+                stray += 1
+    return len(unused) + stray
+
@@ -0,0 +1,80 @@
+# app/utils/user_stats.py
+"""
+Contadores por usuário (tb_user_stats): comentários, curtidas, avaliações,
+seguidores, seguindo e mensagens não lidas.
+
+Substituem os COUNT() feitos pelo template do perfil através dos
+relacionamentos lazy='dynamic' de Usuario. São incrementados na mesma
+transação das escritas e podem ser recalculados em lote.
+"""
+from sqlalchemy import func, insert, select, update
+
+from ..models import db, Usuario, UserStats, Comment, Like, Rating, Follower, PrivateMessage
+from .counters import bump, ensure_row
+
+# atributo de UserStats -> (modelo de origem, coluna do usuário[, filtro])
+SOURCES = {
+    'comments_count': (Comment, Comment.user_id),
+    'likes_count': (Like, Like.user_id),
+    'ratings_count': (Rating, Rating.user_id),
+    'followers_count': (Follower, Follower.followed_id),
+    'following_count': (Follower, Follower.follower_id),
+    'unread_messages_count': (PrivateMessage, PrivateMessage.receiver_id,
+                              PrivateMessage.is_read.is_(False) & (PrivateMessage.sender_id != PrivateMessage.receiver_id)),
+}
+
+
+def bump_user_stats(user_id, **deltas):
+    """Ajusta os contadores de um usuário (sem commit). Ex.: ratings_count=1"""
+    ensure_row(UserStats, user_id)
+    bump(UserStats, user_id, **deltas)
+
+
+def discount_content(content_id):
+    """Desconta dos autores os comentários, curtidas e avaliações de um conteúdo apagado.
+
+    Chamar antes de apagar o conteúdo (as linhas saem pelo cascade do ORM).
+    Um UPDATE por contador, com a contagem por usuário em subconsulta
+    correlacionada. Não faz commit.
+    """
+    for name in ('comments_count', 'likes_count', 'ratings_count'):
+        model, user_col = SOURCES[name][:2]
+        owned = (select(func.count())
+                 .where(model.content_id == content_id, user_col == UserStats.user_id)
+                 .scalar_subquery())
+        counter = getattr(UserStats, name)
+        db.session.execute(
+            update(UserStats)
+            .where(UserStats.user_id.in_(select(user_col).where(model.content_id == content_id)))
+            .values({counter: counter - owned})
+            .execution_options(synchronize_session=False)
+        )
+
+
+def recompute_user_stats():
+    """Recalcula os contadores de todos os usuários com um INSERT ... SELECT.
+
+    Cada fonte é agregada uma única vez (GROUP BY usuário) e unida aos
+    usuários por LEFT JOIN. Não faz commit.
+
+    Returns:
+        Quantidade de usuários com estatísticas gravadas
+    """
+    columns = [Usuario.id]
+    query_joins = []
+    for name, (model, user_col, *criteria) in SOURCES.items():
+        totals = (select(user_col.label('user_id'), func.count().label('total'))
+                  .where(*criteria)
+                  .group_by(user_col)
+                  .subquery(name))
+        query_joins.append(totals)
+        columns.append(func.coalesce(totals.c.total, 0))
+
+    query = select(*columns)
+    for totals in query_joins:
+        query = query.outerjoin(totals, totals.c.user_id == Usuario.id)
+
+    db.session.execute(UserStats.__table__.delete())
+    target = [getattr(UserStats, name).expression for name in ('user_id', *SOURCES)]
+    db.session.execute(insert(UserStats.__table__).from_select(target, query))
+    return db.session.query(func.count(UserStats.user_id)).scalar()
@@ -0,0 +1,135 @@
+# app/utils/view_counter.py
+"""
+Contagem de visualizações de conteúdos.
+
+Cada visualização só incrementa um contador em memória, por processo; uma
+thread grava os acumulados a cada VIEW_FLUSH_INTERVAL segundos com dois
+comandos por lote:
+
+- UPDATE tb_contents SET cnt_views_count = cnt_views_count + CASE cnt_id
+  WHEN 1 THEN 3 WHEN 7 THEN 1 ... END WHERE cnt_id IN (1, 7, ...);
+- INSERT ... SELECT ... ON CONFLICT em tb_content_views_daily, que soma as
+  visualizações do dia (UTC) de cada conteúdo.
+
+Assim o lock de escrita do SQLite é pego uma vez por intervalo, e não uma
+vez por página vista (ver app.utils.batching: perdem-se no máximo as
+visualizações do último intervalo se o processo morrer).
+
+Com VIEW_DEDUP_SESSION, a mesma sessão conta cada conteúdo uma vez por dia.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app, session
+from sqlalchemy import case, literal, select, update
+
+from ..models import db, Content, ContentViewDaily
+from .batching import BatchBuffer
+
+DEFAULT_FLUSH_INTERVAL = 10
+# Conteúdos lembrados por sessão para o filtro de repetição (limita o cookie)
+SESSION_MAX_IDS = 100
+
+
+class ViewCounter(BatchBuffer):
+    """Acumula visualizações por (conteúdo, dia) e grava em lote."""
+
+    name = 'view-counter'
+
+    def merge(self, current, value):
+        return current + value
+
+    def write(self, batch):
+        _write(batch)
+
+    def record(self, content_id):
+        self.add((content_id, datetime.utcnow().date()), 1)
+
+    def pending(self, content_id=None):
+        """Visualizações ainda não gravadas (de um conteúdo ou no total)."""
+        return sum(n for (cid, _), n in self.snapshot().items() if content_id in (None, cid))
+
+
+def _write(batch):
+    """UPDATE ... CASE nos totais e upsert nas visualizações diárias. Faz commit."""
+    totals = Counter()
+    by_day = {}
+    for (content_id, day), views in batch.items():
+        totals[content_id] += views
+        by_day.setdefault(day, {})[content_id] = views
+
+    db.session.execute(
+        update(Content)
+        .where(Content.id.in_(totals))
+        .values(views_count=Content.views_count + case(dict(totals), value=Content.id, else_=0))
+        .execution_options(synchronize_session=False)
+    )
+    for day, views in by_day.items():
+        _upsert_day(day, views)
+    db.session.commit()
+
+
+def _upsert_day(day, views):
+    """Soma as visualizações de um dia; conteúdos já excluídos são ignorados."""
+    dialect = db.engine.dialect.name
+    increment = case(views, value=Content.id, else_=0)
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(ContentViewDaily).from_select(
+            [ContentViewDaily.content_id, ContentViewDaily.day, ContentViewDaily.views],
+            select(Content.id, literal(day, ContentViewDaily.day.type), increment).where(Content.id.in_(views)),
+        )
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[ContentViewDaily.content_id, ContentViewDaily.day],
+            set_={'cvd_views': ContentViewDaily.views + stmt.excluded.cvd_views},
+        ))
+        return
+    existing = set(db.session.scalars(select(Content.id).where(Content.id.in_(views))))
+    for content_id, count in views.items():
+        if content_id not in existing:
+            continue
+        row = db.session.get(ContentViewDaily, (content_id, day))
+        if row is None:
+            db.session.add(ContentViewDaily(content_id=content_id, day=day, views=count))
+        else:
+            row.views += count
+    db.session.flush()
+
+
+def _seen_in_session(content_id):
+    """Filtro de repetição: True se esta sessão já viu o conteúdo hoje."""
+    today = datetime.utcnow().date().isoformat()
+    seen = session.get('views_seen')
+    if not seen or seen.get('day') != today:
+        seen = {'day': today, 'ids': []}
+    if content_id in seen['ids']:
+        return True
+    seen['ids'] = (seen['ids'] + [content_id])[-SESSION_MAX_IDS:]
+    session['views_seen'] = seen
+    return False
+
+
+def count_view(content_id):
+    """Registra uma visualização do conteúdo (chamar na view da página)."""
+    if current_app.config.get('VIEW_DEDUP_SESSION', True) and _seen_in_session(content_id):
+        return
+    current_app.extensions['view_counter'].record(content_id)
+
+
+def views_by_day(content_id, days=30):
+    """Lista de (dia, visualizações) dos últimos dias, sem as ainda não gravadas."""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    return (db.session.query(ContentViewDaily.day, ContentViewDaily.views)
+            .filter(ContentViewDaily.content_id == content_id, ContentViewDaily.day >= since)
+            .order_by(ContentViewDaily.day)
+            .all())
+
+
+def init_view_counter(app):
+    """Cria o contador de visualizações da aplicação."""
+    counter = ViewCounter(app, app.config.get('VIEW_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+    app.extensions['view_counter'] = counter
+    return counter
@@ -0,0 +1,133 @@
+# app/utils/watch_progress.py
+"""
+Progresso de leitura/reprodução (WatchHistory).
+
+Os players mandam o progresso a cada poucos segundos, às vezes em lotes.
+Cada atualização só substitui, em memória, o último progresso conhecido de
+(usuário, conteúdo); a cada WATCH_FLUSH_INTERVAL segundos o buffer é
+gravado com um único INSERT ... ON CONFLICT (wht_user_id, wht_content_id)
+DO UPDATE por lote, que ignora valores mais antigos que o já gravado
+(vários workers podem gravar a mesma chave).
+
+continue_watching() lista os itens em andamento usando o índice
+(wht_user_id, wht_last_watched).
+"""
+from datetime import datetime
+
+from sqlalchemy import select
+
+from ..models import db, Content, Usuario, WatchHistory
+from .batching import BatchBuffer
+
+DEFAULT_FLUSH_INTERVAL = 15
+# Acima disto o conteúdo é considerado concluído e sai de "continuar"
+FINISHED_PROGRESS = 0.98
+# Linhas por INSERT (limite de parâmetros do SQLite)
+WRITE_CHUNK = 200
+
+
+class ProgressBuffer(BatchBuffer):
+    """Guarda o progresso mais recente de cada (usuário, conteúdo)."""
+
+    name = 'watch-progress'
+
+    def merge(self, current, value):
+        # value/current: (progresso, momento); vence o mais recente
+        return value if value[1] >= current[1] else current
+
+    def write(self, batch):
+        _write(batch)
+
+    def record(self, user_id, content_id, progress, at=None):
+        self.add((user_id, content_id), (progress, at or datetime.utcnow()))
+
+
+def _write(batch):
+    """Upsert das posições. Conteúdos/usuários excluídos nesse meio tempo são ignorados. Faz commit."""
+    content_ids = {content_id for _, content_id in batch}
+    user_ids = {user_id for user_id, _ in batch}
+    valid_contents = set(db.session.scalars(select(Content.id).where(Content.id.in_(content_ids))))
+    valid_users = set(db.session.scalars(select(Usuario.id).where(Usuario.id.in_(user_ids),
+                                                                 Usuario.excluido_em.is_(None))))
+    rows = [{'user_id': user_id, 'content_id': content_id, 'progress': progress, 'last_watched': at}
+            for (user_id, content_id), (progress, at) in batch.items()
+            if user_id in valid_users and content_id in valid_contents]
+
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        for start in range(0, len(rows), WRITE_CHUNK):
+            stmt = insert(WatchHistory).values(rows[start:start + WRITE_CHUNK])
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=[WatchHistory.user_id, WatchHistory.content_id],
+                set_={'wht_progress': stmt.excluded.wht_progress,
+                      'wht_last_watched': stmt.excluded.wht_last_watched},
+                where=stmt.excluded.wht_last_watched >= WatchHistory.last_watched,
+            ))
+    else:
+        for row in rows:
+            existing = WatchHistory.query.filter_by(user_id=row['user_id'], content_id=row['content_id']).first()
+            if existing is None:
+                db.session.add(WatchHistory(**row))
+            elif row['last_watched'] >= existing.last_watched:
+                existing.progress = row['progress']
+                existing.last_watched = row['last_watched']
+    db.session.commit()
+
+
+def record_progress(buffer, user_id, items):
+    """Valida e enfileira um lote de atualizações de um usuário.
+
+    Args:
+        buffer: ProgressBuffer da aplicação
+        user_id: Usuário logado
+        items: Lista de {'content_id': int, 'progress': float entre 0 e 1};
+               repetições do mesmo conteúdo valem pela última da lista
+
+    Returns:
+        Quantidade de itens aceitos
+    """
+    now = datetime.utcnow()
+    accepted = 0
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            content_id = int(item['content_id'])
+            progress = float(item['progress'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if progress != progress:  # NaN
+            continue
+        buffer.record(user_id, content_id, min(max(progress, 0.0), 1.0), now)
+        accepted += 1
+    return accepted
+
+
+def continue_watching(user_id, limit=10):
+    """Conteúdos começados e não concluídos, do mais recente para o mais antigo.
+
+    Returns:
+        Lista de (Content, progresso, último acesso)
+    """
+    recent = (select(WatchHistory.content_id.label('content_id'),
+                     WatchHistory.progress.label('progress'),
+                     WatchHistory.last_watched.label('last_watched'))
+              .where(WatchHistory.user_id == user_id, WatchHistory.progress < FINISHED_PROGRESS)
+              .order_by(WatchHistory.last_watched.desc())
+              .limit(limit)
+              .subquery())
+    return (db.session.query(Content, recent.c.progress, recent.c.last_watched)
+            .join(recent, recent.c.content_id == Content.id)
+            .order_by(recent.c.last_watched.desc())
+            .all())
+
+
+def init_watch_progress(app):
+    """Cria o buffer de progresso da aplicação."""
+    buffer = ProgressBuffer(app, app.config.get('WATCH_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+    app.extensions['watch_progress'] = buffer
+    return buffer
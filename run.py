@@ -5,8 +5,11 @@ import sys
 app = create_app()
 
 def init_db():
+    from app.migrate_on_startup import provision_database
+    from app.init_default_data import create_default_account_and_community
     with app.app_context():
-        db.create_all()
+        provision_database(db)
+        create_default_account_and_community()
         print("Banco de dados criado/atualizado com sucesso!")
 
 if __name__ == '__main__':
@@ -0,0 +1,65 @@
+# tests/conftest.py
+"""
+Fixtures dos testes: aplicação com um banco SQLite temporário por teste.
+
+A configuração (BaseConfig) lê as variáveis de ambiente na importação,
+então o banco é definido antes de importar o pacote app; cada teste apaga
+o arquivo e create_app() provisiona um banco novo (AUTO_PROVISION).
+"""
+import os
+import tempfile
+
+import pytest
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='memoriaviva-tests-'), 'test.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['AUTO_PROVISION'] = '1'
+os.environ['CACHE_BACKEND'] = 'null'
+os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+os.environ['ACCOUNT_DELETION_ASYNC'] = '0'
+
+from app import create_app  # noqa: E402
+from app.models import db, Community, CommunityPost, Usuario  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_user(app):
+    def make(nome):
+        usuario = Usuario(nome=nome, email=f'{nome.lower()}@example.com')
+        usuario.senha = 'senha-de-teste'
+        db.session.add(usuario)
+        db.session.flush()
+        return usuario
+    return make
+
+
+@pytest.fixture
+def make_community(app):
+    def make(owner, name='Comunidade de teste'):
+        community = Community(owner_id=owner.id, name=name)
+        db.session.add(community)
+        db.session.flush()
+        return community
+    return make
+
+
+@pytest.fixture
+def make_post(app):
+    def make(author, community, content='Post de teste'):
+        post = CommunityPost(author_id=author.id, community_id=community.id, content=content)
+        db.session.add(post)
+        db.session.flush()
+        return post
+    return make
@@ -0,0 +1,123 @@
+"""Linha do tempo inicial (app.utils.home_timeline): fan-out, leitura e seguir/deixar de seguir."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.models import db, HomeTimelineEntry
+from app.utils.home_timeline import fan_out_post, follow, home_feed_page, trim_timelines, unfollow
+from app.utils.pagination import decode_cursor
+
+START = datetime(2024, 1, 1, 12, 0)
+
+
+def _publish(make_post, author, community, minutes):
+    post = make_post(author, community, f'{author.nome} {minutes}')
+    post.created_at = START + timedelta(minutes=minutes)
+    fan_out_post(post)
+    return post
+
+
+def _stored(user):
+    return set(db.session.scalars(select(HomeTimelineEntry.post_id).where(HomeTimelineEntry.user_id == user.id)))
+
+
+def _feed(user, per_page=20):
+    return [item.id for item in home_feed_page(user.id, per_page=per_page).items]
+
+
+def test_fan_out_copies_post_to_followers(app, make_user, make_community, make_post):
+    author, reader, stranger = make_user('Autora'), make_user('Leitor'), make_user('Estranho')
+    community = make_community(author)
+    follow(reader.id, author.id)
+
+    post = _publish(make_post, author, community, 1)
+    db.session.commit()
+
+    assert post.fanned_out is True
+    assert _stored(reader) == {post.id}
+    assert _stored(author) == {post.id}
+    assert _stored(stranger) == set()
+    assert _feed(reader) == [post.id]
+
+
+def test_big_author_posts_are_merged_on_read(app, make_user, make_community, make_post):
+    app.config['HOME_FANOUT_THRESHOLD'] = 2
+    big, small = make_user('Grande'), make_user('Pequena')
+    reader, other = make_user('Leitor'), make_user('Outro')
+    community = make_community(big)
+    for user in (reader, other):
+        follow(user.id, big.id)
+    follow(reader.id, small.id)
+
+    pulled = [_publish(make_post, big, community, minutes) for minutes in (1, 3)]
+    stored = [_publish(make_post, small, community, minutes) for minutes in (2, 4)]
+    db.session.commit()
+
+    assert [post.fanned_out for post in pulled] == [False, False]
+    # Só o próprio autor guarda os posts sem fan-out
+    assert _stored(reader) == {post.id for post in stored}
+    assert _stored(big) == {post.id for post in pulled}
+    # A leitura intercala os dois, do mais recente para o mais antigo
+    assert _feed(reader) == [stored[1].id, pulled[1].id, stored[0].id, pulled[0].id]
+
+    # Paginação com o mesmo cursor nos dois lados
+    first = home_feed_page(reader.id, per_page=3)
+    assert [item.id for item in first.items] == [stored[1].id, pulled[1].id, stored[0].id]
+    rest = home_feed_page(reader.id, cursor=decode_cursor(first.next_cursor), per_page=3)
+    assert [item.id for item in rest.items] == [pulled[0].id]
+    assert not rest.has_next
+
+    # Abaixo do limite, os posts antigos continuam na leitura e os novos têm fan-out
+    unfollow(other.id, big.id)
+    fresh = _publish(make_post, big, community, 5)
+    db.session.commit()
+    assert fresh.fanned_out is True
+    assert _feed(reader) == [fresh.id, stored[1].id, pulled[1].id, stored[0].id, pulled[0].id]
+
+
+def test_follow_backfills_and_unfollow_removes(app, make_user, make_community, make_post):
+    author, reader = make_user('Autora'), make_user('Leitor')
+    community = make_community(author)
+    own = _publish(make_post, reader, community, 1)
+    older = [_publish(make_post, author, community, minutes) for minutes in (2, 3)]
+    db.session.commit()
+    assert _feed(reader) == [own.id]
+
+    assert follow(reader.id, author.id) is True
+    assert follow(reader.id, author.id) is False
+    db.session.commit()
+    assert _feed(reader) == [older[1].id, older[0].id, own.id]
+
+    assert unfollow(reader.id, author.id) is True
+    assert unfollow(reader.id, author.id) is False
+    db.session.commit()
+    assert _stored(reader) == {own.id}
+    assert _feed(reader) == [own.id]
+
+
+def test_unfollow_hides_big_author_posts(app, make_user, make_community, make_post):
+    app.config['HOME_FANOUT_THRESHOLD'] = 1
+    big, reader = make_user('Grande'), make_user('Leitor')
+    community = make_community(big)
+    follow(reader.id, big.id)
+    post = _publish(make_post, big, community, 1)
+    db.session.commit()
+    assert post.fanned_out is False
+    assert _feed(reader) == [post.id]
+
+    unfollow(reader.id, big.id)
+    db.session.commit()
+    assert _feed(reader) == []
+
+
+def test_trim_keeps_newest_entries(app, make_user, make_community, make_post):
+    author, reader = make_user('Autora'), make_user('Leitor')
+    community = make_community(author)
+    follow(reader.id, author.id)
+    posts = [_publish(make_post, author, community, minutes) for minutes in range(5)]
+    db.session.commit()
+
+    assert trim_timelines([reader.id], max_entries=2) == 3
+    db.session.commit()
+    assert _stored(reader) == {posts[3].id, posts[4].id}
+    assert len(_stored(author)) == 5
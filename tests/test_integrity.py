@@ -0,0 +1,93 @@
+"""Cascatas de chaves estrangeiras (app.utils.integrity) no SQLite."""
+from sqlalchemy import func, select
+from sqlalchemy.schema import CreateTable
+
+from app.models import db, CommunityPost, CommunityPostComment, CommunityPostLike
+from app.utils.integrity import add_cascades, missing_cascades, sweep_orphans
+
+
+def _make_legacy(*models):
+    """Recria as tabelas como nos bancos antigos: chaves sem ON DELETE CASCADE, dados mantidos."""
+    db.session.commit()
+    raw = db.engine.raw_connection()
+    connection = raw.driver_connection
+    isolation_level = connection.isolation_level
+    connection.isolation_level = None
+    cursor = connection.cursor()
+    try:
+        cursor.execute('PRAGMA foreign_keys=OFF')
+        for model in models:
+            table = model.__table__
+            ddl = str(CreateTable(table).compile(dialect=db.engine.dialect)).strip()
+            ddl = ddl.replace(' ON DELETE CASCADE', '')
+            ddl = ddl.replace(f'CREATE TABLE {table.name} ', f'CREATE TABLE {table.name}__old ', 1)
+            cursor.execute(ddl)
+            cursor.execute(f'INSERT INTO {table.name}__old SELECT * FROM {table.name}')
+            cursor.execute(f'DROP TABLE {table.name}')
+            cursor.execute(f'ALTER TABLE {table.name}__old RENAME TO {table.name}')
+    finally:
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+        connection.isolation_level = isolation_level
+        raw.close()
+
+
+def _count(model):
+    return db.session.execute(select(func.count()).select_from(model)).scalar()
+
+
+def test_new_database_has_cascades(app):
+    assert missing_cascades() == []
+    assert add_cascades() == []
+
+
+def test_rebuild_keeps_rows_and_cascades(app, make_user, make_community, make_post):
+    owner = make_user('Dona')
+    reader = make_user('Leitor')
+    community = make_community(owner)
+    post = make_post(owner, community)
+    other = make_post(reader, community, 'Outro post')
+    db.session.add_all([
+        CommunityPostLike(user_id=reader.id, post_id=post.id),
+        CommunityPostLike(user_id=owner.id, post_id=other.id),
+        CommunityPostComment(user_id=reader.id, post_id=post.id, text='Comentário'),
+    ])
+    db.session.commit()
+    post_id, other_id = post.id, other.id
+
+    _make_legacy(CommunityPostLike, CommunityPostComment)
+    assert {table.name for table in missing_cascades()} == {'tb_community_post_likes',
+                                                           'tb_community_post_comments'}
+
+    assert sorted(add_cascades()) == ['tb_community_post_comments', 'tb_community_post_likes']
+    assert missing_cascades() == []
+    db.session.expire_all()
+    assert _count(CommunityPostLike) == 2
+    assert _count(CommunityPostComment) == 1
+
+    # Um único DELETE do post leva as curtidas e os comentários dele
+    db.session.execute(db.delete(CommunityPost).where(CommunityPost.id == post_id))
+    db.session.commit()
+    assert db.session.scalars(select(CommunityPostLike.post_id)).all() == [other_id]
+    assert _count(CommunityPostComment) == 0
+
+
+def test_sweep_orphans_removes_rows_without_parent(app, make_user, make_community, make_post):
+    owner = make_user('Dona')
+    community = make_community(owner)
+    post = make_post(owner, community)
+    db.session.add(CommunityPostLike(user_id=owner.id, post_id=post.id))
+    db.session.commit()
+    post_id = post.id
+
+    # Bancos antigos apagavam posts sem cascata (e sem conferir as chaves)
+    _make_legacy(CommunityPostLike)
+    db.session.execute(db.text('PRAGMA foreign_keys=OFF'))
+    db.session.execute(db.delete(CommunityPost).where(CommunityPost.id == post_id))
+    db.session.commit()
+    db.session.execute(db.text('PRAGMA foreign_keys=ON'))
+
+    assert dict(sweep_orphans(dry_run=True))['tb_community_post_likes'] == 1
+    assert dict(sweep_orphans())['tb_community_post_likes'] == 1
+    assert _count(CommunityPostLike) == 0
+    assert add_cascades() == ['tb_community_post_likes']